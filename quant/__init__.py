@@ -16,4 +16,4 @@ __all__ = ['data', 'transform', 'utils', '__version__',
            'cal_mdd', 'get_ic', 'get_factor_exposure', 'AbstractFactor',
            'abigale', 'Abigale', 'RestAPI',
            'wind', 'find_extreme_values', 'compute_zscore',
-           'get_residual', 'get_rtn', 'get_st_filter']
+           'get_residual', 'get_residuals', 'get_rtn', 'get_forward_returns', 'get_st_filter']
@@ -2,6 +2,7 @@ import os
 import importlib.util
 import glob
 import json
+import shutil
 from collections import defaultdict
 import fire
 import numpy as np
@@ -9,6 +10,7 @@ import pandas as pd
 from quant.data import wind
 from quant.common.settings import CONFIG, DATA_PATH, MAIN_PATH
 from quant.common.logging import Logger
+from quant.common.localize import MmapPanel, CODEC_POLICY, benchmark_codecs
 
 
 def load_class_from_file(path):
@@ -31,21 +33,62 @@ class QuantMain:
 
     @staticmethod
     def data(command, *args):
-        """Manage cache data"""
+        """Manage cache data
+        command must be one of ("ls", "rm", "export", "bench")
+
+        export: export a cached panel to a directory of npy files,
+        which can be loaded without pandas, e.g.
+        `quantlib data export wind_pivot AShareEODPrices/s_dq_pctchange ./pctchange`
+
+        bench: compare write time, read time and size of all compression codecs
+        on a cached panel, e.g.
+        `quantlib data bench wind_pivot AShareEODPrices/s_dq_pctchange`
+        """
         command = command.lower()
-        assert command in ("ls", "rm"), "Command must be one of {`ls`, `rm`}"
+        assert command in ("ls", "rm", "export", "bench"), "Command must be one of {`ls`, `rm`, `export`, `bench`}"
         if command == "ls":
             for filename in glob.glob(os.path.join(DATA_PATH, "*.h5")):
                 print(filename.replace("\\", "/").split("/")[-1][:-3])
+            for filename in glob.glob(os.path.join(DATA_PATH, "*.mmap")):
+                print(filename.replace("\\", "/").split("/")[-1])
         elif command == "rm":
             try:
                 f = args[0]
             except IndexError:
                 raise ValueError("must specify the filename to remove.")
+            if f.endswith(".mmap"):
+                shutil.rmtree(os.path.join(DATA_PATH, f))
+                return
             if not f.endswith(".h5"):
                 f += ".h5"
             filename = os.path.join(DATA_PATH, f)
             os.remove(filename)
+        elif command == "export":
+            try:
+                f, key, target = args[:3]
+            except ValueError:
+                raise ValueError("usage: data export <filename> <key> <target directory>")
+            MmapPanel(target).write(QuantMain.__load_cache(f, key))
+            Logger.info("Exported {} {} to {}".format(f, key, os.path.abspath(target)))
+        elif command == "bench":
+            try:
+                f, key = args[:2]
+            except ValueError:
+                raise ValueError("usage: data bench <filename> <key>")
+            data = QuantMain.__load_cache(f, key)
+            result = benchmark_codecs(data)
+            print("{} {}: shape={}, codec in use: {}".format(f, key, data.shape, CODEC_POLICY.get_codec(f, key.strip("/").split("/")[0])))
+            print(result.to_string(float_format="{:0.3f}".format))
+
+    @staticmethod
+    def __load_cache(f, key):
+        """Load a cached panel from either mmap directory or hdf5 file"""
+        if f.endswith(".h5"):
+            f = f[:-3]
+        panel = MmapPanel(os.path.join(DATA_PATH, f + ".mmap", key.strip("/")))
+        if panel.exists:
+            return panel.read()
+        return pd.read_hdf(os.path.join(DATA_PATH, f + ".h5"), key)
 
     @staticmethod
     def table(command, *args):
@@ -99,16 +142,37 @@ class QuantMain:
         for table in tables:
             wind.db.update_wind_table(table)
 
+    @staticmethod
+    def factors(command, n_jobs=1, force=False):
+        """Manage barra factor caches
+        command must be one of ("build", "update")
+
+        build: build or update the caches of the estimation universe, descriptors, factor exposures
+        and factor yields as a dependency graph, independent nodes in parallel worker processes.
+        Only the new trading days are computed and up-to-date nodes are skipped unless `--force`, e.g.
+        `quantlib factors build --n_jobs=4`
+
+        update: same as build
+        """
+        command = command.lower()
+        assert command in ("build", "update"), "Command must be one of {`build`, `update`}"
+        from .barra.scheduler import build
+        report = build(n_jobs=n_jobs, force=force)
+        print(report.to_string(float_format="{:0.1f}".format))
+        print("\n\rTotal {:0.1f}s, {} built, {} failed".format(
+            report.seconds.sum(), (report.status == "built").sum(), report.status.isin(["failed", "blocked"]).sum()))
+
     @staticmethod
     def backtest(strategy_filename, key, freq=1, debug=False):
         key = str(key)
         predicted = pd.read_hdf(strategy_filename, key)
         predicted.index = pd.to_datetime(predicted.index)
-        if freq > 0:
-            from .utils.calendar import TDay
-            dates = pd.date_range(start=predicted.index[0], end=predicted.index[-1], freq=freq*TDay)
-            predicted = predicted.loc[dates]        
-            final_day = pd.DataFrame(np.zeros([1, predicted.shape[1]]), columns=predicted.columns, index=[predicted.index[-1] + freq*TDay])
+        if isinstance(freq, str) or freq > 0:
+            # freq可以是交易日间隔，也可以是日程字符串，如"M", "W:-1", "index"，参见Schedule
+            from .utils.calendar import schedule
+            dates = schedule.get(freq, predicted.index[0], predicted.index[-1])
+            predicted = predicted.loc[dates]
+            final_day = pd.DataFrame(np.zeros([1, predicted.shape[1]]), columns=predicted.columns, index=[schedule.following(freq, predicted.index[-1])])
             predicted = pd.concat([predicted, final_day])
 
         config_path = os.path.join(MAIN_PATH, "constraint.json")
@@ -2,7 +2,6 @@ import numpy as np
 import pandas as pd
 from ...common.settings import CONFIG
 from ...common.logging import Logger
-from ...utils.calendar import TDay
 
 
 class Fund:
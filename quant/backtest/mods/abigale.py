@@ -1,8 +1,9 @@
 import json
 import pandas as pd
 from ...abigale import Abigale, exceptions
-from ...common.math_helpers import get_factor_exposure
-from ...barra.factors import get_factor_yields
+from ...common.math_helpers import get_factor_exposures
+from ...common.performance import cal_performance
+from ...barra.factors import get_factor_yields, INDUSTRY_EXPOSURES
 from ...common.settings import CONFIG
 from ...common.logging import Logger
 from ...data import wind
@@ -26,16 +27,18 @@ class AbigaleMod(AbstractMod):
         benchmark /= benchmark.iloc[0]
         return benchmark
     
-    def get_exposure(self, position, factor):
-        """计算持仓的因子暴露"""
-        factor_name = factor.name
-        factor_value = factor.get_exposures()
-        exposure = (get_factor_exposure(position, factor_value, benchmark=CONFIG.BENCHMARK)
-            .resample("1m")
-            .mean()
-            .rename(factor_name)
-        )
-        return exposure
+    @staticmethod
+    def get_style_factors():
+        """除行业以外的所有风格因子"""
+        return {
+            name: factor for name, factor in Factor.get_factors().items()
+            if not name.startswith("Industry")
+        }
+
+    def get_exposures(self, position, factors):
+        """一次计算持仓在所有因子上的暴露"""
+        factor_values = {name: factor.get_exposures() for name, factor in factors.items()}
+        return get_factor_exposures(position, factor_values, benchmark=CONFIG.BENCHMARK)
 
     def on_change_position(self, weight):
         self.weights[self.strategy.today] = pd.Series(weight)
@@ -61,18 +64,13 @@ class AbigaleMod(AbstractMod):
         """
         生成基本信息，包括：每年的平均收益率、波动率、夏普率、换手率、回撤
         """
-        years = sorted(net_values.index.year.unique())
+        stats = cal_performance(net_values, weights)
         data = []
-        for year in years:
-            try:
-                idx = net_values.index[net_values.index.year == year]
-                nv = net_values.loc[idx]
-                idx = weights.index[weights.index.year == year]
-                w = weights.loc[idx]
-                data.append(self._basic_info_item(str(year), nv, w))
-            except IndexError:
+        for (period, _), row in stats.iterrows():
+            # 没有调仓的年份跳过
+            if period != "Total" and pd.isnull(row["turnover"]):
                 continue
-        data.append(self._basic_info_item("Total", net_values, weights))
+            data.append(self._basic_info_item(period, row))
         return data
 
     def generate_net_values(self, net_values):
@@ -89,19 +87,18 @@ class AbigaleMod(AbstractMod):
         factor_yields = get_factor_yields()
         factor_exposure_yields = {}
 
-        # calculate factor yields one by one
-        for factor in factor_yields.columns:
-            factor_value = getattr(Factor, factor).get_exposures()
-            exposure = get_factor_exposure(position, factor_value, benchmark=CONFIG.BENCHMARK)
-            yields = exposure * factor_yields[factor]
+        # exposures of all style factors are computed at once
+        industry_factors = [factor for factor in factor_yields.columns if factor.startswith("Industry")]
+        style_factors = [factor for factor in factor_yields.columns if factor not in industry_factors]
+        exposures = self.get_exposures(position, {factor: getattr(Factor, factor) for factor in style_factors})
+        for factor in style_factors:
+            yields = exposures[factor] * factor_yields[factor]
             factor_exposure_yields[factor] = yields.dropna()
-        
-        # Sum all industry yields
-        industry_exposure_yields = sum(value for key, value in factor_exposure_yields.items() if key.startswith("Industry"))
-        for key in list(factor_exposure_yields.keys()):
-            if key.startswith("Industry"):
-                del factor_exposure_yields[key]
-        factor_exposure_yields['Industry'] = industry_exposure_yields
+
+        # Sum all industry yields, exposures of all industries are computed at once
+        industry_exposures = INDUSTRY_EXPOSURES.get_exposures(position, benchmark=CONFIG.BENCHMARK)
+        industry_yields = factor_yields[industry_factors].rename(columns=lambda name: name[8:])
+        factor_exposure_yields['Industry'] = (industry_exposures * industry_yields).sum(axis=1, min_count=1).dropna()
         
         # relative_rtn = self.strategy.fund.sheet["net_value"].pct_change() - self.get_benchmark().pct_change()
         # risk_yields = pd.DataFrame(factor_exposure_yields).sum(1)
@@ -117,24 +114,27 @@ class AbigaleMod(AbstractMod):
         """
         风格暴露
         """
-        style_risks = {}
-        for factor in Factor.get_factors().values():
-            if factor.name.startswith("Industry"):
-                continue
-            series = self.get_exposure(weights, factor)
-            style_risks[factor.name] = self._series_to_list(series)
+        factors = self.get_style_factors()
+        exposures = self.get_exposures(weights, factors).resample("1m").mean()
+        style_risks = {
+            factor.name: self._series_to_list(exposures[name])
+            for name, factor in factors.items()
+        }
         return style_risks
 
     def generate_industry_risks(self, weights):
         """
         行业暴露
         """
-        industry_risks = {}
-        for factor in Factor.get_factors().values():
-            if not factor.name.startswith("Industry"):
-                continue
-            series = self.get_exposure(weights, factor)
-            industry_risks[factor.name[8:]] = self._series_to_list(series)
+        industry_exposures = (INDUSTRY_EXPOSURES
+            .get_exposures(weights, benchmark=CONFIG.BENCHMARK)
+            .resample("1m")
+            .mean()
+        )
+        industry_risks = {
+            name: self._series_to_list(series)
+            for name, series in industry_exposures.items()
+        }
         return industry_risks
 
     @staticmethod
@@ -148,21 +148,15 @@ class AbigaleMod(AbstractMod):
         ]
 
     @staticmethod
-    def _basic_info_item(name, nv, weights):
+    def _basic_info_item(name, stats):
         """
         基本统计信息
         """
-        rtns = nv.pct_change()
-        rtn = rtns.mean() * 252
-        std = rtns.std() * 252 ** 0.5
-        sharpe = rtn / std
-        mdd = (1 - nv / nv.cummax() ).max()
-        turnover = weights.fillna(0).diff().abs().sum(1).sum() / (weights.index[-1] - weights.index[0]).days * 252
         return {
             'period': name,
-            'rtn': f'{rtn*100:0.2f}%',
-            'volatility': f'{std*100:0.2f}%',
-            'sharpe': f'{sharpe:0.2f}',
-            'mdd': f'{mdd*100:0.1f}%',
-            'turnover': f'{turnover*100:0.1f}%'
-        }
\ No newline at end of file
+            'rtn': f'{stats["rtn"]*100:0.2f}%',
+            'volatility': f'{stats["volatility"]*100:0.2f}%',
+            'sharpe': f'{stats["sharpe"]:0.2f}',
+            'mdd': f'{stats["mdd"]*100:0.1f}%',
+            'turnover': f'{stats["turnover"]*100:0.1f}%'
+        }
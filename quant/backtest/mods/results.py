@@ -3,6 +3,7 @@
 from ..common.mods import AbstractMod, ModManager
 from ..common.events import EventType
 from ...common.logging import Logger
+from ...common.performance import cal_performance
 from ...common.settings import CONFIG
 from ...data import wind
 
@@ -17,16 +18,18 @@ class ShowBasicResults(AbstractMod):
                 .dropna().truncate(self.strategy.start_date, self.strategy.end_date)
             benchmark /= benchmark.iloc[0]
             net_value /= benchmark
-        profits = net_value.pct_change()
+        stats = cal_performance(net_value, by_year=False).iloc[0]
         info = dict()
-        info["mean"] = profits.mean() * 252
-        info["std"] = profits.std() * 252 ** 0.5
-        info["sharpe"] = info["mean"] / info["std"]
+        info["mean"] = stats["rtn"]
+        info["std"] = stats["volatility"]
+        info["sharpe"] = stats["sharpe"]
+        info["mdd"] = stats["mdd"]
         msg = (
             "Finished backtest\n"
             "Mean: %(mean).3f\n"
             "Std: %(std).3f\n"
             "Sharpe: %(sharpe).3f\n"
+            "MDD: %(mdd).3f\n"
         ) % info
         Logger.info(msg)
 
@@ -6,7 +6,7 @@ from ..common.mods import AbstractMod, ModManager
 from ..common.events import EventType
 from ...data import wind
 from ...common.logging import Logger
-from ...utils.calendar import TDay
+from ...utils.calendar import trading_calendar
 
 
 @ModManager.register(True)
@@ -98,7 +98,7 @@ class NoUpLimitUniverse(AbstractMod):
 
     def on_get_universe(self, universe: set):
         today = self.strategy.today
-        next_trading_day = today + TDay
+        next_trading_day = trading_calendar.next(today)
         if next_trading_day not in self.market.market_data.index:
             return
         next_open = self.open_prices.loc[next_trading_day]
@@ -13,7 +13,7 @@ from ...common.events import EventType
 from ...common.mods import ModManager, AbstractMod
 from ....data import wind
 from ....barra import Factor
-from ....common.math_helpers import get_factor_exposure
+from ....common.math_helpers import get_factor_exposures
 from ....common.settings import CONFIG
 from ....common.logging import Logger
 
@@ -64,11 +64,11 @@ class WebVisualizer(AbstractMod):
         benchmark /= benchmark.iloc[0]
         return benchmark
 
-    def get_exposure(self, position, factor):
-        """计算持仓的因子暴露"""
-        factor_value = factor.get_exposures()
-        exposure = get_factor_exposure(position, factor_value, benchmark=CONFIG.BENCHMARK).resample("1m").mean()
-        return self.series2json(exposure)
+    def get_exposures(self, position):
+        """一次计算持仓在所有风险因子上的暴露"""
+        factors = {factor.name: factor.get_exposures() for factor in self.risk_factors}
+        exposures = get_factor_exposures(position, factors, benchmark=CONFIG.BENCHMARK).resample("1m").mean()
+        return {name: self.series2json(exposure) for name, exposure in exposures.items()}
 
     def on_backtest_finish(self, fund):
         stocks = {}
@@ -87,7 +87,7 @@ class WebVisualizer(AbstractMod):
         info["relative"] = self.series2json((fund.sheet["net_value"] / benchmark).dropna())
         info["stocks"] = json.dumps(stocks)
         info["fee"] = fund.sheet["fee"].sum()
-        info["exposure"] = sorted([(factor.name.replace(" ", ""), self.get_exposure(fund.position, factor)) for factor in self.risk_factors])
+        info["exposure"] = sorted([(name.replace(" ", ""), exposure) for name, exposure in self.get_exposures(fund.position).items()])
         env = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'statics')), extensions=('jinja2.ext.with_', ))
         template = env.get_template('template.html')
         # with open(TEMPLATE_FILE, encoding="utf8") as template_file:
@@ -15,8 +15,8 @@ from ..common.settings import CONFIG, MAIN_PATH
 from ..common.logging import Logger
 from ..data import wind
 from ..barra import Factor
-from ..barra.factors.industry import INDUSTRY_FACTORS
-from ..utils.calendar import TradingCalendar, TDay
+from ..barra.factors.industry import INDUSTRY_EXPOSURES
+from ..utils.calendar import trading_calendar
 
 
 class AbstractStrategy:
@@ -31,7 +31,7 @@ class AbstractStrategy:
     """可用Mod列表"""
     def __init__(self):
         self.event_manager = EventManager(EventType)
-        self.calendar = TradingCalendar()
+        self.calendar = trading_calendar
         self.market = None
         self.fund = None
         self.today = None
@@ -147,13 +147,10 @@ class ConstraintStrategy(SimpleStrategy):
             factor_name: getattr(Factor, factor_name).get_exposures(True)
             for factor_name in constraint_config['factors'].keys()
         }
-        self.industry_data = {
-            industry_name: industry_factor.get_exposures()
-            for industry_name, industry_factor in INDUSTRY_FACTORS.items()
-        }
+        self.industry_data = INDUSTRY_EXPOSURES
         self.index_weights = wind.get_index_weight("AIndexHS300FreeWeight", CONFIG.BENCHMARK) \
                             .resample("1d").ffill()
-        rest_index = pd.date_range(self.index_weights.index[-1], pd.to_datetime(date.today()), freq=TDay)
+        rest_index = trading_calendar.range(self.index_weights.index[-1], pd.to_datetime(date.today()))
         rest_df = pd.DataFrame(np.full((len(rest_index)-1, len(self.index_weights.columns)), None), index=rest_index[1:], columns=self.index_weights.columns)
         self.index_weights = pd.concat([self.index_weights, rest_df], 0).ffill()
 
@@ -220,8 +217,9 @@ class ConstraintStrategy(SimpleStrategy):
             A_ub.append(-stocks_exposure)
             b_ub.append(epsilon - index_exposure)
 
+        industry_dummies = self.industry_data.dummies(today)
         for industry_name, epsilon in self.constraint_config['industries'].items():
-            industry_data = self.industry_data[industry_name].loc[today].fillna(0)
+            industry_data = industry_dummies[industry_name]
             index_exposure = (index_weight * industry_data).sum()
             stocks_exposure = industry_data.loc[stocks].values
             
@@ -271,8 +269,9 @@ class ConstraintStrategy(SimpleStrategy):
                 M.constraint(factor_name, Expr.dot(stocks_exposure.tolist(), x), Domain.inRange(index_exposure-limit, index_exposure+limit))
 
             # 控制行业暴露
+            industry_dummies = self.industry_data.dummies(today)
             for industry_name, limit in self.constraint_config['industries'].items():
-                industry_data = self.industry_data[industry_name].loc[today].fillna(0)
+                industry_data = industry_dummies[industry_name]
                 index_exposure = (index_weight * industry_data).sum()
                 stocks_exposure = industry_data.loc[stocks].values
                 M.constraint(industry_name, Expr.dot(stocks_exposure.tolist(), x), Domain.inRange(index_exposure-limit, index_exposure+limit))
@@ -314,8 +313,9 @@ class ConstraintStrategy(SimpleStrategy):
             index_exposure = (index_weight * factor_data).sum()
             stocks_exposure = factor_data.loc[stocks].values
             constraints.append(opt.Constraint(dot(x, stocks_exposure), lb=index_exposure-limit, ub=index_exposure+limit))
+        industry_dummies = self.industry_data.dummies(today)
         for industry_name, limit in self.constraint_config['industries'].items():
-            industry_data = self.industry_data[industry_name].loc[today].fillna(0)
+            industry_data = industry_dummies[industry_name]
             index_exposure = (index_weight * industry_data).sum()
             stocks_exposure = industry_data.loc[stocks].values
             constraints.append(opt.Constraint(dot(x, stocks_exposure), lb=index_exposure-limit, ub=index_exposure+limit))
@@ -8,6 +8,7 @@ from ..barra.entities import get_estimation_universe, Portfolio
 from ..common.logging import Logger
 from ..common.html import HTMLBase
 from ..data import wind
+from ..transform import get_forward_returns
 
 
 class AlphaReport:
@@ -158,12 +159,9 @@ class AlphaReport:
         """
         Alpha随天数变化
         """
-        decay = []
-        rtns = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100
-        for _ in range(20):
-            rtns = rtns.shift(-1)
-            alpha = self._profit(self.weight, rtns).mean()
-            decay.append(alpha)
-        sns.barplot(list(range(1, 21)), decay).set_title('Alpha Decay')
+        horizons = list(range(1, 21))
+        rtns = get_forward_returns(horizons, cumulative=False)
+        decay = [self._profit(self.weight, rtns.sel(horizon=h).to_pandas()).mean() for h in horizons]
+        sns.barplot(horizons, decay).set_title('Alpha Decay')
         return self.get_plot()
 
@@ -1 +1 @@
-from .portfolio import Portfolio, get_estimation_universe
\ No newline at end of file
+from .portfolio import Portfolio, get_estimation_universe, update_estimation_universe
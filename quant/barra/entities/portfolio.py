@@ -1,23 +1,177 @@
+"""
+组合与估计池（estimation universe）
+
+估计池的权重为过滤后股票的市值占比，过滤条件包括最小市值、上市天数和是否剔除ST，
+默认值由配置项 ``estu_min_cap``, ``estu_min_listed_days``, ``estu_exclude_st`` 决定。
+权重面板以内存映射格式缓存（float32），市值加权收益率也一并缓存，
+供 :func:`quant.barra.factors.base.size_weighted_standardize` 和Beta、HSigma等描述符共用。
+"""
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from ...data import wind
-from ...common import single_instance
+from ...common import CONFIG, LOCALIZER
+
+__all__ = ['Portfolio', 'cap_weights', 'weighted_returns', 'get_estimation_universe', 'update_estimation_universe']
+
+
+def cap_weights(cap: pd.DataFrame, eligible=None) -> pd.DataFrame:
+    """
+    按市值计算每天的权重，每行之和为1
+
+    Parameters
+    ==========
+    cap: pd.DataFrame
+        市值，日期 × 股票
+    eligible: np.ndarray or pd.DataFrame, optional
+        与cap形状相同的布尔矩阵，False的股票不计入
+
+    Returns
+    =======
+    pd.DataFrame
+        没有有效市值的日期被去掉
+    """
+    values = cap.values.astype("float64")
+    if eligible is not None:
+        values = np.where(np.asarray(eligible, dtype=bool), values, np.nan)
+    values = np.where(values > 0, values, np.nan)
+    total = np.nansum(values, axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = values / total
+    return pd.DataFrame(weight, index=cap.index, columns=cap.columns).dropna(how="all")
+
+
+def weighted_returns(returns: pd.DataFrame, weight: pd.DataFrame) -> pd.Series:
+    """
+    组合每天的收益率 :math:`\\sum_i w_i r_i` ，收益率和权重都缺失的日期被去掉
+
+    Parameters
+    ==========
+    returns: pd.DataFrame
+        股票收益率，日期 × 股票
+    weight: pd.DataFrame
+        持仓权重，日期 × 股票
+    """
+    index = returns.index.intersection(weight.index)
+    r = returns.loc[index].values.astype("float64")
+    w = weight.reindex(index=index, columns=returns.columns).values.astype("float64")
+    product = r * w
+    has_value = ~np.isnan(product).all(axis=1)
+    return pd.Series(np.nansum(product, axis=1)[has_value], index=index[has_value])
 
 
 class Portfolio:
-    def __init__(self, weight):
+    def __init__(self, weight, returns=None):
         self.weight = weight
-        self._rtn = None
+        self._rtn = returns
 
     def get_returns(self):
         if self._rtn is None:
             stocks_rtn = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange").loc["2003-01-01":] / 100
-            self._rtn = (stocks_rtn * self.weight).dropna(how="all").sum(1)
+            self._rtn = weighted_returns(stocks_rtn, self.weight)
         return self._rtn
 
 
-@single_instance
-def get_estimation_universe():
-    size = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv")
-    weight = pd.DataFrame({idx: row / row.sum() for idx, row in size.iterrows()}).T.dropna(how='all')
-    return Portfolio(weight)
+def _eligible(cap: pd.DataFrame, min_cap, min_listed_days, exclude_st) -> np.ndarray:
+    """估计池的过滤条件，返回与cap形状相同的布尔矩阵"""
+    eligible = np.isfinite(cap.values)
+    if min_cap:
+        with np.errstate(invalid="ignore"):
+            eligible &= cap.values >= min_cap
+    if min_listed_days:
+        listdate = pd.to_datetime(wind.get_stock_basics().s_info_listdate).reindex(cap.columns)
+        threshold = (listdate + pd.Timedelta(days=min_listed_days)).values
+        # 上市日期缺失的股票（NaT）比较结果为False，被剔除
+        eligible &= cap.index.values[:, None] >= threshold[None, :]
+    if exclude_st:
+        # 增量更新时ST面板可能还没有覆盖新的日期
+        st = (wind
+            .refresh_entry_table("AShareST", until=cap.index[-1] if len(cap) else None)
+            .reindex(index=cap.index, columns=cap.columns)
+        )
+        eligible &= ~st.fillna(False).values.astype(bool)
+    return eligible
+
+
+@LOCALIZER.wrap("estimation_universe", keys=["min_cap", "min_listed_days", "exclude_st"],
+                const_key="weight", format="mmap")
+def _estimation_universe_weight(min_cap, min_listed_days, exclude_st) -> pd.DataFrame:
+    cap = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv")
+    weight = cap_weights(cap, _eligible(cap, min_cap, min_listed_days, exclude_st))
+    return weight.astype("float32")
+
+
+@LOCALIZER.wrap("estimation_universe", keys=["min_cap", "min_listed_days", "exclude_st"], const_key="returns")
+def _estimation_universe_returns(min_cap, min_listed_days, exclude_st) -> pd.Series:
+    weight = _estimation_universe_weight(min_cap, min_listed_days, exclude_st)
+    stocks_rtn = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange").loc["2003-01-01":] / 100
+    return weighted_returns(stocks_rtn, weight)
+
+
+@lru_cache()
+def _get_estimation_universe(min_cap, min_listed_days, exclude_st) -> Portfolio:
+    weight = _estimation_universe_weight(min_cap, min_listed_days, exclude_st)
+    returns = _estimation_universe_returns(min_cap, min_listed_days, exclude_st)
+    return Portfolio(weight, returns)
+
+
+def _resolve_filters(min_cap, min_listed_days, exclude_st):
+    """未指定的过滤条件使用配置项"""
+    if min_cap is None:
+        min_cap = CONFIG.get("ESTU_MIN_CAP", 0)
+    if min_listed_days is None:
+        min_listed_days = CONFIG.get("ESTU_MIN_LISTED_DAYS", 0)
+    if exclude_st is None:
+        exclude_st = CONFIG.get("ESTU_EXCLUDE_ST", False)
+    return min_cap, min_listed_days, bool(exclude_st)
+
+
+def get_estimation_universe(min_cap=None, min_listed_days=None, exclude_st=None) -> Portfolio:
+    """
+    市值加权的估计池，同一组参数只计算一次
+
+    Parameters
+    ==========
+    min_cap: float, optional
+        最小市值（与AShareEODDerivativeIndicator.s_val_mv的单位相同，万元），默认为配置项estu_min_cap或0
+    min_listed_days: int, optional
+        最少上市天数（自然日），默认为配置项estu_min_listed_days或0
+    exclude_st: bool, optional
+        是否剔除ST股票，默认为配置项estu_exclude_st或False
+
+    Returns
+    =======
+    Portfolio
+        weight为日期 × 股票的权重，get_returns()为市值加权收益率
+    """
+    return _get_estimation_universe(*_resolve_filters(min_cap, min_listed_days, exclude_st))
+
+
+def update_estimation_universe(min_cap=None, min_listed_days=None, exclude_st=None) -> Portfolio:
+    """
+    把缓存之后的新日期的权重和收益率追加到估计池的缓存中，参数同 :func:`get_estimation_universe`
 
+    每天的权重只依赖于当天的市值，所以只需计算新的日期
+    """
+    filters = _resolve_filters(min_cap, min_listed_days, exclude_st)
+    # 键名与缓存装饰器生成的一致
+    weight_key = _estimation_universe_weight.cache_path(*filters)
+    returns_key = _estimation_universe_returns.cache_path(*filters)
+    weight = LOCALIZER.load("estimation_universe", weight_key)
+    if weight is not None:
+        cap = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv")
+        cap = cap.loc[cap.index > weight.index[-1]] if len(weight) else cap
+        new = cap_weights(cap, _eligible(cap, *filters)).astype("float32")
+        if len(new):
+            LOCALIZER.append("estimation_universe", weight_key, new)
+            weight = LOCALIZER.load("estimation_universe", weight_key)
+    returns = LOCALIZER.load("estimation_universe", returns_key)
+    if weight is not None and returns is not None:
+        stocks_rtn = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange").loc["2003-01-01":] / 100
+        if len(returns):
+            stocks_rtn = stocks_rtn.loc[stocks_rtn.index > returns.index[-1]]
+        new = weighted_returns(stocks_rtn, weight)
+        if len(new):
+            LOCALIZER.append("estimation_universe", returns_key, new)
+    _get_estimation_universe.cache_clear()
+    return _get_estimation_universe(*filters)
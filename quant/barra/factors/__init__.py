@@ -10,6 +10,6 @@ from .momentum import Momentum
 from .non_linear_size import NonLinearSize
 from .residual_volatility import ResidualVolatility
 from .size import Size
-from .industry import INDUSTRY_FACTORS
+from .industry import INDUSTRY_FACTORS, INDUSTRY_EXPOSURES
 
-from .yields import get_factor_yields
\ No newline at end of file
+from .yields import get_factor_yields, update_factor_yields
\ No newline at end of file
@@ -1,13 +1,12 @@
+import os
 import numpy as np
 import pandas as pd
 import xarray as xr
-import statsmodels.api as sm
-from sklearn.linear_model import LinearRegression
 from ..entities.portfolio import get_estimation_universe
 from ...common.decorators import LOCALIZER
 from ...common.logging import Logger
 from ...data import wind
-from ...transform import compute_zscore
+from ...transform import compute_zscore, cross_sectional_regression
 
 
 def size_weighted_standardize(data):
@@ -23,13 +22,186 @@ def size_weighted_standardize(data):
     return z.clip(-3, 3)
 
 
+def fill_by_regression(values, size, industries, weights, n_jobs=1):
+    """
+    用市值和行业的截面回归填充缺失的暴露
+
+    每天用有值的股票对size和行业虚拟变量做加权回归（不含常数项），缺失值用拟合值填充，
+    size有效的股票都会被填充，没有行业的股票行业虚拟变量全为0，同样参与回归和填充。所有日期用
+    :func:`quant.transform.cross_sectional_regression` 批量求解
+
+    Parameters
+    ==========
+    values: pd.DataFrame
+        待填充的暴露，日期 × 股票
+    size: pd.DataFrame
+        市值因子的zscore
+    industries: pd.DataFrame
+        整数行业代码，-1表示没有行业
+    weights: pd.DataFrame
+        回归权重，一般为市值的平方根
+    n_jobs: int
+        并行的进程数
+    """
+    index = values.index.intersection(size.index).intersection(industries.index)
+    if len(index) < len(values):
+        Logger.warn("{} dates without size or industry data are not filled, the first is {}".format(
+            len(values) - len(index), values.index.difference(index)[0]))
+    codes = industries.reindex(index=index, columns=values.columns).fillna(-1)
+    result = cross_sectional_regression(values.loc[index], {"size": size}, industries=codes,
+                                        weights=weights, n_jobs=n_jobs)
+    return values.fillna(result.fitted)
+
+
+def orthogonalize(values, exog):
+    """
+    对每天的截面做带常数项的最小二乘回归，返回残差
+
+    所有日期的正规方程用 :func:`quant.transform.cross_sectional_regression` 一次批量求解。
+    只有values有值的股票参与回归，自变量的缺失值视为0
+
+    Parameters
+    ==========
+    values: pd.DataFrame
+        因变量，日期 × 股票
+    exog: dict
+        以名称为键，日期 × 股票的自变量为值
+
+    Returns
+    =======
+    pd.DataFrame
+        残差，去掉了全部缺失的日期和股票
+    """
+    exog = {
+        name: data.reindex(index=values.index, columns=values.columns).fillna(0)
+        for name, data in exog.items()
+    }
+    residuals = cross_sectional_regression(values, exog, intercept=True).residuals
+    return residuals.dropna(axis=0, how="all").dropna(axis=1, how="all")
+
+
 class Descriptor:
+    requires = ()
+    """
+    除估计池以外，计算该描述符之前需要先建好的节点，如 ``("descriptor/Beta", "factor/Size")`` ，
+    参见 :mod:`quant.barra.scheduler`
+    """
+
     def get_raw_value(self) -> pd.DataFrame:
         """
         返回原始值。需重载此方法
         """
         raise NotImplementedError
 
+    def create_accumulators(self) -> dict:
+        """
+        增量更新所用的累加器（参见 :mod:`quant.common.online`），以名称为键。
+        支持增量更新的描述符需重载此方法以及 :meth:`get_inputs` 和 :meth:`accumulate`
+        """
+        raise NotImplementedError
+
+    def get_inputs(self) -> tuple:
+        """
+        计算原始值所需的输入数据，都是按日期排列的DataFrame或Series，第一个的日期决定了输出的日期
+        """
+        raise NotImplementedError
+
+    def accumulate(self, accumulators: dict, date, *rows) -> pd.Series:
+        """
+        用date当天的输入更新累加器，返回当天的原始值
+
+        Parameters
+        ==========
+        rows:
+            :meth:`get_inputs` 中每个输入当天的数据
+        """
+        raise NotImplementedError
+
+    def update_raw_value(self) -> pd.DataFrame:
+        """
+        增量更新原始值的缓存。
+
+        累加器的状态保存在缓存文件旁边，更新时只计算状态之后的新日期，每天的计算量与股票数成正比；
+        新的行追加到 :meth:`get_raw_value` 的缓存末尾。没有状态时从头计算一遍以建立状态，
+        已经缓存的日期不会重复写入。
+
+        Returns
+        =======
+        pd.DataFrame
+            更新后全部的原始值
+        """
+        try:
+            accumulators = self.create_accumulators()
+        except NotImplementedError:
+            return self._recompute_raw_value()
+        key = self.cache_key
+        paths = {
+            name: LOCALIZER.state_path("descriptors", "{}/{}".format(key, name))
+            for name in accumulators
+        }
+        if all(os.path.exists(path) for path in paths.values()):
+            accumulators = {name: type(acc).load(paths[name]) for name, acc in accumulators.items()}
+        last_date = next(iter(accumulators.values())).last_date
+        cached = LOCALIZER.load("descriptors", key)
+        cached_end = cached.index[-1] if cached is not None and len(cached) else None
+
+        inputs = self.get_inputs()
+        index = inputs[0].index
+        inputs = [data.reindex(index) for data in inputs]
+        positions = np.arange(len(index)) if last_date is None else np.flatnonzero(index > last_date)
+        rows = {}
+        for i in positions:
+            date = index[i]
+            row = self.accumulate(accumulators, date, *[data.iloc[i] for data in inputs])
+            if cached_end is None or date > cached_end:
+                rows[date] = row
+        new = pd.DataFrame.from_dict(rows, orient="index")
+        new.index.name = index.name
+        if len(new):
+            Logger.info("Appending {} rows to descriptor {}".format(len(new), self.name))
+            LOCALIZER.append("descriptors", key, new)
+        for name, accumulator in accumulators.items():
+            accumulator.save(paths[name])
+        if cached is None:
+            return new
+        return pd.concat([cached, new], axis=0) if len(new) else cached
+
+    @property
+    def cache_key(self) -> str:
+        """原始值在descriptors缓存文件中的键名"""
+        return getattr(type(self).get_raw_value, "const_key", None) or self.name.lower()
+
+    def input_end(self):
+        """
+        输入数据的最后一个日期，默认为日行情的最后一个交易日。
+        不支持增量计算的描述符的缓存到了这一天就不再重新计算
+        """
+        return wind.get_wind_data("AShareEODPrices", "s_dq_pctchange").index[-1]
+
+    def _recompute_raw_value(self) -> pd.DataFrame:
+        """
+        不支持增量计算的描述符：重新计算全部原始值，只把缓存之后的日期追加到缓存中
+        """
+        compute = getattr(type(self).get_raw_value, "__wrapped__", None)
+        if compute is None:
+            # 原始值没有缓存
+            return self.get_raw_value()
+        key = self.cache_key
+        last = LOCALIZER.last_index("descriptors", key)
+        if last is not None and last >= self.input_end():
+            # 缓存已经覆盖全部输入，不用重新计算
+            return LOCALIZER.load("descriptors", key)
+        cached = LOCALIZER.load("descriptors", key)
+        raw = compute(self)
+        if cached is not None and len(cached):
+            raw = raw.loc[raw.index > cached.index[-1]]
+        if len(raw):
+            Logger.info("Appending {} rows to descriptor {}".format(len(raw), self.name))
+            LOCALIZER.append("descriptors", key, raw)
+        if cached is None:
+            return raw
+        return pd.concat([cached, raw], axis=0) if len(raw) else cached
+
     def get_zscore(self) -> pd.DataFrame:
         """
         返回zscore
@@ -37,15 +209,47 @@ class Descriptor:
         wrapper = LOCALIZER.wrap("descriptors", const_key=self.name + "_z")
         return wrapper(self._get_zscore)()
 
+    def update_zscore(self) -> pd.DataFrame:
+        """
+        增量更新zscore的缓存。
+
+        先用 :meth:`update_raw_value` 更新原始值，再只对缓存之后的日期做标准化，
+        每天的截面是独立标准化的，所以新的行可以直接追加。估计池还没有覆盖的日期留到下次更新。
+
+        Returns
+        =======
+        pd.DataFrame
+            更新后全部的zscore
+        """
+        key = self.name + "_z"
+        cached = LOCALIZER.load("descriptors", key)
+        raw = self.update_raw_value()
+        if cached is None:
+            return self.get_zscore()
+        if len(cached):
+            raw = raw.loc[raw.index > cached.index[-1]]
+        raw = raw.loc[raw.index.isin(get_estimation_universe().weight.index)]
+        new = self._standardize(raw)
+        if not len(new):
+            return cached
+        Logger.info("Appending {} rows to the zscore of {}".format(len(new), self.name))
+        LOCALIZER.append("descriptors", key, new)
+        return pd.concat([cached, new], axis=0)
+
     def _get_zscore(self) -> pd.DataFrame:
+        return self._standardize(self.get_raw_value())
+
+    def _standardize(self, raw) -> pd.DataFrame:
         stocks = wind.get_stock_basics()
         stocks = stocks.index[stocks.s_info_listdate.notnull()]
         raw = (
-            self.get_raw_value()
-            .loc["2005-01-01":, stocks]
-            .dropna(0, how="all")
-            .dropna(1, how="all")
+            raw
+            .loc["2005-01-01":, raw.columns.intersection(stocks)]
+            .dropna(axis=0, how="all")
+            .dropna(axis=1, how="all")
         )
+        if not len(raw):
+            return raw
         # Use capital-weighted mean instead of equal-weighted mean
         z = size_weighted_standardize(raw)
         return z
@@ -73,18 +277,25 @@ class Factor:
         self.disentangle = disentangle
         self.__data = None
 
-    def get_exposures(self, fillna=True) -> pd.DataFrame:
+    def get_exposures(self, fillna=True, n_jobs=1) -> pd.DataFrame:
         """
         返回每只股票每天在该因子上的暴露
+
+        Parameters
+        ==========
+        fillna: bool
+            是否用市值和行业的回归填充缺失值，参见 :func:`fill_by_regression`
+        n_jobs: int
+            填充缺失值时并行的进程数
         """
         if self.__data is None:
-            wrapper = LOCALIZER.wrap(filename="factors", const_key=self.name)
+            wrapper = LOCALIZER.wrap(filename="factors", const_key=self.name, format="mmap")
             # Since self.name can't be used at method level, we have to do
             # the wrapping inside the method.
             self.__data = wrapper(self._build_data)()
         if fillna:
-            wrapper = LOCALIZER.wrap(filename="factors", const_key=self.name + "_fillna")
-            return wrapper(self._fillna)(self.__data)
+            wrapper = LOCALIZER.wrap(filename="factors", const_key=self.name + "_fillna", format="mmap")
+            return wrapper(self._fillna)(self.__data, n_jobs=n_jobs)
         return self.__data
 
     @classmethod
@@ -102,7 +313,48 @@ class Factor:
             if key[0].isupper()
         }
 
-    def _build_data(self):
+    def update_exposures(self, n_jobs=1, update_descriptors=True) -> pd.DataFrame:
+        """
+        增量更新因子暴露的缓存（包括填充缺失值后的结果）。
+
+        先更新各个描述符的zscore（参见 :meth:`Descriptor.update_zscore`），再只计算缓存之后的日期，
+        追加到缓存末尾。正交化所用的因子（disentangle）和Size需要先更新。
+
+        Parameters
+        ==========
+        n_jobs: int
+            填充缺失值时并行的进程数
+        update_descriptors: bool
+            是否先更新描述符。描述符已经更新过时（例如 :mod:`quant.barra.scheduler` 中）设为False，
+            直接读取描述符缓存的zscore
+
+        Returns
+        =======
+        pd.DataFrame
+            更新后全部的（填充缺失值后的）暴露
+        """
+        if update_descriptors:
+            for descriptor in self.descriptors:
+                descriptor.update_zscore()
+        cached = LOCALIZER.load("factors", self.name)
+        if cached is None:
+            return self.get_exposures(n_jobs=n_jobs)
+        if len(cached):
+            new = self._build_data(after=cached.index[-1])
+            if len(new):
+                Logger.info("Appending {} rows to factor {}".format(len(new), self.name))
+                LOCALIZER.append("factors", self.name, new)
+
+        data = LOCALIZER.load("factors", self.name)
+        filled = LOCALIZER.load("factors", self.name + "_fillna")
+        if filled is not None and len(filled):
+            pending = data.loc[data.index > filled.index[-1]]
+            if len(pending):
+                LOCALIZER.append("factors", self.name + "_fillna", self._fillna(pending, n_jobs=n_jobs))
+        self.__data = None
+        return self.get_exposures(n_jobs=n_jobs)
+
+    def _build_data(self, after=None):
         """
         1. get descriptors data
         2. get weight
@@ -111,11 +363,15 @@ class Factor:
 
         According to Barra handbook, if some of the descriptors of a factor is missing, use
         the non-missing data. And if all the descriptors are missing, use the fillna strategy.
+
+        Only the dates after `after` are built if it is given, which is used by incremental updates.
         """
         Logger.info("Generating factor data for {}".format(self.name))
         descriptors = []
         for descriptor in self.descriptors:
             df = descriptor.get_zscore()
+            if after is not None:
+                df = df.loc[df.index > after]
             descriptors.append(xr.DataArray(
                 np.expand_dims(df.values, 0),
                 dims=['descriptor', 'date', 'stock'],
@@ -125,6 +381,8 @@ class Factor:
                     'date': df.index.rename('date')
                 }
             ))
+        if not any(array.sizes['date'] for array in descriptors):
+            return pd.DataFrame(dtype="float64")
         descriptors = xr.concat(descriptors, 'descriptor')
         weights = xr.DataArray(
             np.array(self.weights),
@@ -141,42 +399,20 @@ class Factor:
             .to_pandas()
         )
         if self.disentangle:
-            disentangled = {}
-            exog = [getattr(Factor, f).get_exposures(True) for f in self.disentangle]
-            for idx, row in values.iterrows():
-                x = [df.loc[idx] for df in exog]
-                x.append(row.rename('target'))
-                df = pd.concat(x, 1).dropna(subset=['target']).fillna(0)
-                if not len(df):
-                    continue
-                series = LinearRegression().fit(df.values[:, :-1], df.values[:, -1]).predict(df.values[:, :-1])
-                disentangled[idx] = df.loc[:, 'target'] - pd.Series(series, index=df.index)
-            values = pd.DataFrame(disentangled).T
+            exog = {f: getattr(Factor, f).get_exposures(True) for f in self.disentangle}
+            values = orthogonalize(values, exog)
         values = size_weighted_standardize(values)
         return values
 
-    def _fillna(self, values):
+    def _fillna(self, values, n_jobs=1):
         cap = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv")
         size = Descriptor.LnCap().get_zscore()
-        industry = wind.get_stock_industries("AShareIndustriesClassCITICS")
+        # 增量更新时行业面板可能还没有覆盖新的日期
+        industry = wind.refresh_stock_industries(
+            "AShareIndustriesClassCITICS", until=values.index[-1] if len(values) else None)
         common_columns = sorted(set(industry.columns) & set(values.columns) & set(size.columns))
-        industry = industry[common_columns]
         values = values[common_columns]
-        data = {}
-        for idx in sorted(set(size.index) & set(industry.index) & set(values.index)):
-            s = size.loc[idx, common_columns]
-            industry_dummies = pd.get_dummies(industry.loc[idx])
-            try:
-                y = values.loc[idx]
-            except KeyError:
-                raise KeyError("{}@{}".format(self.name, idx))
-            x = pd.concat([s.rename('size'), industry_dummies, y], 1).dropna(subset=['size']+list(industry_dummies.columns))
-            y = x.iloc[:, -1]
-            x = x.iloc[:, :-1]
-            yhat = sm.WLS(y, x, weights=cap.loc[idx, x.index]**0.5).fit().fittedvalues
-            data[idx] = yhat
-        data = pd.DataFrame(data).T
-        values.update(data, overwrite=False)
+        values = fill_by_regression(values, size, industry, cap ** 0.5, n_jobs=n_jobs)
         values.index.name = "date"
         values.columns.name = "stock"
         return values
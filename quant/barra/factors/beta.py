@@ -1,9 +1,9 @@
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
-from tqdm import tqdm
 from ...common import LOCALIZER
-from ...common.math_helpers import exponential_decay_weight
+from ...common.math_helpers import Rolling
+from ...common.online import RollingAccumulator
 from ...data import wind
 from ..entities import get_estimation_universe
 from .base import Descriptor, Factor
@@ -22,24 +22,169 @@ class BetaDescriptor(Descriptor):
     The regression coefficients are estimated over the trailing 252 trading days of returns 
     with a half-life of 63 trading days.
     """
+    def __init__(self):
+        self.T = 252
+        self.halflife = 63
+
     @LOCALIZER.wrap(filename="descriptors", const_key="beta")
     def get_raw_value(self):
+        stock_rtns, R = self.get_inputs()
+        return rolling_beta(stock_rtns, R, self.T, self.halflife).dropna(axis=1, how="all")
+
+    def create_accumulators(self):
+        return {"moments": BetaAccumulator(self.T, halflife=self.halflife)}
+
+    def get_inputs(self):
         R = get_estimation_universe().get_returns().rename("R")
-        T = 252
-        halflife = 63
-        weights = exponential_decay_weight(halflife, T, reverse=True)
         stock_rtns = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100
-        df = pd.concat([R, stock_rtns.loc[R.index]], 1).truncate("2000-01-01")
-        df[df==0] = np.nan
-        result = []
-        for i in tqdm(range(T, len(df))):
-            sub_df = df.iloc[i-T:i].dropna(axis=1, thresh=T//2).dropna(subset=["R"])
-            X, Y = sub_df.iloc[:, 0], sub_df.iloc[:, 1:]
-            X, Y = (X - X.mean()).values, (Y - Y.mean()).values
-            XY = np.nansum(Y.T * X * weights, 1) / (~np.isnan(Y.T) @ weights)
-            XX = (X ** 2 * weights).sum()
-            result.append(pd.Series(XY / XX, index=sub_df.columns[1:], name=df.index[i]))
-        result = pd.concat(result, 1).T
-        return result
+        stock_rtns = stock_rtns.loc[R.index].truncate("2000-01-01")
+        stock_rtns[stock_rtns==0] = np.nan
+        R = R.truncate("2000-01-01").replace(0, np.nan)
+        return stock_rtns, R
+
+    def accumulate(self, accumulators, date, stock_rtn, market_rtn):
+        # The window of each date ends on the previous trading day
+        moments = accumulators["moments"]
+        beta = moments.beta().rename(date)
+        moments.update(market_rtn, stock_rtn, date)
+        return beta
+
+
+class BetaAccumulator(RollingAccumulator):
+    """
+    Online moments for :class:`BetaDescriptor`. For every stock the window keeps the unweighted and the
+    exponentially weighted sums of m, mY, mX, mXY, 1, X and X^2, where X is the market return, Y the stock
+    return and m marks the days on which the stock return is available.
+    """
+    channels = 7
+
+    def __init__(self, period, min_periods=None, halflife=None):
+        super(BetaAccumulator, self).__init__(period, period // 2 if min_periods is None else min_periods, halflife)
+
+    def _align(self, row):
+        width = len(self.columns)
+        values = super(BetaAccumulator, self)._align(row)
+        if 0 < width < len(self.columns):
+            # The market channels are the same for every stock, new stocks share the history
+            for field in ("_buffer", "_sums", "_weighted"):
+                array = getattr(self, field)
+                array[..., 4:, width:] = array[..., 4:, :1]
+        return values
+
+    def update(self, x, y, date=None):
+        y = self._align(y)
+        self._advance(date)
+        x = float(x)
+        if np.isnan(x):
+            # Days without a market return are left out of the window entirely
+            x, y = 0.0, np.full(y.shape, np.nan)
+            ones = np.zeros(y.shape)
+        else:
+            ones = np.ones(y.shape)
+        valid = ~np.isnan(y)
+        y = np.where(valid, y, 0.0)
+        mx = np.where(valid, x, 0.0)
+        self._push(np.stack([valid.astype("float64"), y, mx, mx * y, ones, ones * x, ones * x * x]))
+        return self
+
+    def beta(self) -> pd.Series:
+        """Beta of the current window, NaN until the window is full"""
+        if self._rows < self.period:
+            return self._series(np.full(len(self.columns), np.nan))
+        return self._series(beta_from_moments(self._sums, self._weighted, self.min_periods))
+
+
+def beta_from_moments(sums, weighted, min_periods):
+    """
+    Beta from window sums, as :class:`BetaDescriptor` has always defined it: both series are demeaned with
+    their unweighted means, the covariance is weighted over the days the stock has a return and normalized
+    by their total weight, and the variance of the market is weighted over the whole window.
+
+    Parameters
+    ==========
+    sums, weighted: np.ndarray
+        unweighted and weighted sums of m, mY, mX, mXY, 1, X, X^2, stacked along the first axis
+    min_periods: int
+        minimum number of days with a stock return
+    """
+    count, sum_y, _, _, days, sum_x, _ = sums
+    w_m, w_y, w_x, w_xy, w_all, w_xall, w_x2 = weighted
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = sum_x / days
+        mean_y = sum_y / count
+        xy = (w_xy - mean_x * w_y - mean_y * w_x + mean_x * mean_y * w_m) / w_m
+        xx = w_x2 - 2 * mean_x * w_xall + mean_x * mean_x * w_all
+        beta = xy / xx
+    return np.where(count >= min_periods, beta, np.nan)
+
+
+def rolling_beta(stock_rtns, market_rtn, T=252, halflife=63, min_periods=None, residual_variance=False):
+    """
+    Rolling beta of every stock against the market for all dates at once, with the same definition as
+    :func:`beta_from_moments`. The window of each date is the T trading days before it, so the first
+    T dates are NaN, and stocks with fewer than ``min_periods`` returns in the window are NaN.
+
+    All window sums are cumulative sums (unweighted) or one exponential recursion (weighted) over the
+    whole panel, see :meth:`quant.common.math_helpers.Rolling.window_sum`.
+
+    Parameters
+    ==========
+    stock_rtns: pd.DataFrame
+        date × stock returns, missing returns are NaN
+    market_rtn: pd.Series
+        market returns, days without a market return are left out
+    T: int
+        window length
+    halflife: int
+        half-life of the exponential weights
+    min_periods: int
+        minimum number of stock returns in the window, T//2 by default
+    residual_variance: bool
+        if True, also return the weighted variance of the residuals
+        :math:`(Y-\\bar{Y}) - \\beta (X-\\bar{X})` over the days the stock has a return
+
+    Returns
+    =======
+    pd.DataFrame, or (beta, residual variance) if residual_variance is True
+    """
+    min_periods = T // 2 if min_periods is None else min_periods
+    x = market_rtn.reindex(stock_rtns.index).values.astype("float64")
+    y = stock_rtns.values.astype("float64")
+    x_valid = ~np.isnan(x)
+    x = np.where(x_valid, x, 0.0)
+    valid = ~np.isnan(y) & x_valid[:, None]
+    y = np.where(valid, y, 0.0)
+    mx = valid * x[:, None]
+    plain = Rolling(stock_rtns, T)
+    weighted = Rolling(stock_rtns, T, halflife=halflife)
+    m = valid.astype("float64")
+    ones = x_valid.astype("float64")
+    # Row-level sums of the market are kept as columns and broadcast over the stocks
+    sums = (plain.window_sum(m), plain.window_sum(y), None, None,
+            plain.window_sum(ones)[:, None], plain.window_sum(x)[:, None], None)
+    w_sums = (weighted.window_sum(m), weighted.window_sum(y), weighted.window_sum(mx), weighted.window_sum(mx * y),
+              weighted.window_sum(ones)[:, None], weighted.window_sum(x)[:, None], weighted.window_sum(x * x)[:, None])
+    beta = beta_from_moments(sums, w_sums, min_periods)
+
+    def wrap(values):
+        # The window ending on day i - 1 belongs to day i
+        shifted = np.full(values.shape, np.nan)
+        shifted[T:] = values[T - 1:-1]
+        return pd.DataFrame(shifted, index=stock_rtns.index, columns=stock_rtns.columns).iloc[T:]
+
+    if not residual_variance:
+        return wrap(beta)
+    w_m, w_y, w_x, w_xy = w_sums[:4]
+    w_y2 = weighted.window_sum(y * y)
+    w_x2 = weighted.window_sum(mx * x[:, None])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = sums[5] / sums[4]
+        mean_y = sums[1] / sums[0]
+        yy = w_y2 - 2 * mean_y * w_y + mean_y * mean_y * w_m
+        xy = w_xy - mean_x * w_y - mean_y * w_x + mean_x * mean_y * w_m
+        xx = w_x2 - 2 * mean_x * w_x + mean_x * mean_x * w_m
+        variance = (yy - 2 * beta * xy + beta * beta * xx) / w_m
+    return wrap(beta), wrap(np.where(np.isnan(beta), np.nan, np.maximum(variance, 0)))
+
 
 Beta = Factor("Beta", [BetaDescriptor()], [1.0])
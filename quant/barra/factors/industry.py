@@ -1,63 +1,176 @@
 import numpy as np
 import pandas as pd
-import xarray as xr
+from scipy import sparse
 from lazy_object_proxy import Proxy
 from ...data import wind
 from .base import Descriptor, Factor
 
 
+INDUSTRY_NAMES = {
+    "汽车": "Automobile",
+    "轻工制造": "LightIndustry",
+    "医药": "Medical",
+    "基础化工": "FundamentalChemistry",
+    "传媒": "Media",
+    "建材": "BuildingMaterials",
+    "电力设备": "ElectricDevice",
+    "建筑": "Construction",
+    "电子元器件": "ElectronicComponents",
+    "房地产": "RealEstate",
+    "食品饮料": "Food",
+    "商贸零售": "Retail",
+    "石油石化": "Petroleum",
+    "综合": "Composite",
+    "计算机": "Computer",
+    "通信": "Communication",
+    "机械": "Mechanism",
+    "钢铁": "Iron",
+    "非银行金融": "NonbankFinance",
+    "交通运输": "Transportation",
+    "电力及公用事业": "Public",
+    "农林牧渔": "Agriculture",
+    "国防军工": "Military",
+    "家电": "ElectricalAppliance",
+    "纺织服装": "Clothing",
+    "有色金属": "NonferrousMetal",
+    "银行": "Bank",
+    "餐饮旅游": "Tourism",
+    "煤炭": "Coal",
+}
+
+
+class IndustryExposures:
+    """
+    全部股票的行业暴露，只保存一个日期 × 股票的行业序号面板（-1表示没有行业）。
+    每只股票每天只属于一个行业，0/1虚拟变量矩阵在需要时才生成
+    """
+    def __init__(self, codes: pd.DataFrame, names: list):
+        self.codes = codes
+        self.names = list(names)
+
+    @property
+    def factor_names(self) -> list:
+        """行业因子的名称，顺序与 ``names`` 相同"""
+        return ["Industry" + name for name in self.names]
+
+    def _get_codes(self, date, stocks=None) -> pd.Series:
+        codes = self.codes.loc[date]
+        if stocks is not None:
+            codes = codes.reindex(stocks, fill_value=-1)
+        return codes
+
+    def dummies(self, date, stocks=None) -> pd.DataFrame:
+        """
+        某一天的股票 × 行业的0/1稠密矩阵，不在面板中的股票整行为0
+        """
+        codes = self._get_codes(date, stocks)
+        rows = np.flatnonzero(codes.values >= 0)
+        data = np.zeros((len(codes), len(self.names)))
+        data[rows, codes.values[rows]] = 1.0
+        return pd.DataFrame(data, index=codes.index, columns=self.names)
+
+    def sparse(self, date, stocks=None) -> sparse.csr_matrix:
+        """同 :meth:`dummies` ，返回scipy稀疏矩阵"""
+        codes = self._get_codes(date, stocks)
+        rows = np.flatnonzero(codes.values >= 0)
+        return sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, codes.values[rows])),
+            shape=(len(codes), len(self.names))
+        )
+
+    def group_sum(self, values: pd.DataFrame) -> pd.DataFrame:
+        """
+        把日期 × 股票的面板按行业求和
+
+        Returns
+        =======
+        pd.DataFrame: 日期 × 行业，没有行业数据的日期为NaN
+        """
+        codes = (self.codes
+            .reindex(index=values.index, columns=values.columns)
+            .fillna(-1)
+            .values
+            .astype("int64")
+        )
+        data = values.values.astype("float64")
+        mask = (codes >= 0) & ~np.isnan(data)
+        rows = np.nonzero(mask)[0]
+        k = len(self.names)
+        sums = np.bincount(
+            rows * k + codes[mask], weights=data[mask], minlength=len(values) * k
+        ).reshape(len(values), k)
+        sums[~values.index.isin(self.codes.index)] = np.nan
+        return pd.DataFrame(sums, index=values.index, columns=self.names)
+
+    def get_exposures(self, position: pd.DataFrame, benchmark=None) -> pd.DataFrame:
+        """
+        持仓的行业暴露，与对每个行业调用 :func:`quant.common.math_helpers.get_factor_exposure` 相同
+
+        Parameters
+        ==========
+        position: pd.DataFrame
+            日期 × 股票的持仓权重
+        benchmark: str
+            要减去的指数的暴露，为None则不减。指数权重缺少的日期暴露为NaN
+        """
+        exposures = self.group_sum(position).div(position.sum(axis=1) + 1e-5, axis=0)
+        if benchmark:
+            weights = (wind
+                .get_index_weight("AIndexHS300FreeWeight", benchmark)
+                .reindex(position.index)
+            )
+            bench = self.group_sum(weights).div(weights.sum(axis=1) + 1e-5, axis=0)
+            # 没有指数权重的日期基准暴露未知，不能当作0
+            bench.loc[~weights.notna().any(axis=1).values] = np.nan
+            exposures -= bench
+        return exposures
+
+    def shift(self, periods: int=1) -> "IndustryExposures":
+        """沿日期平移面板，新出现的行没有行业"""
+        codes = self.codes.shift(periods).fillna(-1).astype(self.codes.values.dtype)
+        return IndustryExposures(codes, self.names)
+
+
+def _build_industry_exposures(until=None):
+    codes = wind.refresh_stock_industries("AShareIndustriesClassCITICS", 1, until=until)
+    industry_names = wind.get_industry_table("AShareIndustriesClassCITICS", 1).industriesname
+    names = list(INDUSTRY_NAMES.values())
+    # 最后一个位置把-1映射为-1
+    remap = np.full(len(industry_names) + 1, -1, dtype=codes.values.dtype)
+    for code, ind_name in industry_names.items():
+        if ind_name in INDUSTRY_NAMES:
+            remap[code] = names.index(INDUSTRY_NAMES[ind_name])
+    codes = pd.DataFrame(remap[codes.values], index=codes.index, columns=codes.columns)
+    return IndustryExposures(codes, names)
+
+
+def refresh_industry_exposures(until) -> "IndustryExposures":
+    """
+    缓存的行业面板没有覆盖到until时（例如有了新的交易日），重新生成 :data:`INDUSTRY_EXPOSURES`
+    和行业因子所用的行业代码
+    """
+    if not len(INDUSTRY_EXPOSURES.codes) or INDUSTRY_EXPOSURES.codes.index[-1] < until:
+        INDUSTRY_EXPOSURES.codes = _build_industry_exposures(until).codes
+    return INDUSTRY_EXPOSURES
+
+
 def _build_industry_factors():
-    industry_codes = {
-        "汽车": "Automobile",
-        "轻工制造": "LightIndustry",
-        "医药": "Medical",
-        "基础化工": "FundamentalChemistry",
-        "传媒": "Media",
-        "建材": "BuildingMaterials",
-        "电力设备": "ElectricDevice",
-        "建筑": "Construction",
-        "电子元器件": "ElectronicComponents",
-        "房地产": "RealEstate",
-        "食品饮料": "Food",
-        "商贸零售": "Retail",
-        "石油石化": "Petroleum",
-        "综合": "Composite",
-        "计算机": "Computer",
-        "通信": "Communication",
-        "机械": "Mechanism",
-        "钢铁": "Iron",
-        "非银行金融": "NonbankFinance",
-        "交通运输": "Transportation",
-        "电力及公用事业": "Public",
-        "农林牧渔": "Agriculture",
-        "国防军工": "Military",
-        "家电": "ElectricalAppliance",
-        "纺织服装": "Clothing",
-        "有色金属": "NonferrousMetal",
-        "银行": "Bank",
-        "餐饮旅游": "Tourism",
-        "煤炭": "Coal",
-    }
-    industries = wind.get_stock_industries("AShareIndustriesClassCITICS", 1)
     factors = {}
-    for ind_name, ind_key in industry_codes.items():
-        key = "Industry" + ind_key
-        data = (industries == ind_name).astype("float64")
-        factors[ind_key] = IndustryFactor(key, data)
+    for i, ind_key in enumerate(INDUSTRY_EXPOSURES.names):
+        factors[ind_key] = IndustryFactor("Industry" + ind_key, INDUSTRY_EXPOSURES, i)
     return factors
 
 
 class IndustryFactor(Factor):
-    def __init__(self, name, data):
+    def __init__(self, name, exposures, index):
         setattr(Factor, name, self)
         self.name = name
-        self.data = data
-    
+        self.exposures = exposures
+        self.index = index
+
     def get_exposures(self, fillna=None) -> pd.DataFrame:
-        return self.data
+        return (self.exposures.codes == self.index).astype("float64")
 
 
-try:
-    INDUSTRY_FACTORS = lazy_object_proxy.Proxy(_build_industry_factors)
-except Exception:
-    INDUSTRY_FACTORS = {}
+INDUSTRY_EXPOSURES = Proxy(_build_industry_exposures)
+INDUSTRY_FACTORS = Proxy(_build_industry_factors)
@@ -3,7 +3,6 @@ import numpy as np
 import pandas as pd
 from ...common import LOCALIZER
 from ...data import wind, to_trade_data
-from ...utils.calendar import TDay
 from .base import Descriptor, Factor
 
 
@@ -33,6 +32,8 @@ class MLEV(Descriptor):
     PE is the most recent book value of preferred equity, and LD is the 
     most recent book value of long-term debt.
     """
+    requires = ("descriptor/LD", )
+
     @LOCALIZER.wrap(filename="descriptors", const_key="mlev")
     def get_raw_value(self):
         me = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv") * 1e4
@@ -52,6 +53,8 @@ class BLEV(Descriptor):
     PE is the most recent book value of preferred equity, and LD is the 
     most recent book value of long-term debt.
     """
+    requires = ("descriptor/LD", )
+
     @LOCALIZER.wrap(filename="descriptors", const_key="blev")
     def get_raw_value(self):
         book_equity = to_trade_data(wind.get_wind_data("AShareBalanceSheet", "tot_shrhldr_eqy_excl_min_int", index="ann_dt")).fillna(0)
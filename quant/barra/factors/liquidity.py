@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 from ...common import LOCALIZER
+from ...common.online import RollingAccumulator
 from ...data import wind
 from .base import Descriptor, Factor
 
@@ -21,14 +22,39 @@ class STOM(Descriptor):
 
     @LOCALIZER.wrap(filename="descriptors", const_key="stom")
     def get_raw_value(self):
+        turnover, = self.get_inputs()
+        stom = np.log(turnover.rolling(self.T, min_periods=self.T//2).sum() + 1e-6)
+        return stom
+
+    def create_accumulators(self):
+        return {"rolling": RollingAccumulator(self.T, min_periods=self.T//2)}
+
+    def get_inputs(self):
         amount = wind.get_wind_data("AShareEODPrices", "s_dq_amount").replace(0, np.nan)
         size = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv")
-        stom = np.log((amount / size).dropna(how='all').rolling(self.T, min_periods=self.T//2).sum() + 1e-6)
-        return stom
+        return ((amount / size).dropna(how='all'), )
+
+    def accumulate(self, accumulators, date, turnover):
+        return np.log(accumulators["rolling"].update(turnover, date).sum() + 1e-6)
+
+
+class _TrailingTurnover:
+    """STOQ和STOA的增量更新：STOM先增量更新，再对exp(STOM)做滚动平均"""
+    requires = ("descriptor/STOM", )
+
+    def create_accumulators(self):
+        trailing = self.T*21
+        return {"rolling": RollingAccumulator(trailing, min_periods=trailing//2)}
+
+    def get_inputs(self):
+        return (np.exp(STOM().update_raw_value()), )
+
+    def accumulate(self, accumulators, date, turnover):
+        return np.log(accumulators["rolling"].update(turnover, date).mean())
 
 
 @Descriptor.register("STOQ")
-class STOQ(Descriptor):
+class STOQ(_TrailingTurnover, Descriptor):
     r"""
     Share turnover, trailing 3 months
 
@@ -51,7 +77,7 @@ class STOQ(Descriptor):
 
 
 @Descriptor.register("STOA")
-class STOA(Descriptor):
+class STOA(_TrailingTurnover, Descriptor):
     r"""
     Share turnover, trailing 12 months
 
@@ -1,7 +1,8 @@
 import numpy as np
 import pandas as pd
 from ...common import LOCALIZER
-from ...common.math_helpers import exponential_decay_weight
+from ...common.math_helpers import Rolling
+from ...common.online import RollingAccumulator, ShiftAccumulator
 from ...data import wind
 from .base import Descriptor, Factor
 
@@ -18,18 +19,29 @@ class RSTR(Descriptor):
     where :math:`r_t` is the stock return on day t, :math:`r_{ft}` is the risk-free return, and :math:`w_t` is an
     exponential weight with a half-life of 126 trading days.
     """
+    def __init__(self):
+        self.T = 252
+        self.L = 21
+        self.halflife = 126
+
     @LOCALIZER.wrap(filename="descriptors", const_key="rstr")
     def get_raw_value(self):
-        # TODO: weighted isnull
-        T = 252
-        L = 21
-        halflife = 126
-        weights = exponential_decay_weight(halflife, T)
-        data = np.log1p(wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100)
-        # Truncated exponential moving average
-        # return Rolling(data, T, min_periods=T//2).apply(lambda y: np.nansum(y*weights) / (~np.isnan(y) @ weights)).shift(L)
-        # return data.rolling(T).apply(lambda y: np.nansum(y*weights) / (~np.isnan(y) @ weights)).shift(L)
-        return data.ewm(halflife=halflife).mean().shift(L)
+        data, = self.get_inputs()
+        # Truncated exponential moving average, missing days are excluded from the weights
+        return Rolling(data, self.T, min_periods=self.T//2, halflife=self.halflife).mean().shift(self.L)
+
+    def create_accumulators(self):
+        return {
+            "rolling": RollingAccumulator(self.T, min_periods=self.T//2, halflife=self.halflife),
+            "lag": ShiftAccumulator(self.L),
+        }
+
+    def get_inputs(self):
+        return (np.log1p(wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100), )
+
+    def accumulate(self, accumulators, date, log_rtn):
+        mean = accumulators["rolling"].update(log_rtn, date).mean()
+        return accumulators["lag"].update(mean, date)
 
 
 Momentum = Factor("Momentum", [RSTR()], [1.0])
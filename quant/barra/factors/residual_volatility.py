@@ -1,9 +1,9 @@
-from functools import partial
 import numpy as np
 import pandas as pd
 from sklearn.linear_model import LinearRegression
 from ...common import LOCALIZER
-from ...common.math_helpers import exponential_decay_weight, Rolling
+from ...common.math_helpers import Rolling
+from ...common.online import RollingAccumulator
 from ...data import wind
 from ..entities import get_estimation_universe
 from .base import Descriptor, Factor
@@ -24,16 +24,20 @@ class DASTD(Descriptor):
 
     @LOCALIZER.wrap(filename="descriptors", const_key="dastd")
     def get_raw_value(self):
-        weights = exponential_decay_weight(self.halflife, self.T, reverse=True)
         data = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100
         data[data==0] = np.nan
-        return data.ewm(halflife=self.halflife).std()
-        # return Rolling(data, self.T, min_periods=self.T//2).apply(partial(self.ewmstd, weights=weights))
+        return Rolling(data, self.T, min_periods=self.T//2, halflife=self.halflife).std()
 
-    def ewmstd(self, series, weights):
-        if np.isnan(series).all():
-            return np.nan
-        return np.sqrt(np.nansum(((series-series.mean())**2 * weights)) / (~np.isnan(series) @ weights))
+    def create_accumulators(self):
+        return {"rolling": RollingAccumulator(self.T, min_periods=self.T//2, halflife=self.halflife)}
+
+    def get_inputs(self):
+        data = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100
+        data[data==0] = np.nan
+        return (data, )
+
+    def accumulate(self, accumulators, date, rtn):
+        return accumulators["rolling"].update(rtn, date).std()
 
 
 @Descriptor.register("CMRA")
@@ -52,13 +56,28 @@ class CMRA(Descriptor):
     @LOCALIZER.wrap(filename="descriptors", const_key="cmra")
     def get_raw_value(self):
         daily_rtn = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange") / 100
-        trailing = self.months * self.days_per_month
-        return Rolling(daily_rtn.rolling, trailing, min_periods=trailing//2).apply(self.cmra)
+        return self.cmra(np.log1p(daily_rtn))
 
-    def cmra(self, series):
-        monthly_rtn = series.reshape(self.months, self.days_per_month).sum()
-        z = np.log1p(np.log1p(monthly_rtn))
-        return z.max() - z.min()
+    def cmra(self, log_rtn):
+        """
+        ln(1 + Z(T)) is the cumulative log return of the last T months, so every Z(T) is a difference
+        of the cumulative sum of daily log returns and CMRA = max ln(1 + Z(T)) - min ln(1 + Z(T))
+        """
+        trailing = self.months * self.days_per_month
+        values = log_rtn.values
+        valid = ~np.isnan(values)
+        cumsum = np.cumsum(np.where(valid, values, 0), axis=0)
+        count = np.cumsum(valid, axis=0)
+        count[trailing:] = count[trailing:] - count[:-trailing]
+        z_max = np.full(values.shape, -np.inf)
+        z_min = np.full(values.shape, np.inf)
+        for month in range(1, self.months + 1):
+            days = month * self.days_per_month
+            z = cumsum[days:] - cumsum[:-days]
+            np.maximum(z_max[days:], z, out=z_max[days:])
+            np.minimum(z_min[days:], z, out=z_min[days:])
+        cmra = np.where((count >= trailing // 2) & (z_max >= z_min), z_max - z_min, np.nan)
+        return pd.DataFrame(cmra, index=log_rtn.index, columns=log_rtn.columns)
 
 
 @Descriptor.register("HSigma")
@@ -71,6 +90,8 @@ class HSigma(Descriptor):
     63 trading days.
     The Residual Volatility factor is orthogonalized with respect to Beta and Size to reduce collinearity.
     """
+    requires = ("descriptor/Beta", )
+
     def __init__(self):
         self.T = 252
         self.halflife = 63
@@ -79,15 +100,16 @@ class HSigma(Descriptor):
     def get_raw_value(self):
         rtns = wind.get_wind_data("AShareEODPrices", "s_dq_pctchange").loc["2005-01-01":] / 100
         beta = Descriptor.Beta().get_raw_value()
-        resid = {}
-        common_index = sorted(set(rtns.index) & set(beta.index))
         R = get_estimation_universe().get_returns()
-        for idx in common_index:
-            row = rtns.loc[idx]
-            resid[idx] = row - beta.loc[idx] * R.loc[idx]
-        resid = pd.DataFrame(resid).T
-        sigma = pd.ewmstd(resid, halflife=self.T)
-        return sigma
+        resid = self.residuals(rtns, beta, R)
+        return Rolling(resid, self.T, min_periods=self.T//2, halflife=self.halflife).std()
+
+    @staticmethod
+    def residuals(rtns, beta, R):
+        """Residual returns r - beta * R as one broadcast panel on the dates shared by all inputs"""
+        index = rtns.index.intersection(beta.index).intersection(R.index)
+        beta = beta.reindex(index=index, columns=rtns.columns)
+        return rtns.loc[index] - beta.mul(R.loc[index], axis=0)
 
 
 ResidualVolatility = Factor("ResidualVolatility", [DASTD(), CMRA(), HSigma()], [0.74, 0.16, 0.10], disentangle=["Size", "Beta"])
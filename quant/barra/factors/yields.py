@@ -1,86 +1,172 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-import xarray as xr
-from tqdm import tqdm
-import statsmodels.api as sm
 from ...data import wind
 from ...common import LOCALIZER
 from ...common.logging import Logger
-from ...transform import get_rtn
+from ...transform import cross_sectional_regression
 from .base import Factor, Descriptor
-from .industry import INDUSTRY_FACTORS
+from .industry import INDUSTRY_EXPOSURES, refresh_industry_exposures
 
 
-def get_industry_weights(size, industries):
-    common_index = sorted(set(size.index) & set(industries.stock.data))
-    size = size[common_index]
-    industries = industries.sel(stock=common_index)
-    weight = {}
-    for industry in industries.factor.data:
-        weight[industry] = size[industries.sel(factor=industry).fillna(0).to_pandas().astype(bool)].sum()
-    weight = pd.Series(weight) / sum(weight.values())
-    return weight
+def get_industry_weights(size, industries, date):
+    """当天各行业的市值占比"""
+    weight = industries.group_sum(size.loc[[date]]).iloc[0]
+    return weight / weight.sum()
+
+
+def _previous_rows(data: pd.DataFrame, dates: pd.Index, columns: pd.Index) -> pd.DataFrame:
+    """
+    ``data.shift(1)`` 在给定日期上的行，按columns对齐。只读取需要的行，内存映射的面板不会被整个载入
+    """
+    positions = data.index.get_indexer(dates) - 1
+    valid = positions >= 0
+    values = np.asarray(data.values)[np.where(valid, positions, 0)].astype("float64")
+    values[~valid] = np.nan
+    return pd.DataFrame(values, index=dates, columns=data.columns).reindex(columns=columns)
+
+
+def _block_returns(prices: pd.DataFrame, dates: pd.Index) -> pd.DataFrame:
+    """
+    给定日期相对价格面板前一行的收益率，按当天截面的均值±3倍标准差截断。
+    只读取这些日期及其前一行
+    """
+    current = prices.loc[dates].astype("float64")
+    returns = current / _previous_rows(prices, dates, prices.columns) - 1
+    mean, std = returns.mean(axis=1), returns.std(axis=1)
+    return returns.clip(mean - std * 3, mean + std * 3, axis=0)
+
+
+def _block_yields(y, exposures, codes, cap, industry_names):
+    """
+    一个区块内各日期的因子收益率，在子进程中运行
+
+    带行业约束的WLS（国家 + 风格 + 行业，行业收益率的市值加权和为0）用闭式解求出：
+    去掉国家因子的回归拟合值相同，约束后的行业收益率等于不带约束的行业收益率减去其市值加权平均，
+    这个平均值就是国家因子的收益率
+    """
+    # 某个风格因子在当天整个截面上缺失时，当天的回归不包含该因子
+    present = {name: np.isfinite(data.values).any(axis=1) for name, data in exposures.items()}
+    exposures = {
+        name: data.where(np.broadcast_to(present[name][:, None], data.shape), 0.0)
+        for name, data in exposures.items()
+    }
+    result = cross_sectional_regression(
+        y, exposures, industries=codes, weights=cap ** 0.5,
+        industry_names=industry_names, block_size=len(y)
+    )
+    yields = result.coefficients
+    for name, mask in present.items():
+        yields.loc[~mask, name] = np.nan
+
+    k = len(industry_names)
+    c = codes.fillna(-1).values.astype("int64")
+    size = cap.values
+    mask = (c >= 0) & np.isfinite(size)
+    rows = np.nonzero(mask)[0]
+    industry_caps = np.bincount(rows * k + c[mask], weights=size[mask], minlength=len(y) * k).reshape(len(y), k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        industry_weights = industry_caps / industry_caps.sum(axis=1, keepdims=True)
+    cne_yield = np.nansum(industry_weights * yields[industry_names].values, axis=1)
+    yields[industry_names] = yields[industry_names].values - cne_yield[:, None]
+    return yields
 
 
 @LOCALIZER.wrap("factor_yields.h5", const_key="yields")
-def get_factor_yields():
+def get_factor_yields(block_size=250, n_jobs=1):
+    """
+    每日的因子收益率：股票收益率对前一天的风格因子暴露和行业哑变量做截面WLS回归，权重为市值的平方根
+
+    按日期分块计算：每个区块只从内存映射的价格、市值和因子暴露面板中读取本区块的行（收益率多读前一行），
+    收益率和截断也在区块内计算，所以内存占用取决于 ``block_size`` 和 ``n_jobs`` ，与历史长度无关
+
+    Parameters
+    ==========
+    block_size: int
+        每个区块的日期数
+    n_jobs: int
+        子进程数
+
+    Returns
+    =======
+    pd.DataFrame
+        日期 × 因子，风格因子和行业因子按名称排序
+    """
+    return _compute_factor_yields(block_size=block_size, n_jobs=n_jobs)
+
+
+def update_factor_yields(block_size=250, n_jobs=1):
+    """
+    把 :func:`get_factor_yields` 缓存之后的新日期的因子收益率追加到缓存中，需要先更新因子暴露
+
+    Returns
+    =======
+    pd.DataFrame
+        更新后全部的因子收益率
+    """
+    cached = LOCALIZER.load("factor_yields.h5", "yields")
+    if cached is None:
+        return get_factor_yields(block_size=block_size, n_jobs=n_jobs)
+    new = _compute_factor_yields(cached.index[-1] if len(cached) else None, block_size, n_jobs)
+    if not len(new):
+        return cached
+    Logger.info("Appending {} rows to factor yields".format(len(new)))
+    LOCALIZER.append("factor_yields.h5", "yields", new)
+    return pd.concat([cached, new], axis=0)
+
+
+def _compute_factor_yields(after=None, block_size=250, n_jobs=1):
+    """after之后（为None时全部）日期的因子收益率"""
     Logger.info("Generating factor yields")
     size = wind.get_wind_data("AShareEODDerivativeIndicator", "s_val_mv")
+    prices = wind.get_wind_data("AShareEODPrices", "s_dq_adjclose")
 
-    yields = wind.get_wind_data("AShareEODPrices", "s_dq_adjclose").pct_change()
-    yields = yields.clip(yields.mean(1)-yields.std(1)*3, yields.mean(1)+yields.std(1)*3, axis=0)
-    yields = xr.DataArray(
-        np.expand_dims(yields.values, 2),
-        dims=['date', 'stock', 'factor'],
-        coords={
-            'date': list(yields.index),
-            'stock': list(yields.columns),
-            'factor': ['yields']
-        }
-    )
-
-    factors = []
-    for name, factor in Factor.get_factors().items():
-        factor = factor.get_exposures(fillna=False).shift(1)
-        factor = xr.DataArray(
-            np.expand_dims(factor.values, 2),
-            dims=['date', 'stock', 'factor'],
-            coords={
-                'date': list(factor.index),
-                'stock': list(factor.columns),
-                'factor': [name]
-            }
-        )
-        factors.append(factor)
-    factors = xr.concat(factors, 'factor')
-
-    industry_factors = [f for f in factors.factor.data if f.startswith("Industry")]
-
-    data = xr.concat([factors, yields], 'factor').sel(date=slice("2005-01-01", None))
-    yields_data = {}
-    for date in tqdm(data.date.data):
-        row = data.sel(date=date).dropna('factor', how='all').dropna('stock').transpose("stock", "factor")
-        try:
-            x = row.sel(factor=sorted(f for f in row.factor.data if f != "yields"))
-            w = size.loc[date, row.stock.data] ** 0.5
-            y = row.sel(factor="yields")
-            valid = (x.isnull().sum('factor') < len(x.factor.data) / 2) & (~y.isnull())
-            x = x.fillna(0.0).values[valid, :]
-            y = y.values[valid]
-            w = w.values[valid]
-        except KeyError:
-            continue
-        model = sm.WLS(y, x, weights=w, missing='drop').fit()
-        beta = pd.Series(model.params, index=sorted(f for f in row.factor.data if f != "yields"))
-        
-        # Extract yield of country factor from industry factors
-        industry_weights = get_industry_weights(size.loc[date], factors.sel(factor=industry_factors, date=date))
-        cne_yield = (industry_weights * beta[industry_factors]).sum()
-        beta[industry_factors] -= cne_yield
-
-        yields_data[date] = beta
-    yields_data = pd.DataFrame(yields_data).T
-    return yields_data
+    dates = prices.index[prices.index >= "2005-01-01"]
+    if after is not None:
+        dates = dates[dates > after]
+    if len(dates):
+        # 增量更新时行业面板可能还没有覆盖新的日期
+        refresh_industry_exposures(dates[-1])
+    # 没有行业数据的日期跳过
+    covered = dates.isin(INDUSTRY_EXPOSURES.codes.index)
+    if not covered.all():
+        Logger.warn("Skipped {} dates without industry data, the first is {}".format(
+            (~covered).sum(), dates[~covered][0]))
+    dates = dates[covered]
+    columns = prices.columns
 
+    factors = {
+        name: factor.get_exposures(fillna=False)
+        for name, factor in Factor.get_factors().items()
+        if not name.startswith("Industry")
+    }
+    industry_factors = INDUSTRY_EXPOSURES.factor_names
 
+    def tasks():
+        for start in range(0, len(dates), block_size):
+            block = dates[start:start + block_size]
+            yield (
+                _block_returns(prices, block),
+                {name: _previous_rows(factor, block, columns) for name, factor in factors.items()},
+                _previous_rows(INDUSTRY_EXPOSURES.codes, block, columns),
+                size.reindex(index=block, columns=columns),
+                industry_factors,
+            )
 
+    results = []
+    if n_jobs > 1:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            # 同时提交的区块数有上限
+            pending = deque()
+            for task in tasks():
+                pending.append(executor.submit(_block_yields, *task))
+                if len(pending) >= 2 * n_jobs:
+                    results.append(pending.popleft().result())
+            results.extend(future.result() for future in pending)
+    else:
+        results = [_block_yields(*task) for task in tasks()]
+    if not results:
+        return pd.DataFrame(columns=sorted(list(factors) + industry_factors), dtype="float64")
+    yields_data = pd.concat(results, axis=0).dropna(how="all")
+    return yields_data[sorted(yields_data.columns)]
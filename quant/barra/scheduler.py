@@ -0,0 +1,219 @@
+"""
+以依赖图的方式生成全部Barra缓存
+
+依赖图由各个注册表生成：用 :meth:`quant.barra.factors.Descriptor.register` 注册的描述符、
+:meth:`quant.barra.factors.Factor.get_factors` 中的风格因子和 :data:`quant.barra.factors.INDUSTRY_FACTORS`
+中的行业因子。节点名称为
+
+================================ ==========================================================
+``universe``                     估计池的权重和收益率
+``industries``                   行业因子所用的行业代码面板
+``descriptor/<name>``            描述符的原始值和z-score
+``factor/<name>``                风格因子的暴露（含缺失值填充）
+``yields``                       因子收益率
+================================ ==========================================================
+
+描述符依赖估计池和 ``requires`` 中的节点；因子依赖它的描述符、正交化所用的因子，
+以及填充缺失值所用的LnCap和行业；因子收益率依赖全部风格因子和行业。
+
+互不依赖的节点在子进程中并行运行。每个节点都是增量更新（参见
+:meth:`quant.barra.factors.Factor.update_exposures` ），缓存已经到最后一个交易日的节点被跳过。
+
+Examples
+========
+
+..  code-block::
+    bash
+
+    quantlib factors build --n_jobs=4
+"""
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pandas as pd
+from ..common import LOCALIZER
+from ..common.logging import Logger
+from ..data import wind
+from .entities.portfolio import update_estimation_universe, _resolve_filters, _estimation_universe_returns
+from .factors import Descriptor, Factor, update_factor_yields
+from .factors.industry import refresh_industry_exposures
+
+__all__ = ['Node', 'build_graph', 'execute', 'build']
+
+Node = namedtuple("Node", ["name", "requires", "cache"])
+"""
+依赖图的节点
+
+name: str
+    节点名称，参见模块的说明
+requires: tuple
+    需要先生成的节点名称
+cache: tuple or None
+    (filename, key)，根据该缓存的最后一个日期判断节点是否已是最新，为None时总是运行
+"""
+
+
+def get_descriptors() -> dict:
+    """所有注册的描述符类，以名称为键"""
+    return {
+        name: getattr(Descriptor, name)
+        for name in dir(Descriptor)
+        if isinstance(getattr(Descriptor, name), type) and issubclass(getattr(Descriptor, name), Descriptor)
+    }
+
+
+def _style_factors() -> dict:
+    return {name: factor for name, factor in Factor.get_factors().items() if not name.startswith("Industry")}
+
+
+def build_graph() -> OrderedDict:
+    """
+    Returns
+    =======
+    OrderedDict
+        节点名称 -> :data:`Node`
+    """
+    filters = _resolve_filters(None, None, None)
+    nodes = [
+        Node("universe", (), ("estimation_universe", _estimation_universe_returns.cache_path(*filters))),
+        Node("industries", (), ("wind_industries.h5", "AShareIndustriesClassCITICS/1/codes")),
+    ]
+    for name, cls in get_descriptors().items():
+        nodes.append(Node("descriptor/" + name, ("universe", ) + tuple(cls.requires), ("descriptors", name + "_z")))
+    factors = _style_factors()
+    for name, factor in factors.items():
+        requires = ["descriptor/" + descriptor.name for descriptor in factor.descriptors]
+        requires += ["factor/" + f for f in factor.disentangle or []]
+        # 填充缺失值的回归用到LnCap和行业
+        requires += ["descriptor/LnCap", "industries"]
+        nodes.append(Node("factor/" + name, tuple(OrderedDict.fromkeys(requires)), ("factors", name + "_fillna")))
+    nodes.append(Node(
+        "yields",
+        ("industries", ) + tuple("factor/" + name for name in factors),
+        ("factor_yields.h5", "yields")
+    ))
+    graph = OrderedDict((node.name, node) for node in nodes)
+    for node in graph.values():
+        unknown = [name for name in node.requires if name not in graph]
+        if unknown:
+            raise ValueError("{} requires unknown nodes {}".format(node.name, unknown))
+    return graph
+
+
+def _run_node(name) -> float:
+    """在子进程中生成一个节点，返回耗时（秒）"""
+    start = time.time()
+    kind, _, key = name.partition("/")
+    if name == "universe":
+        update_estimation_universe()
+    elif name == "industries":
+        refresh_industry_exposures(_target_date())
+    elif kind == "descriptor":
+        getattr(Descriptor, key)().update_zscore()
+    elif kind == "factor":
+        # 描述符节点已经先更新过了
+        getattr(Factor, key).update_exposures(update_descriptors=False)
+    elif name == "yields":
+        update_factor_yields()
+    else:
+        raise ValueError("Unknown node {}".format(name))
+    return time.time() - start
+
+
+def execute(graph, run=_run_node, up_to_date=None, n_jobs=1) -> pd.DataFrame:
+    """
+    按依赖顺序运行依赖图中的节点，互不依赖的节点并行运行
+
+    Parameters
+    ==========
+    graph: OrderedDict
+        节点名称 -> :data:`Node`
+    run: callable
+        在子进程中以节点名称调用，返回耗时（秒）。n_jobs > 1时必须可以pickle
+    up_to_date: callable, optional
+        以节点调用，返回True的节点被跳过
+    n_jobs: int
+        子进程数，为1时在单个线程中运行全部节点
+
+    Returns
+    =======
+    pd.DataFrame
+        以节点名称为索引，按完成顺序排列，列为status（'built', 'up-to-date', 'failed'，
+        或者因为依赖的节点失败而'blocked'）和seconds
+    """
+    pending = OrderedDict(graph)
+    finished, failed = set(), set()
+    report = OrderedDict()
+    executor = ProcessPoolExecutor(n_jobs) if n_jobs > 1 else ThreadPoolExecutor(1)
+    with executor:
+        running = {}
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for name, node in list(pending.items()):
+                    if any(r in failed for r in node.requires):
+                        del pending[name]
+                        failed.add(name)
+                        report[name] = ("blocked", 0.0)
+                        changed = True
+                    elif all(r in finished for r in node.requires):
+                        del pending[name]
+                        if up_to_date is not None and up_to_date(node):
+                            finished.add(name)
+                            report[name] = ("up-to-date", 0.0)
+                            changed = True
+                        else:
+                            running[executor.submit(run, name)] = name
+            if not running:
+                if pending:
+                    raise ValueError("Circular requirements among {}".format(list(pending)))
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    Logger.error("Failed to build {}: {!r}".format(name, e))
+                    failed.add(name)
+                    report[name] = ("failed", 0.0)
+                else:
+                    Logger.info("Built {} in {:.1f}s".format(name, seconds))
+                    finished.add(name)
+                    report[name] = ("built", seconds)
+    return pd.DataFrame.from_dict(report, orient="index", columns=["status", "seconds"])
+
+
+def _target_date():
+    """缓存需要更新到的日期，即日行情的最后一个交易日"""
+    return wind.get_wind_data("AShareEODPrices", "s_dq_pctchange").index[-1]
+
+
+def build(n_jobs=1, force=False) -> pd.DataFrame:
+    """
+    生成或更新全部Barra缓存，参见模块的说明
+
+    Parameters
+    ==========
+    n_jobs: int
+        子进程数
+    force: bool
+        即使缓存已经到最后一个交易日也运行所有节点
+
+    Returns
+    =======
+    pd.DataFrame
+        参见 :func:`execute`
+    """
+    graph = build_graph()
+    up_to_date = None
+    if not force:
+        target = _target_date()
+
+        def up_to_date(node):
+            if node.cache is None:
+                return False
+            last = LOCALIZER.last_index(*node.cache)
+            return last is not None and last >= target
+    return execute(graph, n_jobs=n_jobs, up_to_date=up_to_date)
@@ -1,4 +1,5 @@
 import os
+import shutil
 from inspect import signature
 from types import FunctionType
 from functools import wraps, singledispatch, update_wrapper
@@ -6,6 +7,7 @@ import pandas as pd
 from tables.exceptions import HDF5ExtError
 from ..common.settings import DATA_PATH
 from ..common.logging import Logger
+from .localize import MmapPanel, CODECS, CODEC_POLICY, file_lock
 
 
 class Localizer:
@@ -49,7 +51,7 @@ class Localizer:
         """
         self.path = path
 
-    def wrap(self, filename, keys=None, const_key=None, format="fixed"):
+    def wrap(self, filename, keys=None, const_key=None, format="fixed", codec=None):
         """
         装饰器，用来装饰要缓存结果的函数
 
@@ -61,8 +63,13 @@ class Localizer:
             需要跟踪的参数名
         const_key: str
             基础键名
-        format: {'fixed', 'table'}
-            详见pd.DataFrame.to_hdf
+        format: {'fixed', 'table', 'mmap'}
+            'fixed'和'table'详见pd.DataFrame.to_hdf；
+            'mmap'把数据保存为 :class:`quant.common.localize.MmapPanel` ，读取时以内存映射方式打开，
+            适合频繁载入的大面板数据。非数值型的数据仍然保存在hdf5文件中。
+        codec: str, optional
+            hdf5的压缩方式，参见 :data:`quant.common.localize.CODECS` 。
+            默认由 :data:`quant.common.localize.CODEC_POLICY` 按文件名决定
 
         ::
 
@@ -70,16 +77,13 @@ class Localizer:
         """
         if keys is None and const_key is None:
             raise ValueError("Either `keys` or `const_key` must not be None")
-        filename = os.path.join(self.path, filename)
-        if not filename.endswith(".h5"):
-            filename += ".h5"
         if keys is None:
             keys = []
         if isinstance(keys, str):
             keys = [keys]
+        name = filename
         def true_wrapper(wrapped):
-            @wraps(wrapped)
-            def func(*args, **kwargs):
+            def cache_path(*args, **kwargs):
                 sig = signature(wrapped)
                 bounded = sig.bind(*args, **kwargs)
                 bounded.apply_defaults()
@@ -88,18 +92,212 @@ class Localizer:
                     path = os.path.join(path, const_key)
                 if not path:
                     path = "data"
-                try:
-                    data = pd.read_hdf(filename, path)
-                except (KeyError, FileNotFoundError):
+                return path
+
+            @wraps(wrapped)
+            def func(*args, **kwargs):
+                # 在调用时才确定文件路径，修改self.path后缓存写到新的目录
+                filename, mmap_dir = self._files(name)
+                path = cache_path(*args, **kwargs)
+                if format == "mmap":
+                    panel = MmapPanel(os.path.join(mmap_dir, path))
+                    data = self._read_mmap(filename, panel)
+                    if data is not None:
+                        return data
+                data = self._read_hdf(filename, path)
+                if data is not None:
+                    return data
+                # 同一份缓存只由一个进程计算，其它进程等待计算完成后直接读取
+                with self.lock(filename, path):
+                    data = self._read_mmap(filename, panel) if format == "mmap" else None
+                    if data is None:
+                        data = self._read_hdf(filename, path)
+                    if data is not None:
+                        return data
                     data = wrapped(*args, **kwargs)
+                    if format == "mmap" and MmapPanel.supports(data):
+                        with self.lock(filename):
+                            panel.write(data)
+                        return self._read_mmap(filename, panel)
+                    compression = CODEC_POLICY.resolve(filename) if codec is None else CODECS[codec]
                     try:
-                        data.to_hdf(filename, path, format=format)
+                        with self.lock(filename):
+                            data.to_hdf(filename, key=path, format="fixed" if format == "mmap" else format, **compression)
                     except HDF5ExtError as e:
                         Logger.error("Can't write to HDF5. {}".format(e))
                 return data
+            # 记录缓存文件名、基础键名和键名的计算方法，以便增量更新时找到对应的缓存
+            func.cache_file = name
+            func.const_key = const_key
+            func.cache_path = cache_path
             return func
         return true_wrapper
 
+    def _files(self, filename):
+        """缓存文件名对应的hdf5文件和内存映射目录"""
+        filename = os.path.join(self.path, filename)
+        if filename.endswith(".h5"):
+            filename = filename[:-3]
+        return filename + ".h5", filename + ".mmap"
+
+    def lock(self, filename, key=None, shared=False):
+        """
+        缓存文件的跨进程锁，参见 :func:`quant.common.localize.file_lock`
+
+        不指定key时锁住整个hdf5文件，用于读写；指定key时只锁住这一份缓存，
+        用于避免多个进程重复计算同一份数据
+
+        Examples
+        ========
+
+        ..  code-block::
+            python
+
+            with LOCALIZER.lock("descriptors", "dastd"):
+                ...
+        """
+        h5, _ = self._files(filename)
+        base = h5[:-3]
+        path = base + ".lock" if key is None else os.path.join(base + ".locks", key + ".lock")
+        return file_lock(path, shared=shared)
+
+    def _read_hdf(self, filename, key, lock=True):
+        """读取hdf5缓存，不存在时返回None"""
+        h5, _ = self._files(filename)
+        if not os.path.exists(h5):
+            return None
+        try:
+            if not lock:
+                return pd.read_hdf(h5, key)
+            with self.lock(filename, shared=True):
+                return pd.read_hdf(h5, key)
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def _read_mmap(self, filename, panel):
+        """
+        打开内存映射缓存，不存在时返回None。持有共享锁，不会读到 :meth:`append` 追加了一半的面板
+        """
+        with self.lock(filename, shared=True):
+            if panel.exists:
+                # 写时复制：调用方原地修改数据时不会写回缓存文件
+                return panel.read(mode="c")
+        return None
+
+    def load(self, filename, key):
+        """
+        读取 :meth:`wrap` 缓存的数据，不存在时返回None
+
+        Parameters
+        ==========
+        filename: str
+            缓存文件名
+        key: str
+            缓存的键名，即参数值与const_key组成的路径
+        """
+        h5, mmap_dir = self._files(filename)
+        data = self._read_mmap(filename, MmapPanel(os.path.join(mmap_dir, key)))
+        if data is not None:
+            return data
+        return self._read_hdf(filename, key)
+
+    def last_index(self, filename, key):
+        """
+        缓存数据的最后一个行索引（日期），只读取最后一行。缓存不存在或为空时返回None
+        """
+        h5, mmap_dir = self._files(filename)
+        panel = MmapPanel(os.path.join(mmap_dir, key))
+        with self.lock(filename, shared=True):
+            index = panel.index if panel.exists else None
+        if index is not None:
+            return index[-1] if len(index) else None
+        if not os.path.exists(h5):
+            return None
+        with self.lock(filename, shared=True):
+            with pd.HDFStore(h5, mode="r") as store:
+                if key not in store:
+                    return None
+                last = store.select(key, start=-1)
+        return last.index[-1] if len(last) else None
+
+    def append(self, filename, key, data, codec=None):
+        """
+        在缓存的数据末尾追加新的行（日期），缓存不存在时直接写入。
+        内存映射格式只在文件末尾追加，hdf5格式按原有的格式重写
+
+        Parameters
+        ==========
+        filename: str
+            缓存文件名
+        key: str
+            缓存的键名
+        data: pd.DataFrame
+            新的行，日期必须在已有数据之后
+        """
+        h5, mmap_dir = self._files(filename)
+        panel = MmapPanel(os.path.join(mmap_dir, key))
+        with self.lock(filename):
+            if panel.exists:
+                panel.append(data)
+                return
+            old = self._read_hdf(filename, key, lock=False)
+            format = "fixed"
+            if old is not None:
+                if len(data) and len(old) and data.index[0] <= old.index[-1]:
+                    raise ValueError("Appended rows must come after the last row {}".format(old.index[-1]))
+                with pd.HDFStore(h5, mode="r") as store:
+                    format = "table" if store.get_storer(key).is_table else "fixed"
+                data = pd.concat([old, data], axis=0)
+            compression = CODEC_POLICY.resolve(h5) if codec is None else CODECS[codec]
+            data.to_hdf(h5, key=key, format=format, **compression)
+
+    def remove(self, filename, key):
+        """删除一份缓存，不存在时什么也不做"""
+        h5, mmap_dir = self._files(filename)
+        panel = MmapPanel(os.path.join(mmap_dir, key))
+        with self.lock(filename):
+            if panel.exists:
+                shutil.rmtree(panel.path)
+            if os.path.exists(h5):
+                with pd.HDFStore(h5, mode="a") as store:
+                    if key in store:
+                        store.remove(key)
+
+    def refresh(self, func, *args, until=None, **kwargs):
+        """
+        调用被 :meth:`wrap` 装饰的函数，缓存的最后一个日期早于until时先删除缓存再重新计算。
+        用于不能追加新的行、但会随交易日延长的面板，例如行业代码和ST标记
+
+        Parameters
+        ==========
+        func: callable
+            被 :meth:`wrap` 装饰的函数，方法需要从类上取得并传入self
+        until: datetime, optional
+            缓存需要覆盖到的日期，为None时直接调用func
+
+        Examples
+        ========
+
+        ..  code-block::
+            python
+
+            LOCALIZER.refresh(type(wind).get_stock_industries, wind, "AShareIndustriesClassCITICS", until=date)
+        """
+        if until is not None:
+            key = func.cache_path(*args, **kwargs)
+            last = self.last_index(func.cache_file, key)
+            if last is not None and last < until:
+                Logger.info("Rebuilding {} {} to cover {}".format(func.cache_file, key, until))
+                self.remove(func.cache_file, key)
+        return func(*args, **kwargs)
+
+    def state_path(self, filename, key):
+        """
+        增量计算的状态文件（参见 :mod:`quant.common.online`）的路径，与缓存文件放在一起
+        """
+        h5, _ = self._files(filename)
+        return os.path.join(h5[:-3] + ".state", key + ".npz")
+
 
 LOCALIZER = Localizer(DATA_PATH)
 
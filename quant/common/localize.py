@@ -1 +1,423 @@
-from .decorators import Localizer, LOCALIZER
\ No newline at end of file
+"""
+内存映射的面板缓存格式
+
+每个面板保存为一个目录，包含：
+
+================ ===============================================
+values.npy       数据矩阵（行 × 列），C-order，可以用np.memmap直接打开
+index.npy        行索引，一般为datetime64
+columns.npy      列索引，unicode字符串
+meta.json        索引名称等附加信息
+================ ===============================================
+
+打开时只读取很小的索引文件，数据按需分页载入，因此载入几乎不耗时。
+这些文件都是标准的npy格式，其它工具不依赖pandas也可以直接读取：
+
+..  code-block::
+    python
+
+    values = np.load("values.npy", mmap_mode="r")
+    dates = np.load("index.npy")
+    stocks = np.load("columns.npy")
+
+hdf5缓存的压缩方式由 :data:`CODEC_POLICY` 决定，可以按缓存文件或数据表分别配置，
+参见 :class:`CodecPolicy` 。
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from .settings import CONFIG, MAIN_PATH
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = ['MmapPanel', 'CODECS', 'CodecPolicy', 'CODEC_POLICY', 'benchmark_codecs', 'file_lock']
+
+VALUES_FILE = "values.npy"
+INDEX_FILE = "index.npy"
+COLUMNS_FILE = "columns.npy"
+META_FILE = "meta.json"
+
+
+def _axis_to_array(axis: pd.Index) -> np.ndarray:
+    if isinstance(axis, pd.DatetimeIndex):
+        return np.asarray(axis.values)
+    values = np.asarray(axis)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+def _array_to_axis(values: np.ndarray, name=None) -> pd.Index:
+    if np.issubdtype(values.dtype, np.datetime64):
+        return pd.DatetimeIndex(values, name=name)
+    if values.dtype.kind == "U":
+        values = values.astype(object)
+    return pd.Index(values, name=name)
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    跨进程的文件锁，用法为 ``with file_lock(path): ...`` ，锁文件不存在时自动创建
+
+    Parameters
+    ==========
+    path: str
+        锁文件的路径
+    shared: bool
+        是否为共享锁（读锁）。Windows下只支持排他锁
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class MmapPanel:
+    """
+    以内存映射方式读写的二维面板数据（通常是日期 × 股票）
+
+    Examples
+    ========
+
+    ..  code-block::
+        python
+
+        panel = MmapPanel("~/.quantlib/data/returns")
+        panel.write(df)
+        df = panel.read()                   # 只读，数据按需载入
+        panel.append(new_df)                # 在原文件末尾追加新的日期
+        values = panel.values(mode="r+")    # 原地修改
+    """
+    def __init__(self, path):
+        """
+        Parameters
+        ==========
+        path: str
+            面板所在的文件夹
+        """
+        self.path = os.path.expanduser(path)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @property
+    def exists(self) -> bool:
+        """面板是否已经存在"""
+        return os.path.exists(self._file(VALUES_FILE))
+
+    @staticmethod
+    def supports(data) -> bool:
+        """判断数据能否保存为内存映射格式（只支持数值型的DataFrame）"""
+        if not isinstance(data, pd.DataFrame):
+            return False
+        return all(dtype.kind in "biuf" for dtype in data.dtypes)
+
+    def _meta(self):
+        try:
+            with open(self._file(META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    @property
+    def index(self) -> pd.Index:
+        """行索引"""
+        return _array_to_axis(np.load(self._file(INDEX_FILE)), self._meta().get("index_name"))
+
+    @property
+    def columns(self) -> pd.Index:
+        """列索引"""
+        return _array_to_axis(np.load(self._file(COLUMNS_FILE)), self._meta().get("columns_name"))
+
+    @property
+    def shape(self):
+        return self.values().shape
+
+    def values(self, mode="r") -> np.memmap:
+        """
+        以内存映射方式打开数据矩阵
+
+        Parameters
+        ==========
+        mode: {'r', 'r+', 'c'}
+            'r'为只读，'r+'可以原地修改并写回文件，'c'为写时复制（不写回文件）
+        """
+        return np.load(self._file(VALUES_FILE), mmap_mode=mode)
+
+    def read(self, mode="r") -> pd.DataFrame:
+        """
+        读取为DataFrame，数据不会被复制，只有在访问时才会从磁盘载入
+
+        Parameters
+        ==========
+        mode: {'r', 'r+', 'c'}
+            参见 :meth:`values`
+        """
+        return pd.DataFrame(self.values(mode), index=self.index, columns=self.columns, copy=False)
+
+    def write(self, data: pd.DataFrame):
+        """
+        把DataFrame写入（覆盖）面板。先写到临时目录再替换，避免写到一半时文件损坏。
+        """
+        if not self.supports(data):
+            raise TypeError("MmapPanel only supports numeric DataFrame")
+        values = np.ascontiguousarray(data.values)
+        parent = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = self.path.rstrip("/\\") + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, VALUES_FILE), values)
+        np.save(os.path.join(tmp_path, INDEX_FILE), _axis_to_array(data.index))
+        np.save(os.path.join(tmp_path, COLUMNS_FILE), _axis_to_array(data.columns))
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump({"index_name": data.index.name, "columns_name": data.columns.name}, f)
+        if os.path.exists(self.path):
+            old_path = self.path.rstrip("/\\") + ".old"
+            if os.path.exists(old_path):
+                shutil.rmtree(old_path)
+            os.rename(self.path, old_path)
+            os.rename(tmp_path, self.path)
+            shutil.rmtree(old_path)
+        else:
+            os.rename(tmp_path, self.path)
+
+    def append(self, data: pd.DataFrame):
+        """
+        在面板末尾追加新的行（日期）。
+
+        追加的数据的行索引必须全部大于已有的行索引。如果列都已存在，新数据直接写到
+        values.npy的末尾，只改写文件头，不会重写已有数据；如果出现了新的列，则需要
+        重写整个面板。
+        """
+        if not self.exists:
+            return self.write(data)
+        if len(data) == 0:
+            return
+        index = self.index
+        if len(index) and data.index[0] <= index[-1]:
+            raise ValueError("Appended rows must come after the last row {}".format(index[-1]))
+        columns = self.columns
+        if not data.columns.isin(columns).all():
+            union = columns.append(data.columns[~data.columns.isin(columns)])
+            old = self.read().reindex(columns=union)
+            self.write(pd.concat([old, data.reindex(columns=union)], axis=0))
+            return
+        dtype = self.values().dtype
+        values = np.ascontiguousarray(data.reindex(columns=columns).values.astype(dtype))
+        if not self._grow(values):
+            old = self.read()
+            self.write(pd.concat([old, data.reindex(columns=columns)], axis=0))
+            return
+        new_index = index.append(data.index)
+        np.save(self._file(INDEX_FILE), _axis_to_array(new_index))
+
+    def _grow(self, rows: np.ndarray) -> bool:
+        """把rows追加到values.npy的末尾并原地改写文件头。文件头空间不足时返回False。"""
+        with open(self._file(VALUES_FILE), "r+b") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                header_start = 10
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                header_start = 12
+            if fortran_order:
+                return False
+            header_length = f.tell() - header_start
+            new_shape = (shape[0] + rows.shape[0],) + tuple(shape[1:])
+            header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+                np.lib.format.dtype_to_descr(dtype), new_shape)
+            if len(header) + 1 > header_length:
+                return False
+            f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+            f.seek(header_start)
+            f.write((header.ljust(header_length - 1) + "\n").encode("latin1"))
+        return True
+
+    def remove(self):
+        """删除面板"""
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+
+CODECS = {
+    "none": {"complevel": 0},
+    "fast": {"complib": "blosc:lz4", "complevel": 1},
+    "blosc": {"complib": "blosc:blosclz", "complevel": 5},
+    "high": {"complib": "zlib", "complevel": 9},
+}
+"""
+可用的压缩方式，值为传给 :func:`pd.DataFrame.to_hdf` 的参数
+
+======= =========================================================
+none    不压缩，写入最快、体积最大
+fast    LZ4，压缩和解压都很快，适合频繁追加的数据
+blosc   blosc字节重排（shuffle）+ blosclz，对浮点型面板压缩效果较好
+high    zlib 9级，体积最小但最耗CPU
+======= =========================================================
+"""
+
+
+class CodecPolicy:
+    """
+    本地缓存的压缩策略
+
+    策略从 ``~/.quantlib/codecs.json`` 中读取，键为缓存文件名（不含后缀名）或
+    ``文件名/数据表名`` ，值为 :data:`CODECS` 中的压缩方式名称。查找时先匹配数据表，
+    再匹配文件名，最后使用配置项 ``cache_codec`` 。
+
+    ..  code-block::
+        javascript
+
+        {
+            "wind": "fast",
+            "wind/AShareConsensusData": "high",
+            "factors": "blosc"
+        }
+
+    没有配置时，wind原始数据表保持 ``high`` （zlib 9级），其它缓存不压缩。
+    """
+    DEFAULTS = {"wind": "high"}
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(MAIN_PATH, "codecs.json")
+        self._rules = None
+
+    @property
+    def rules(self) -> dict:
+        if self._rules is None:
+            rules = dict(self.DEFAULTS)
+            try:
+                with open(self.path) as f:
+                    rules.update(json.load(f))
+            except FileNotFoundError:
+                pass
+            self._rules = rules
+        return self._rules
+
+    def set(self, name, codec):
+        """在当前进程中为某个缓存文件或数据表指定压缩方式"""
+        if codec not in CODECS:
+            raise KeyError("Unknown codec `{}`, must be one of {}".format(codec, set(CODECS)))
+        self.rules[name] = codec
+
+    def get_codec(self, filename, table=None) -> str:
+        """
+        返回缓存文件（或其中的数据表）使用的压缩方式名称
+
+        Parameters
+        ==========
+        filename: str
+            缓存文件名，如"wind"、"factors"
+        table: str, optional
+            数据表名，如"AShareEODPrices"
+        """
+        filename = os.path.basename(filename)
+        if filename.endswith(".h5"):
+            filename = filename[:-3]
+        if table is not None and "/".join([filename, table]) in self.rules:
+            codec = self.rules["/".join([filename, table])]
+        elif filename in self.rules:
+            codec = self.rules[filename]
+        else:
+            codec = CONFIG.get("CACHE_CODEC", "none")
+        if codec not in CODECS:
+            raise KeyError("Unknown codec `{}`, must be one of {}".format(codec, set(CODECS)))
+        return codec
+
+    def resolve(self, filename, table=None) -> dict:
+        """返回传给to_hdf的压缩参数"""
+        return dict(CODECS[self.get_codec(filename, table)])
+
+
+CODEC_POLICY = CodecPolicy()
+
+
+def benchmark_codecs(data, codecs=None, format="fixed", repeat=3) -> pd.DataFrame:
+    """
+    在给定的数据上比较各种压缩方式的写入时间、读取时间和文件大小
+
+    Parameters
+    ==========
+    data: pd.DataFrame or pd.Series
+        用于测试的数据，最好是真实的面板数据
+    codecs: List[str], optional
+        要测试的压缩方式，默认为全部，数值型DataFrame还会额外测试内存映射格式("mmap")
+    format: {'fixed', 'table'}
+        hdf5的存储格式
+    repeat: int
+        重复次数，取最短的时间
+
+    Returns
+    =======
+    pd.DataFrame
+        每行为一种压缩方式，列为write(s)、read(s)、size(MB)和ratio（相对不压缩的大小）
+    """
+    codecs = list(codecs or CODECS.keys())
+    if "mmap" not in codecs and MmapPanel.supports(data):
+        codecs.append("mmap")
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in codecs:
+            write_times, read_times = [], []
+            for i in range(repeat):
+                if codec == "mmap":
+                    path = os.path.join(tmp, "{}_{}".format(codec, i))
+                    panel = MmapPanel(path)
+                    start = time.perf_counter()
+                    panel.write(data)
+                    write_times.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    np.asarray(panel.read()).sum()      # 强制载入全部数据
+                    read_times.append(time.perf_counter() - start)
+                    size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                else:
+                    path = os.path.join(tmp, "{}_{}.h5".format(codec, i))
+                    start = time.perf_counter()
+                    data.to_hdf(path, key="data", format=format, **CODECS[codec])
+                    write_times.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    pd.read_hdf(path, "data")
+                    read_times.append(time.perf_counter() - start)
+                    size = os.path.getsize(path)
+            result[codec] = {
+                "write(s)": min(write_times),
+                "read(s)": min(read_times),
+                "size(MB)": size / 1024 ** 2,
+            }
+    result = pd.DataFrame(result).T[["write(s)", "read(s)", "size(MB)"]]
+    if "none" in result.index:
+        result["ratio"] = result["size(MB)"] / result.loc["none", "size(MB)"]
+    return result
+
+
+def __getattr__(name):
+    # 兼容旧的导入路径 `from quant.common.localize import LOCALIZER`，
+    # decorators依赖本模块，只能在使用时才导入
+    if name in ("Localizer", "LOCALIZER"):
+        from . import decorators
+        return getattr(decorators, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
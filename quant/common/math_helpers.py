@@ -1,9 +1,11 @@
 import numpy as np
 import pandas as pd
 import pandas.tseries.offsets
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
 from ..data import wind
 
-__all__ = ['cal_mdd', 'get_ic', 'get_factor_exposure']
+__all__ = ['cal_mdd', 'get_ic', 'get_factor_exposure', 'get_factor_exposures']
 
 
 def cal_mdd(netvalue, compound=True):
@@ -46,23 +48,53 @@ def cal_mdd(netvalue, compound=True):
     return mdd
 
 
+def _row_corr(x, y):
+    """逐行计算相关系数，x和y中NaN的位置应相同，有效值少于2个或方差为0的行为NaN"""
+    valid = ~np.isnan(x)
+    count = valid.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dx = x - (np.nansum(x, axis=-1) / count)[..., None]
+        dy = y - (np.nansum(y, axis=-1) / count)[..., None]
+        cov = np.nansum(dx * dy, axis=-1)
+        var = np.nansum(dx * dx, axis=-1) * np.nansum(dy * dy, axis=-1)
+        corr = cov / np.sqrt(var)
+    corr[(count < 2) | ~(var > 0)] = np.nan
+    return corr
+
+
+def _panel_ic(x: pd.DataFrame, y: pd.DataFrame, method):
+    """x和y的索引与列已经对齐，两者同时有效的位置参与计算"""
+    mask = x.notnull().values & y.notnull().values
+    x, y = x.where(mask), y.where(mask)
+    if method == "spearman":
+        x, y = x.rank(axis=1), y.rank(axis=1)
+    return _row_corr(x.values.astype("float64"), y.values.astype("float64"))
+
+
 def get_ic(table1, table2, method="spearman"):
     """
     求两组数据之间的IC score
 
+    所有日期一次计算：先把两个数据框中同时有效的位置以外的值设为NaN，spearman对整个数据框
+    按行排序，再逐行求相关系数。table2可以包含多个期限的收益率，结果为日期 × 期限的IC矩阵。
+
     Parameters
     ----------
-    table1, table2: pd.DataFrame
-        要计算IC的两个数据框
+    table1: pd.DataFrame
+        因子值，日期 × 股票
+    table2: pd.DataFrame, dict or xr.DataArray
+        要计算IC的数据，日期 × 股票；也可以是以期限为键的数据框字典，或者
+        期限 × 日期 × 股票的xr.DataArray（如 :func:`quant.transform.get_forward_returns` 的结果）
     method: {'spearman', 'pearson', 'kendall'}
         * pearson : standard correlation coefficient
-        * kendall : Kendall Tau correlation coefficient
+        * kendall : Kendall Tau correlation coefficient，逐日计算
         * spearman : Spearman rank correlation
 
     Returns
     -------
-    pd.Series
-        每期的相关系数，求平均可得IC分数。
+    pd.Series or pd.DataFrame
+        每期的相关系数，求平均可得IC分数。table2为单个数据框时返回pd.Series，
+        否则返回日期 × 期限的pd.DataFrame
 
     See Also
     --------
@@ -86,13 +118,22 @@ def get_ic(table1, table2, method="spearman"):
         In [6]: get_ic(df1, df2)
     
     """
-    common_index = sorted(set(table1.index) & set(table2.index))
-    ic = pd.Series(np.empty(len(common_index)), index=common_index)
-    for date_idx in common_index:
-        rk1 = table1.loc[date_idx]
-        rk2 = table2.loc[date_idx]
-        corr = rk1.corr(rk2, method=method)
-        ic[date_idx] = corr
+    if not isinstance(table2, pd.DataFrame):
+        if not isinstance(table2, dict):
+            table2 = {key: table2.sel({table2.dims[0]: key}).to_pandas() for key in table2[table2.dims[0]].values}
+        return pd.DataFrame({key: get_ic(table1, value, method) for key, value in table2.items()}).dropna(how="all")
+    common_index = table1.index.intersection(table2.index).sort_values()
+    if method == "kendall":
+        ic = pd.Series(np.nan, index=common_index)
+        for date_idx in common_index:
+            ic[date_idx] = table1.loc[date_idx].corr(table2.loc[date_idx], method=method)
+        return ic.dropna()
+    if method not in ("spearman", "pearson"):
+        raise ValueError("Unknown method {}".format(method))
+    common_columns = table1.columns.intersection(table2.columns)
+    x = table1.reindex(index=common_index, columns=common_columns)
+    y = table2.reindex(index=common_index, columns=common_columns)
+    ic = pd.Series(_panel_ic(x, y, method), index=common_index)
     return ic.dropna()
 
 
@@ -107,22 +148,79 @@ def get_factor_exposure(position, factor_value, benchmark=None):
         每期的因子值
     benchmark: str
         要减去的指数的暴露，为None则不减
+
+    See Also
+    --------
+    get_factor_exposures
+    """
+    return get_factor_exposures(position, {"factor": factor_value}, benchmark)["factor"].rename(None)
+
+
+def get_factor_exposures(position, factors, benchmark=None, components=False):
+    """一次计算持仓在所有因子上的暴露
+
+    所有因子叠成因子 × 日期 × 股票的数组，组合暴露和基准暴露各用一次张量收缩求出，
+    指数权重只读取一次。
+
+    Parameters
+    ----------
+    position: pd.DataFrame
+        每期的持仓，日期 × 股票
+    factors: dict or xr.DataArray
+        以因子名为键、日期 × 股票的因子值为值的字典，或者因子 × 日期 × 股票的xr.DataArray
+    benchmark: str
+        要减去的指数的暴露，为None则不减
+    components: bool
+        如果为真，返回(组合暴露, 基准暴露, 相对暴露)，没有基准时基准暴露为0
+
+    Returns
+    -------
+    pd.DataFrame
+        日期 × 因子的暴露，因子值缺少的日期为NaN，有基准时指数权重缺少的日期也为NaN
+
+    Examples
+    --------
+
+    ..  code-block::
+        python
+
+        from quant.barra import Factor
+        from quant.common.math_helpers import get_factor_exposures
+        factors = {name: factor.get_exposures() for name, factor in Factor.get_factors().items()}
+        get_factor_exposures(position, factors, benchmark="000905.SH")
     """
-    data = pd.Series(np.empty(position.shape[0]), index=position.index)
+    if not isinstance(factors, dict):
+        dim = factors.dims[0]
+        factors = {key: factors.sel({dim: key}).to_pandas() for key in factors[dim].values}
+    names = list(factors.keys())
+    dates = position.index
     if benchmark:
-        weights = wind.get_index_weight("AIndexHS300FreeWeight", benchmark)
-    common_index = set(position.index) & set(factor_value.index)
-    for date in sorted(common_index):
-        absolute_exposure = ((position.loc[date] * factor_value.loc[date]).sum() / (position.loc[date].sum() + 1e-5))
-        if benchmark:
-            # 计算当前的基准因子暴露          
-            benchmark_exposure = (weights.loc[date] * factor_value.loc[date]).sum() / (weights.loc[date].sum() + 1e-5)
-            # 相对暴露等于组合暴露减基准暴露
-            relative_exposure = absolute_exposure - benchmark_exposure
-            data.loc[date] = relative_exposure
-        else:
-            data.loc[date] = absolute_exposure
-    return data
+        weights = wind.get_index_weight("AIndexHS300FreeWeight", benchmark).reindex(dates)
+        stocks = position.columns.union(weights.columns)
+    else:
+        stocks = position.columns
+    cube = np.stack([
+        factors[name].reindex(index=dates, columns=stocks).values.astype("float64") for name in names
+    ])
+    available = np.stack([dates.isin(factors[name].index) for name in names], axis=1)
+    cube = np.nan_to_num(cube)
+
+    def contract(w):
+        w = np.nan_to_num(w.reindex(columns=stocks).values.astype("float64"))
+        exposures = np.einsum("dn,kdn->dk", w, cube) / (w.sum(axis=1) + 1e-5)[:, None]
+        return pd.DataFrame(np.where(available, exposures, np.nan), index=dates, columns=names)
+
+    absolute = contract(position)
+    if benchmark:
+        benchmark_exposures = contract(weights)
+        # 没有指数权重的日期基准暴露未知，不能当作0
+        benchmark_exposures.loc[~weights.notna().any(axis=1).values] = np.nan
+    else:
+        benchmark_exposures = pd.DataFrame(0.0, index=dates, columns=names)
+    relative = absolute - benchmark_exposures
+    if components:
+        return absolute, benchmark_exposures, relative
+    return relative
 
 
 def exponential_decay_weight(halflife, truncate_length, reverse=True):
@@ -147,19 +245,119 @@ def exponential_decay_weight(halflife, truncate_length, reverse=True):
 
 
 class Rolling:
-    def __init__(self, data, period, min_periods=None):
+    r"""
+    滚动窗口计算，所有列同时计算，NaN不参与计算
+
+    不加权时mean, std, sum, max, min与pandas的rolling相同。加权时（weights或halflife）
+    窗口加权和用线性滤波一次算出：指数权重用递推 :math:`S_t = \lambda S_{t-1} + w x_t - w \lambda^T x_{t-T}`，
+    一般的权重用长度为T的FIR滤波；缺失值按0计入加权和，同时对有效值的指示变量做同样的加权和用于归一化。
+    有效值少于min_periods的窗口结果为NaN。
+
+    Parameters
+    ==========
+    data: pd.DataFrame
+        日期 × 股票
+    period: int
+        窗口长度
+    min_periods: int
+        窗口中最少的有效值个数，默认为period
+    weights: np.ndarray
+        长度为period的权重，按时间升序（最后一个对应当天）
+    halflife: int
+        截断指数权重的半衰期，与 ``weights=exponential_decay_weight(halflife, period)`` 相同，但计算更快
+
+    Examples
+    ========
+
+    ..  code-block::
+        python
+
+        from quant.common.math_helpers import Rolling
+        Rolling(returns, 252, min_periods=126, halflife=42).std()
+        alpha, beta = Rolling(returns, 252, min_periods=126).regress(market_returns)
+    """
+    def __init__(self, data, period, min_periods=None, weights=None, halflife=None):
         self.data = data
         self.period = period
         self.min_periods = period if min_periods is None else min_periods
-    
+        self.halflife = halflife
+        if halflife is not None:
+            weights = exponential_decay_weight(halflife, period, reverse=True)
+        if weights is not None:
+            weights = np.asarray(weights, dtype="float64")
+            if len(weights) != period:
+                raise ValueError("Length of weights should be equal to period")
+        self.weights = weights
+
+    def _values(self, data=None):
+        data = self.data if data is None else data
+        return np.asarray(data, dtype="float64")
+
+    def _wrap(self, values):
+        if isinstance(self.data, pd.Series):
+            return pd.Series(values, index=self.data.index, name=self.data.name)
+        return pd.DataFrame(values, index=self.data.index, columns=self.data.columns)
+
+    def _count(self, valid):
+        """窗口中有效值的个数"""
+        counts = np.cumsum(valid, axis=0, dtype="int64")
+        counts[self.period:] = counts[self.period:] - counts[:-self.period]
+        return counts
+
+    def window_sum(self, values):
+        """窗口（加权）和，沿第一维计算，values中不能有NaN"""
+        if self.weights is None:
+            sums = np.cumsum(values, axis=0)
+            sums[self.period:] = sums[self.period:] - sums[:-self.period]
+            return sums
+        if self.halflife is not None:
+            lamb = 0.5 ** (1 / self.halflife)
+            w = self.weights[-1]
+            b = np.zeros(self.period + 1)
+            b[0], b[-1] = w, -w * lamb ** self.period
+            return lfilter(b, [1.0, -lamb], values, axis=0)
+        return lfilter(self.weights[::-1], [1.0], values, axis=0)
+
+    def _moments(self, *arrays):
+        """
+        所有数组同时有效的位置上，权重和以及各数组的加权和
+
+        Returns
+        =======
+        (enough, weight, sums, valid)
+        """
+        valid = np.logical_and.reduce([~np.isnan(array) for array in arrays])
+        enough = self._count(valid) >= self.min_periods
+        weight = self.window_sum(valid.astype("float64"))
+        sums = [self.window_sum(np.where(valid, array, 0.0)) for array in arrays]
+        return enough, weight, sums, valid
+
     def mean(self):
-        return self.data.rolling(self.period, min_periods=self.min_periods).mean()
+        if self.weights is None:
+            return self.data.rolling(self.period, min_periods=self.min_periods).mean()
+        values = self._values()
+        enough, weight, (total, ), _ = self._moments(values)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._wrap(np.where(enough, total / weight, np.nan))
 
     def std(self):
-        return self.data.rolling(self.period, min_periods=self.min_periods).std()
+        r"""加权时为有偏的加权标准差 :math:`\sqrt{\sum w(x-\bar{x})^2 / \sum w}`"""
+        if self.weights is None:
+            return self.data.rolling(self.period, min_periods=self.min_periods).std()
+        values = self._values()
+        enough, weight, (total, ), valid = self._moments(values)
+        square = self.window_sum(np.where(valid, values * values, 0.0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / weight
+            variance = np.maximum(square / weight - mean * mean, 0)
+        return self._wrap(np.where(enough, np.sqrt(variance), np.nan))
 
     def sum(self):
-        return self.data.rolling(self.period, min_periods=self.min_periods).sum()
+        if self.weights is None:
+            return self.data.rolling(self.period, min_periods=self.min_periods).sum()
+        values = self._values()
+        enough, _, (total, ), _ = self._moments(values)
+        return self._wrap(np.where(enough, total, np.nan))
 
     def max(self):
         return self.data.rolling(self.period, min_periods=self.min_periods).max()
@@ -167,12 +365,79 @@ class Rolling:
     def min(self):
         return self.data.rolling(self.period, min_periods=self.min_periods).min()
 
+    def regress(self, x):
+        """
+        每列对x做滚动（加权）一元回归
+
+        Parameters
+        ==========
+        x: pd.Series or pd.DataFrame
+            自变量，pd.Series时所有列使用同一个自变量
+
+        Returns
+        =======
+        (alpha, beta)
+            截距和斜率，与data形状相同
+        """
+        if isinstance(x, pd.Series) and isinstance(self.data, pd.DataFrame):
+            x = np.broadcast_to(self._values(x.reindex(self.data.index))[:, None], self.data.shape)
+        elif isinstance(self.data, pd.DataFrame):
+            x = self._values(x.reindex(index=self.data.index, columns=self.data.columns))
+        else:
+            x = self._values(x.reindex(self.data.index))
+        y = self._values()
+        enough, weight, (sx, sy), valid = self._moments(x, y)
+        sxx = self.window_sum(np.where(valid, x * x, 0.0))
+        sxy = self.window_sum(np.where(valid, x * y, 0.0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            beta = (weight * sxy - sx * sy) / (weight * sxx - sx * sx)
+            alpha = (sy - beta * sx) / weight
+        return self._wrap(np.where(enough, alpha, np.nan)), self._wrap(np.where(enough, beta, np.nan))
+
     def apply(self, func):
+        """
+        对每一列的窗口调用func，窗口为当天之前的period天（不含当天）
+
+        Parameters
+        ==========
+        func: callable
+            输入为一列窗口数据的pd.Series，返回标量；窗口中有效值少于min_periods的列不参与计算
+
+        Returns
+        =======
+        pd.DataFrame
+            从第period天开始的日期 × 股票
+
+        See Also
+        ========
+        apply_blocks: 窗口包含当天、所有列一次计算的版本
+        """
         result = {}
         for i in range(self.period, len(self.data)):
             idx = self.data.index[i]
-            sub_data = self.data.iloc[i-self.period:i].dropna(1, thresh=self.min_periods)
-            result[idx] = sub_data.apply(func, raw=False, reduce=True)
+            sub_data = self.data.iloc[i-self.period:i].dropna(axis=1, thresh=self.min_periods)
+            result[idx] = sub_data.apply(func, axis=0)
         return pd.DataFrame(result).T
 
-
+    def apply_blocks(self, func, block_size=64):
+        """
+        对每个窗口做自定义的归约，窗口包含当天
+
+        Parameters
+        ==========
+        func: callable
+            输入为(..., period)的数组，对最后一维归约，例如 ``lambda x: np.nanmedian(x, axis=-1)``。
+            所有列的窗口一次传入；开始不足period天的窗口前面补NaN
+        block_size: int
+            每次传入的日期数，控制内存占用
+        """
+        values = self._values()
+        padding = np.full((self.period - 1,) + values.shape[1:], np.nan)
+        windows = sliding_window_view(np.concatenate([padding, values]), self.period, axis=0)
+        enough = self._count(~np.isnan(values)) >= self.min_periods
+        result = np.full(values.shape, np.nan)
+        for start in range(0, len(values), block_size):
+            block = slice(start, start + block_size)
+            if enough[block].any():
+                result[block] = func(windows[block])
+        return self._wrap(np.where(enough, result, np.nan))
@@ -0,0 +1,293 @@
+"""
+在线（增量）统计量
+
+每个累加器按日期逐行更新，只保存计算下一行所需的状态，每次更新的计算量与股票数成正比，
+与历史长度无关。状态可以保存为npz文件，和缓存的结果放在一起，参见
+:meth:`quant.common.decorators.Localizer.state_path` 。
+
+================================ =======================================================
+:class:`EWMAccumulator`          指数加权均值与方差，与 ``DataFrame.ewm(halflife)`` 相同
+:class:`RollingAccumulator`      滚动窗口（可截断指数加权）的和、均值、标准差，
+                                 与 :class:`quant.common.math_helpers.Rolling` 相同
+:class:`RegressionAccumulator`   滚动窗口的一元（加权）回归
+:class:`ShiftAccumulator`        把结果延后若干行，与 ``DataFrame.shift`` 相同
+================================ =======================================================
+
+新出现的股票会自动加入，之前的状态视为缺失。
+
+Examples
+========
+
+..  code-block::
+    python
+
+    acc = RollingAccumulator(252, min_periods=126, halflife=42)
+    for date, row in returns.iterrows():
+        acc.update(row, date)
+    acc.std()
+    acc.save(path)
+    acc = RollingAccumulator.load(path)
+"""
+import os
+import numpy as np
+import pandas as pd
+from .math_helpers import exponential_decay_weight
+
+__all__ = ['OnlineAccumulator', 'EWMAccumulator', 'RollingAccumulator', 'RegressionAccumulator', 'ShiftAccumulator']
+
+
+class OnlineAccumulator:
+    """
+    累加器的基类。子类在 ``_params`` 中列出构造参数，在 ``_fields`` 中列出最后一维为股票的状态数组，
+    在 ``_scalars`` 中列出其它需要保存的状态
+    """
+    _params = ()
+    _fields = ()
+    _scalars = ()
+    _fill = {}
+
+    def __init__(self):
+        self.columns = pd.Index([], name="stock")
+        self.last_date = None
+
+    def _align(self, row) -> np.ndarray:
+        """把一行数据按股票对齐，新出现的股票加入状态"""
+        if not isinstance(row, pd.Series):
+            return np.broadcast_to(np.asarray(row, dtype="float64"), self.columns.shape)
+        new = row.index[~row.index.isin(self.columns)]
+        if len(new):
+            self.columns = self.columns.append(pd.Index(new, name=self.columns.name))
+            for field in self._fields:
+                old = getattr(self, field)
+                grown = np.full(old.shape[:-1] + (len(self.columns),), self._fill.get(field, 0.0), dtype=old.dtype)
+                grown[..., :old.shape[-1]] = old
+                setattr(self, field, grown)
+        return row.reindex(self.columns).values.astype("float64")
+
+    def _advance(self, date):
+        if date is not None:
+            date = pd.Timestamp(date)
+            if self.last_date is not None and date <= self.last_date:
+                raise ValueError("Date {} is not after the last update {}".format(date, self.last_date))
+            self.last_date = date
+
+    def _series(self, values) -> pd.Series:
+        return pd.Series(values, index=self.columns, name=self.last_date)
+
+    def save(self, path):
+        """把状态保存为npz文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {name: getattr(self, name) for name in self._fields + self._scalars}
+        params = {"param_" + name: np.asarray(getattr(self, name), dtype=object) for name in self._params}
+        last_date = np.datetime64("NaT") if self.last_date is None else np.datetime64(self.last_date)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, columns=np.asarray(self.columns).astype(str),
+                 last_date=np.asarray(last_date, dtype="datetime64[ns]"), **arrays, **params)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """从npz文件读取状态"""
+        with np.load(path, allow_pickle=True) as f:
+            params = {name: f["param_" + name].item() for name in cls._params}
+            obj = cls(**params)
+            obj.columns = pd.Index(f["columns"].astype(object), name="stock")
+            last_date = f["last_date"][()]
+            obj.last_date = None if np.isnat(last_date) else pd.Timestamp(last_date)
+            for name in cls._fields + cls._scalars:
+                value = f[name]
+                setattr(obj, name, value if value.ndim else value.item())
+        return obj
+
+
+class EWMAccumulator(OnlineAccumulator):
+    """
+    指数加权均值与（无偏）方差，与pandas的 ``ewm(halflife=halflife, adjust=True, ignore_na=False)``
+    的mean, var, std相同：缺失值不计入，但已有数据的权重照常衰减
+    """
+    _params = ("halflife", )
+    _fields = ("_mean", "_cov", "_sum_wt", "_sum_wt2", "_old_wt", "_nobs")
+    _fill = {"_mean": np.nan, "_sum_wt": 1.0, "_sum_wt2": 1.0, "_old_wt": 1.0}
+
+    def __init__(self, halflife):
+        super(EWMAccumulator, self).__init__()
+        self.halflife = halflife
+        self._decay = 0.5 ** (1 / halflife)
+        for field in self._fields:
+            setattr(self, field, np.full(0, self._fill.get(field, 0.0)))
+
+    def update(self, row, date=None):
+        """加入新的一行"""
+        x = self._align(row)
+        self._advance(date)
+        observed = ~np.isnan(x)
+        started = ~np.isnan(self._mean)
+        self._nobs = self._nobs + observed
+
+        # 已有数据的股票：权重衰减，有观测值时更新均值和协方差
+        decay = started
+        self._sum_wt = np.where(decay, self._sum_wt * self._decay, self._sum_wt)
+        self._sum_wt2 = np.where(decay, self._sum_wt2 * self._decay ** 2, self._sum_wt2)
+        self._old_wt = np.where(decay, self._old_wt * self._decay, self._old_wt)
+        update = started & observed
+        with np.errstate(invalid="ignore"):
+            mean = np.where(self._mean != x, (self._old_wt * self._mean + x) / (self._old_wt + 1), self._mean)
+            cov = (self._old_wt * (self._cov + (self._mean - mean) ** 2) + (x - mean) ** 2) / (self._old_wt + 1)
+        self._mean = np.where(update, mean, self._mean)
+        self._cov = np.where(update, cov, self._cov)
+        self._sum_wt = np.where(update, self._sum_wt + 1, self._sum_wt)
+        self._sum_wt2 = np.where(update, self._sum_wt2 + 1, self._sum_wt2)
+        self._old_wt = np.where(update, self._old_wt + 1, self._old_wt)
+
+        # 第一个观测值
+        first = ~started & observed
+        self._mean = np.where(first, x, self._mean)
+        return self
+
+    def mean(self) -> pd.Series:
+        return self._series(np.where(self._nobs > 0, self._mean, np.nan))
+
+    def var(self) -> pd.Series:
+        numerator = self._sum_wt * self._sum_wt
+        denominator = numerator - self._sum_wt2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = np.where((self._nobs > 0) & (denominator > 0), numerator / denominator * self._cov, np.nan)
+        return self._series(var)
+
+    def std(self) -> pd.Series:
+        return np.sqrt(self.var())
+
+
+class RollingAccumulator(OnlineAccumulator):
+    """
+    滚动窗口的和、均值与标准差，结果与 :class:`quant.common.math_helpers.Rolling` 相同。
+
+    最近period行保存在环形缓冲区中，窗口和用“加上新行、减去移出的行”更新；
+    截断指数权重的加权和用递推 :math:`S_t = \\lambda S_{t-1} + w x_t - w \\lambda^T x_{t-T}` 更新
+    """
+    _params = ("period", "min_periods", "halflife")
+    _fields = ("_buffer", "_sums", "_weighted")
+    _scalars = ("_position", "_rows")
+    channels = 3
+
+    def __init__(self, period, min_periods=None, halflife=None):
+        super(RollingAccumulator, self).__init__()
+        self.period = period
+        self.min_periods = period if min_periods is None else min_periods
+        self.halflife = halflife
+        self._buffer = np.zeros((period, self.channels, 0))
+        self._sums = np.zeros((self.channels, 0))
+        self._weighted = np.zeros((self.channels, 0))
+        self._position = 0
+        self._rows = 0
+
+    @property
+    def weighted(self) -> bool:
+        return self.halflife is not None
+
+    def _push(self, values):
+        """values: channels × 股票，缺失值已经置0"""
+        old = self._buffer[self._position]
+        self._sums += values - old
+        if self.weighted:
+            decay = 0.5 ** (1 / self.halflife)
+            w = exponential_decay_weight(self.halflife, self.period, reverse=True)[-1]
+            self._weighted = decay * self._weighted + w * values - w * decay ** self.period * old
+        self._buffer[self._position] = values
+        self._position = (self._position + 1) % self.period
+        self._rows += 1
+
+    def _moments(self):
+        """有效值个数，以及用于计算的（加权）和"""
+        return self._sums[0], self._weighted if self.weighted else self._sums
+
+    def update(self, row, date=None):
+        """加入新的一行"""
+        x = self._align(row)
+        self._advance(date)
+        valid = ~np.isnan(x)
+        x = np.where(valid, x, 0.0)
+        self._push(np.stack([valid.astype("float64"), x, x * x]))
+        return self
+
+    def _output(self, values, count):
+        return self._series(np.where(count >= self.min_periods, values, np.nan))
+
+    def sum(self) -> pd.Series:
+        count, sums = self._moments()
+        return self._output(sums[1], count)
+
+    def mean(self) -> pd.Series:
+        count, sums = self._moments()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._output(sums[1] / sums[0], count)
+
+    def std(self) -> pd.Series:
+        """加权时为有偏的加权标准差，不加权时与pandas相同（ddof=1）"""
+        count, sums = self._moments()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums[1] / sums[0]
+            if self.weighted:
+                var = sums[2] / sums[0] - mean * mean
+            else:
+                var = (sums[2] - sums[1] * mean) / (sums[0] - 1)
+        return self._output(np.sqrt(np.maximum(var, 0)), count)
+
+
+class RegressionAccumulator(RollingAccumulator):
+    """滚动窗口的一元（加权）回归，结果与 :meth:`quant.common.math_helpers.Rolling.regress` 相同"""
+    channels = 5
+
+    def update(self, x, y, date=None):
+        """
+        加入新的一行
+
+        Parameters
+        ==========
+        x: float or pd.Series
+            自变量，标量时所有股票使用同一个值
+        y: pd.Series
+            因变量
+        """
+        y = self._align(y)
+        x = self._align(x.reindex(self.columns) if isinstance(x, pd.Series) else x)
+        self._advance(date)
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        x, y = np.where(valid, x, 0.0), np.where(valid, y, 0.0)
+        self._push(np.stack([valid.astype("float64"), x, y, x * x, x * y]))
+        return self
+
+    def regress(self):
+        """
+        Returns
+        =======
+        (alpha, beta): pd.Series
+        """
+        count, (weight, sx, sy, sxx, sxy) = self._moments()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            beta = (weight * sxy - sx * sy) / (weight * sxx - sx * sx)
+            alpha = (sy - beta * sx) / weight
+        return self._output(alpha, count), self._output(beta, count)
+
+
+class ShiftAccumulator(OnlineAccumulator):
+    """把每次更新的行延后periods次输出，与 ``DataFrame.shift(periods)`` 相同"""
+    _params = ("periods", )
+    _fields = ("_buffer", )
+    _scalars = ("_position", )
+    _fill = {"_buffer": np.nan}
+
+    def __init__(self, periods):
+        super(ShiftAccumulator, self).__init__()
+        self.periods = periods
+        self._buffer = np.full((periods, 0), np.nan)
+        self._position = 0
+
+    def update(self, row, date=None) -> pd.Series:
+        """加入新的一行，返回periods次更新之前加入的行"""
+        x = self._align(row)
+        self._advance(date)
+        output = self._buffer[self._position].copy()
+        self._buffer[self._position] = x
+        self._position = (self._position + 1) % self.periods
+        return self._series(output)
@@ -0,0 +1,167 @@
+"""
+批量计算多个策略的绩效指标
+
+净值以日期 × 策略的矩阵传入，全区间和每一年的收益率、波动率、夏普率、最大回撤（及其起止日期）
+都用少数几次数组运算一次算出。
+"""
+import numpy as np
+import pandas as pd
+
+__all__ = ['cal_drawdowns', 'cal_performance']
+
+TRADING_DAYS = 252
+"""每年的交易日数，用于年化"""
+
+
+def _as_frame(data) -> pd.DataFrame:
+    if isinstance(data, pd.Series):
+        return data.to_frame(data.name if data.name is not None else 0)
+    return data
+
+
+def cal_drawdowns(net_values, compound=True):
+    r"""
+    批量计算最大回撤及其起止日期
+
+    Parameters
+    ----------
+    net_values: pd.DataFrame
+        净值，日期 × 策略
+    compound: bool, optional
+        是否为复利制，参见 :func:`quant.common.math_helpers.cal_mdd`
+
+    Returns
+    -------
+    pd.DataFrame
+        以策略为索引，列为mdd（正值）、start（回撤开始的高点）和end（回撤结束的低点）
+    """
+    net_values = _as_frame(net_values)
+    values = net_values.values.astype("float64")
+    index = net_values.index
+    if not len(index):
+        return pd.DataFrame({"mdd": np.nan, "start": pd.NaT, "end": pd.NaT}, index=net_values.columns)
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdowns = values / peaks - 1 if compound else values - peaks
+    valid = ~np.isnan(drawdowns).all(axis=0)
+    ends = np.nanargmin(np.where(valid, drawdowns, 0), axis=0)
+    # 高点为低点之前净值最大的日期
+    before = np.arange(len(index))[:, None] <= ends[None, :]
+    starts = np.nanargmax(np.where(before & ~np.isnan(values), values, -np.inf), axis=0)
+    mdd = -np.nanmin(np.where(valid, drawdowns, 0), axis=0)
+    result = pd.DataFrame({
+        "mdd": np.where(valid, mdd, np.nan),
+        "start": index[starts],
+        "end": index[ends],
+    }, index=net_values.columns)
+    result.loc[~valid, ["start", "end"]] = pd.NaT
+    return result
+
+
+def _segments(index: pd.DatetimeIndex, by_year: bool):
+    """各个统计区间在日期中的起止位置"""
+    segments = []
+    if by_year and len(index):
+        years = np.asarray(index.year)
+        change = np.flatnonzero(np.diff(years)) + 1
+        starts = np.r_[0, change]
+        ends = np.r_[change, len(index)]
+        segments = [(str(years[s]), s, e) for s, e in zip(starts, ends)]
+    segments.append(("Total", 0, len(index)))
+    return segments
+
+
+def _segment_stats(net_values: pd.DataFrame, segments, prefix=""):
+    values = net_values.values.astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = values[1:] / values[:-1] - 1
+    returns = np.concatenate([np.full((1, values.shape[1]), np.nan), returns])
+    valid = ~np.isnan(returns)
+    filled = np.where(valid, returns, 0.0)
+    frames = []
+    for period, start, end in segments:
+        # 每个区间内第一天没有收益率，与对该区间的净值做pct_change相同
+        count = valid[start + 1:end].sum(axis=0)
+        total = filled[start + 1:end].sum(axis=0)
+        square = (filled[start + 1:end] ** 2).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+            var = np.where(count > 1, (square - count * mean * mean) / (count - 1), np.nan)
+        std = np.sqrt(np.maximum(var, 0))
+        drawdowns = cal_drawdowns(net_values.iloc[start:end])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame = pd.DataFrame({
+                "rtn": mean * TRADING_DAYS,
+                "volatility": std * TRADING_DAYS ** 0.5,
+                "sharpe": mean / std * TRADING_DAYS ** 0.5,
+                "mdd": drawdowns["mdd"].values,
+                "mdd_start": drawdowns["start"].values,
+                "mdd_end": drawdowns["end"].values,
+            }, index=net_values.columns)
+        frames.append(frame.add_prefix(prefix))
+    return frames
+
+
+def _turnover(weights: pd.DataFrame, by_year: bool) -> pd.Series:
+    """调仓权重的年化换手率，每个区间内第一次调仓不计入"""
+    weights = weights.fillna(0)
+    turnover = {}
+    for period, start, end in _segments(weights.index, by_year):
+        w = weights.iloc[start:end]
+        if not len(w):
+            continue
+        days = (w.index[-1] - w.index[0]).days
+        traded = np.abs(np.diff(w.values, axis=0)).sum()
+        turnover[period] = traded / days * TRADING_DAYS if days else np.nan
+    return pd.Series(turnover, dtype="float64")
+
+
+def cal_performance(net_values, weights=None, benchmark=None, by_year=True):
+    """
+    批量计算绩效指标
+
+    Parameters
+    ----------
+    net_values: pd.DataFrame or pd.Series
+        净值，日期 × 策略
+    weights: dict or pd.DataFrame, optional
+        以策略名为键、日期 × 股票的调仓权重为值的字典；只有一个策略时可以直接传入DataFrame
+    benchmark: pd.Series, optional
+        基准的净值，给定时同时计算相对净值（净值 / 基准）的指标，列名以relative\\_开头
+    by_year: bool
+        是否分年计算
+
+    Returns
+    -------
+    pd.DataFrame
+        以(区间, 策略)为索引，区间为年份或"Total"。列为年化收益率rtn、年化波动率volatility、
+        夏普率sharpe、最大回撤mdd及其起止日期mdd_start, mdd_end；有调仓权重时还有年化换手率turnover。
+        每个区间只用区间内的净值计算
+
+    Examples
+    --------
+
+    ..  code-block::
+        python
+
+        from quant.common.performance import cal_performance
+        stats = cal_performance(net_values, benchmark=benchmark_net_value)
+        stats.xs("Total")
+    """
+    net_values = _as_frame(net_values).sort_index()
+    segments = _segments(net_values.index, by_year)
+    frames = _segment_stats(net_values, segments)
+    if benchmark is not None:
+        relative = net_values.div(benchmark.reindex(net_values.index), axis=0)
+        relative_frames = _segment_stats(relative, segments, prefix="relative_")
+        frames = [pd.concat([a, b], axis=1) for a, b in zip(frames, relative_frames)]
+    periods = [period for period, _, _ in segments]
+    result = pd.concat(frames, keys=periods, names=["period", "strategy"])
+    if weights is not None:
+        if isinstance(weights, pd.DataFrame):
+            weights = {net_values.columns[0]: weights}
+        turnover = pd.DataFrame({
+            name: _turnover(w.sort_index(), by_year) for name, w in weights.items()
+        }).stack()
+        result["turnover"] = turnover.reindex(result.index).values
+    return result
@@ -204,6 +204,9 @@ def create_default_config():
             "wind_db_name = 'quant'",
             "wind_charset = 'cp936'       # This is for mssql. If you are using mysql, you may want to change it to utf-8 or latin-1",
             "",
+            "# cache",
+            "cache_codec = 'none'    # Default compression of local hdf5 caches, see ~/.quantlib/codecs.json for per-file rules, {'none', 'fast', 'blosc', 'high'}",
+            "",
             "# logging",
             "log_level = 'INFO'    # Loggin level, {'DEBUG', 'INFO', 'WARNING', 'ERROR', 'FATAL'}",
             "",
@@ -211,6 +214,14 @@ def create_default_config():
             "benchmark = '000905.SH'   # Backtest benchmark, default is ZZ500 index",
             "fee_rate = 0.0005",
             "",
+            "# options",
+            "risk_free_rate = 0.03     # Annual risk-free rate (continuously compounded) used to compute implied volatilities",
+            "",
+            "# barra",
+            "estu_min_cap = 0              # Minimum market cap (10k CNY) of the estimation universe",
+            "estu_min_listed_days = 0      # Minimum calendar days since listing of the estimation universe",
+            "estu_exclude_st = False       # Whether to exclude ST stocks from the estimation universe",
+            "",
         ]
         config_file.write("\n".join(default_config))
 
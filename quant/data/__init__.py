@@ -1,4 +1,8 @@
 from .wind import WindData, to_trade_data
+from .futures import FuturesData
+from .options import OptionsData
 
 
 wind = WindData()
+futures = FuturesData(wind)
+options = OptionsData(wind)
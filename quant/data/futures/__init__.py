@@ -1,3 +1,244 @@
 """
-TODO: 期货相关数据
-"""
\ No newline at end of file
+期货相关数据
+"""
+import os
+import numpy as np
+import pandas as pd
+from ...common import LOCALIZER
+from ...common.localize import MmapPanel
+from ...common.logging import Logger
+
+__all__ = ['FuturesData', 'FUTURES_TABLES', 'map_main_contracts', 'adjust_rolls']
+
+FUTURES_TABLES = {
+    "commodity": "CCommodityFuturesEODPrices",
+    "index": "CIndexFuturesEODPrices",
+}
+"""期货种类及其日行情表"""
+
+ADJUST_METHODS = ("ratio", "diff", "none")
+"""换月调整方式：ratio为比例调整，diff为价差调整，none为不调整"""
+
+
+def map_main_contracts(dates: pd.DatetimeIndex, contracts: pd.Index, mapping: pd.DataFrame) -> pd.DataFrame:
+    """
+    把连续（主力）合约与月合约的映射表展开成日期 × 连续合约的矩阵，一次处理所有品种
+
+    Parameters
+    ==========
+    dates: pd.DatetimeIndex
+        交易日，必须升序
+    contracts: pd.Index
+        月合约的万得代码
+    mapping: pd.DataFrame
+        CfuturesContractMapping表，需要s_info_windcode, fs_mapping_windcode, startdate, enddate四列，
+        enddate为空表示映射持续到现在
+
+    Returns
+    =======
+    pd.DataFrame
+        值为月合约在contracts中的位置，-1表示当天没有映射
+    """
+    contract_idx = contracts.get_indexer(mapping.fs_mapping_windcode)
+    mapping = mapping[contract_idx >= 0]
+    contract_idx = contract_idx[contract_idx >= 0]
+    codes = pd.Index(sorted(mapping.s_info_windcode.unique()))
+    code_idx = codes.get_indexer(mapping.s_info_windcode)
+
+    # 每条映射覆盖的交易日区间 [lo, hi)
+    lo = dates.searchsorted(mapping.startdate.values, side="left")
+    end = mapping.enddate.fillna(dates[-1] if len(dates) else pd.NaT).values
+    hi = dates.searchsorted(end, side="right")
+    lengths = np.maximum(hi - lo, 0)
+
+    # 把区间展开成 (日期, 连续合约) 对，不需要逐个合约循环
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    rows = np.repeat(lo, lengths) + offsets
+    main = np.full((len(dates), len(codes)), -1, dtype="int64")
+    # 映射表有重叠时，以开始日期较晚的记录为准
+    order = np.argsort(np.repeat(mapping.startdate.values, lengths), kind="stable")
+    main[rows[order], np.repeat(code_idx, lengths)[order]] = np.repeat(contract_idx, lengths)[order]
+    return pd.DataFrame(main, index=dates, columns=codes)
+
+
+def adjust_rolls(prices: np.ndarray, main: np.ndarray, method: str="ratio", init: np.ndarray=None):
+    """
+    计算连续合约的价格及换月调整因子
+
+    换月日t的调整以t-1日新旧两个合约的价格计算，因子从第一天开始向后累积（前复权的反方向），
+    因此新的数据不会改变已有的历史，可以直接追加到缓存中。
+
+    Parameters
+    ==========
+    prices: np.ndarray
+        日期 × 月合约的价格
+    main: np.ndarray
+        日期 × 连续合约，值为月合约的位置，-1表示没有映射
+    method: {'ratio', 'diff', 'none'}
+        调整方式
+    init: np.ndarray
+        每个连续合约的初始因子，用于增量计算，默认比例调整为1，价差调整为0
+
+    Returns
+    =======
+    (adjusted, factor)
+        调整后的价格与累积调整因子，形状都与main相同
+    """
+    if method not in ADJUST_METHODS:
+        raise ValueError("Unknown adjust method {}, should be one of {}".format(method, ADJUST_METHODS))
+    valid = main >= 0
+    safe = np.where(valid, main, 0)
+    rows = np.arange(main.shape[0])[:, None]
+    raw = np.where(valid, prices[rows, safe], np.nan)
+
+    neutral = 0.0 if method == "diff" else 1.0
+    step = np.full(main.shape, neutral)
+    if method != "none" and main.shape[0] > 1:
+        roll = valid[1:] & valid[:-1] & (main[1:] != main[:-1])
+        old = prices[rows[:-1], safe[:-1]]
+        new = prices[rows[:-1], safe[1:]]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = old / new if method == "ratio" else old - new
+        # 换月前一天新合约没有价格时不做调整
+        step[1:] = np.where(roll & np.isfinite(change), change, neutral)
+    if init is None:
+        init = np.full(main.shape[1], neutral)
+    if method == "diff":
+        factor = np.cumsum(step, axis=0) + init
+        adjusted = raw + factor
+    else:
+        factor = np.cumprod(step, axis=0) * init
+        adjusted = raw * factor
+    return adjusted, factor
+
+
+class FuturesData:
+    """期货数据接口，由月合约的日行情构建连续（主力）合约"""
+    def __init__(self, wind):
+        """
+        Parameters
+        ==========
+        wind: quant.data.wind.WindData
+            万得数据接口
+        """
+        self.wind = wind
+        self.path = os.path.join(LOCALIZER.path, "wind_futures.mmap")
+
+    def get_prices(self, field: str="s_dq_close", kind: str="commodity") -> pd.DataFrame:
+        """
+        月合约的日行情透视表
+
+        Parameters
+        ==========
+        field: str
+            日行情表中的字段，如s_dq_close, s_dq_settle
+        kind: {'commodity', 'index'}
+            商品期货或股指期货
+        """
+        return self.wind.get_data(FUTURES_TABLES[kind], field)
+
+    def get_mapping(self) -> pd.DataFrame:
+        """连续（主力）合约与月合约的映射表"""
+        return self.wind.get_table(
+            "CfuturesContractMapping",
+            ["s_info_windcode", "fs_mapping_windcode", "startdate", "enddate"]
+        )
+
+    def get_main_contracts(self, kind: str="commodity") -> pd.DataFrame:
+        """
+        每天每个连续（主力）合约对应的月合约
+
+        Returns
+        =======
+        pd.DataFrame
+            日期 × 连续合约，值为月合约的万得代码，没有映射时为None
+        """
+        prices = self.get_prices(kind=kind)
+        main = map_main_contracts(prices.index, prices.columns, self.get_mapping())
+        names = np.append(prices.columns.values.astype(object), None)
+        return pd.DataFrame(names[main.values], index=main.index, columns=main.columns)
+
+    def _panels(self, kind, field, adjust):
+        path = os.path.join(self.path, kind, field, adjust)
+        return MmapPanel(path), MmapPanel(path + "_factor")
+
+    def get_continuous(self, field: str="s_dq_close", kind: str="commodity", adjust: str="ratio") -> pd.DataFrame:
+        """
+        连续（主力）合约的价格，结果缓存在本地，有新的行情时只计算并追加新的日期
+
+        Parameters
+        ==========
+        field: str
+            日行情表中的字段
+        kind: {'commodity', 'index'}
+            商品期货或股指期货
+        adjust: {'ratio', 'diff', 'none'}
+            换月调整方式，参见 :func:`adjust_rolls`
+
+        Examples
+        ========
+
+        ..  code-block::
+            python
+
+            from quant.data import futures
+            futures.get_continuous("s_dq_settle", "commodity", adjust="ratio")
+        """
+        panel, factor_panel = self._panels(kind, field, adjust)
+        prices = self.get_prices(field, kind)
+        main = map_main_contracts(prices.index, prices.columns, self.get_mapping())
+
+        # 读取缓存的最后一天到追加新的日期之间持有锁，两个进程不会追加同样的日期
+        with LOCALIZER.lock(os.path.join(self.path, kind, field, adjust)):
+            start = 0
+            init = None
+            if panel.exists and factor_panel.exists:
+                last = panel.index[-1]
+                if last >= prices.index[-1]:
+                    return panel.read(mode="c")
+                # 从缓存的最后一天开始计算，以该日的因子作为初始值
+                start = prices.index.searchsorted(last)
+                neutral = 0.0 if adjust == "diff" else 1.0
+                init = (factor_panel
+                    .read()
+                    .iloc[-1]
+                    .reindex(main.columns)
+                    .fillna(neutral)
+                    .values
+                )
+                Logger.debug(f"Appending {kind} futures {field} after {last}")
+            adjusted, factor = adjust_rolls(prices.values[start:], main.values[start:], adjust, init)
+            index = prices.index[start:]
+            adjusted = pd.DataFrame(adjusted, index=index, columns=main.columns)
+            factor = pd.DataFrame(factor, index=index, columns=main.columns)
+            if start:
+                # 第一行与缓存的最后一行重叠
+                panel.append(adjusted.iloc[1:])
+                factor_panel.append(factor.iloc[1:])
+            else:
+                panel.write(adjusted)
+                factor_panel.write(factor)
+            return panel.read(mode="c")
+
+    def get_adjust_factor(self, field: str="s_dq_close", kind: str="commodity", adjust: str="ratio") -> pd.DataFrame:
+        """连续合约的累积换月调整因子，参见 :meth:`get_continuous`"""
+        self.get_continuous(field, kind, adjust)
+        return self._panels(kind, field, adjust)[1].read(mode="c")
+
+    def get_index_futures(self, field: str="s_dq_close", adjust: str="ratio") -> pd.DataFrame:
+        """股指期货连续（主力）合约的价格"""
+        return self.get_continuous(field, "index", adjust)
+
+    def get_hedge_returns(self, codes=None, field: str="s_dq_close") -> pd.DataFrame:
+        """
+        股指期货连续合约的日收益率，换月日使用同一个月合约计算收益，用于对冲回测
+
+        Parameters
+        ==========
+        codes: str or List[str]
+            连续合约代码，如IC.CFE，为None则返回全部
+        """
+        prices = self.get_index_futures(field, adjust="ratio")
+        if codes is not None:
+            prices = prices[codes]
+        return prices / prices.shift(1) - 1
@@ -0,0 +1,332 @@
+"""
+期权相关数据：隐含波动率与希腊字母
+"""
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+from ...common import LOCALIZER
+from ...common.settings import CONFIG
+
+__all__ = ['OptionsData', 'black_price', 'black_greeks', 'implied_volatility', 'parity_forward', 'compute_option_analytics']
+
+CALL = 708001000
+"""ChinaOptionDescription.s_info_callput中认购期权的代码"""
+PUT = 708002000
+"""ChinaOptionDescription.s_info_callput中认沽期权的代码"""
+
+GREEKS = ("delta", "gamma", "vega", "theta")
+"""支持的希腊字母"""
+
+
+def _npdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def _d1_d2(forward, strike, t, sigma):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = sigma * np.sqrt(t)
+        d1 = np.log(forward / strike) / std + 0.5 * std
+    return d1, d1 - std
+
+
+def black_price(forward, strike, t, sigma, is_call, discount):
+    """
+    Black模型的期权价格，所有参数都可以是可广播的数组
+
+    Parameters
+    ==========
+    forward: array
+        标的远期价格
+    strike: array
+        行权价
+    t: array
+        剩余期限（年）
+    sigma: array
+        波动率
+    is_call: array of bool
+        是否为认购期权
+    discount: array
+        贴现因子 exp(-rT)
+    """
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    call = discount * (forward * ndtr(d1) - strike * ndtr(d2))
+    put = discount * (strike * ndtr(-d2) - forward * ndtr(-d1))
+    return np.where(is_call, call, put)
+
+
+def black_greeks(forward, strike, t, sigma, is_call, discount, rate) -> dict:
+    """
+    期权对现货价格的希腊字母（标的无分红，现货价格为 forward * discount）
+
+    Returns
+    =======
+    dict
+        delta, gamma, vega（波动率变动1.00时的价格变动）, theta（每年）
+    """
+    spot = forward * discount
+    d1, d2 = _d1_d2(forward, strike, t, sigma)
+    pdf = _npdf(d1)
+    sqrt_t = np.sqrt(t)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma = pdf / (spot * sigma * sqrt_t)
+        decay = -spot * pdf * sigma / (2 * sqrt_t)
+    delta = np.where(is_call, ndtr(d1), ndtr(d1) - 1)
+    theta = np.where(
+        is_call,
+        decay - rate * strike * discount * ndtr(d2),
+        decay + rate * strike * discount * ndtr(-d2),
+    )
+    return {
+        "delta": delta,
+        "gamma": gamma,
+        "vega": spot * pdf * sqrt_t,
+        "theta": theta,
+    }
+
+
+def implied_volatility(price, forward, strike, t, is_call, discount, tol=1e-10, max_iter=100,
+                       lower=1e-4, upper=5.0):
+    """
+    批量计算隐含波动率。对整个数组同时做牛顿迭代，牛顿步跳出当前区间或vega过小时改用二分法，
+    保证收敛。价格不满足无套利边界的合约返回NaN。
+
+    Parameters
+    ==========
+    price: array
+        期权价格
+    forward, strike, t, is_call, discount
+        参见 :func:`black_price` ，需要能广播到price的形状
+    tol: float
+        价格相对误差的收敛阈值
+    max_iter: int
+        最大迭代次数
+    lower, upper: float
+        波动率的搜索区间
+
+    Returns
+    =======
+    np.ndarray
+        与price形状相同
+    """
+    price, forward, strike, t, is_call, discount = np.broadcast_arrays(
+        *(np.asarray(x) for x in (price, forward, strike, t, is_call, discount))
+    )
+    shape = price.shape
+    price, forward, strike, t, discount = (
+        x.astype("float64").ravel() for x in (price, forward, strike, t, discount)
+    )
+    is_call = is_call.astype(bool).ravel()
+
+    intrinsic = discount * np.where(is_call, np.maximum(forward - strike, 0), np.maximum(strike - forward, 0))
+    ceiling = discount * np.where(is_call, forward, strike)
+    with np.errstate(invalid="ignore"):
+        solvable = (t > 0) & (price > intrinsic) & (price < ceiling) & (strike > 0) & (forward > 0)
+    result = np.full(price.shape, np.nan)
+    idx = np.flatnonzero(solvable)
+    if len(idx) == 0:
+        return result.reshape(shape)
+
+    p, f, k, tt, c, d = price[idx], forward[idx], strike[idx], t[idx], is_call[idx], discount[idx]
+    lo = np.full(len(idx), lower)
+    hi = np.full(len(idx), upper)
+    # Brenner-Subrahmanyam 近似作为初始值
+    sigma = np.clip(np.sqrt(2 * np.pi / tt) * p / (d * f), lower * 2, upper / 2)
+    active = np.arange(len(idx))
+    for _ in range(max_iter):
+        s = sigma[active]
+        diff = black_price(f[active], k[active], tt[active], s, c[active], d[active]) - p[active]
+        done = np.abs(diff) <= tol * p[active]
+        # 更新包含根的区间：价格关于波动率单调递增
+        hi[active] = np.where(diff > 0, s, hi[active])
+        lo[active] = np.where(diff < 0, s, lo[active])
+        d1, _ = _d1_d2(f[active], k[active], tt[active], s)
+        vega = d[active] * f[active] * _npdf(d1) * np.sqrt(tt[active])
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            newton = s - diff / vega
+        bisect = 0.5 * (lo[active] + hi[active])
+        use_newton = (vega > 1e-12) & (newton > lo[active]) & (newton < hi[active])
+        sigma[active] = np.where(done, s, np.where(use_newton, newton, bisect))
+        active = active[~done & (hi[active] - lo[active] > tol)]
+        if len(active) == 0:
+            break
+    result[idx] = sigma
+    return result.reshape(shape)
+
+
+def parity_forward(prices: pd.DataFrame, contracts: pd.DataFrame, discount: np.ndarray) -> pd.DataFrame:
+    """
+    用认购-认沽平价计算每个合约的标的远期价格 F = K + (C - P) / D。
+
+    同一标的、同一到期日下选 |C - P| 最小的行权价（最接近平值）计算远期价格，
+    该到期日的所有合约使用同一个远期价格。
+
+    Parameters
+    ==========
+    prices: pd.DataFrame
+        日期 × 合约的期权价格
+    contracts: pd.DataFrame
+        以合约代码为索引，需要s_info_sccode, s_info_callput, s_info_strikeprice, maturity四列，与prices的列对齐
+    discount: np.ndarray
+        日期 × 合约的贴现因子
+
+    Returns
+    =======
+    pd.DataFrame
+        日期 × 合约
+    """
+    keys = ["s_info_sccode", "maturity", "s_info_strikeprice"]
+    position = pd.Series(np.arange(len(contracts)), index=contracts.index, name="position")
+    table = contracts[keys + ["s_info_callput"]].join(position)
+    pairs = pd.merge(
+        table[table.s_info_callput == CALL],
+        table[table.s_info_callput == PUT],
+        on=keys, suffixes=("_call", "_put")
+    )
+    forward = np.full(prices.shape, np.nan)
+    if len(pairs) == 0:
+        return pd.DataFrame(forward, index=prices.index, columns=prices.columns)
+
+    # 按到期分组，同一组的配对在列上相邻，方便reduceat
+    pairs["group"] = pairs.groupby(keys[:2], sort=True).ngroup()
+    pairs = pairs.sort_values("group", kind="stable")
+    values = prices.values
+    call = values[:, pairs.position_call.values]
+    put = values[:, pairs.position_put.values]
+    spread = call - put
+    pair_forward = pairs.s_info_strikeprice.values + spread / discount[:, pairs.position_call.values]
+    distance = np.where(np.isnan(spread), np.inf, np.abs(spread))
+
+    starts = np.flatnonzero(np.r_[True, np.diff(pairs.group.values) != 0])
+    sizes = np.diff(np.r_[starts, len(pairs)])
+    nearest = np.repeat(np.minimum.reduceat(distance, starts, axis=1), sizes, axis=1)
+    chosen = np.isfinite(distance) & (distance == nearest)
+    total = np.add.reduceat(np.where(chosen, pair_forward, 0.0), starts, axis=1)
+    count = np.add.reduceat(chosen.astype("float64"), starts, axis=1)
+    with np.errstate(invalid="ignore"):
+        group_forward = total / count
+
+    # 把每组的远期价格广播回该组的所有合约
+    groups = pairs.groupby("group")[keys[:2]].first()
+    group_of = (table[keys[:2]]
+        .reset_index()
+        .merge(groups.reset_index(), on=keys[:2], how="left")
+        .group
+        .values
+    )
+    has_group = ~np.isnan(group_of)
+    forward[:, has_group] = group_forward[:, group_of[has_group].astype(int)]
+    return pd.DataFrame(forward, index=prices.index, columns=prices.columns)
+
+
+def compute_option_analytics(prices: pd.DataFrame, contracts: pd.DataFrame, rate: float,
+                             underlying: pd.DataFrame=None) -> dict:
+    """
+    计算全部合约全部日期的隐含波动率和希腊字母
+
+    Parameters
+    ==========
+    prices: pd.DataFrame
+        日期 × 合约的期权价格
+    contracts: pd.DataFrame
+        合约信息，参见 :func:`parity_forward`
+    rate: float
+        无风险利率（年化，连续复利）
+    underlying: pd.DataFrame, optional
+        日期 × 合约的标的现货价格，为None则用认购-认沽平价推出远期价格
+
+    Returns
+    =======
+    dict
+        iv, forward以及 :data:`GREEKS` 中的各项，均为日期 × 合约的DataFrame
+    """
+    contracts = contracts.reindex(prices.columns)
+    dates = prices.index.values.astype("datetime64[D]")
+    maturity = contracts.maturity.values.astype("datetime64[D]")
+    t = (maturity[None, :] - dates[:, None]).astype("float64") / 365
+    t[t <= 0] = np.nan
+    discount = np.exp(-rate * t)
+    if underlying is None:
+        forward = parity_forward(prices, contracts, discount).values
+    else:
+        forward = underlying.reindex(index=prices.index, columns=prices.columns).values / discount
+    strike = contracts.s_info_strikeprice.values[None, :]
+    is_call = (contracts.s_info_callput.values == CALL)[None, :]
+
+    iv = implied_volatility(prices.values, forward, strike, t, is_call, discount)
+    greeks = black_greeks(forward, strike, t, iv, is_call, discount, rate)
+    result = {"iv": iv, "forward": forward}
+    result.update(greeks)
+    return {
+        key: pd.DataFrame(value, index=prices.index, columns=prices.columns)
+        for key, value in result.items()
+    }
+
+
+class OptionsData:
+    """期权数据接口，计算ETF期权的隐含波动率与希腊字母"""
+    def __init__(self, wind):
+        """
+        Parameters
+        ==========
+        wind: quant.data.wind.WindData
+            万得数据接口
+        """
+        self.wind = wind
+        self._analytics = {}
+
+    def get_prices(self, field: str="s_dq_close") -> pd.DataFrame:
+        """期权日行情透视表，日期 × 合约"""
+        return self.wind.get_data("ChinaOptionEODPrices", field)
+
+    def get_contracts(self) -> pd.DataFrame:
+        """期权合约信息，以合约代码为索引，maturity为到期日（缺失时使用最后交易日）"""
+        contracts = self.wind.get_table("ChinaOptionDescription", [
+            "s_info_windcode", "s_info_sccode", "s_info_callput", "s_info_strikeprice",
+            "s_info_maturitydate", "s_info_lasttradingdate"
+        ])
+        contracts = contracts.drop_duplicates("s_info_windcode", keep="last").set_index("s_info_windcode")
+        contracts["maturity"] = contracts.s_info_maturitydate.fillna(contracts.s_info_lasttradingdate)
+        return contracts
+
+    @LOCALIZER.wrap("wind_options.h5", keys=["field", "key"], format="mmap")
+    def _get_analytics(self, key: str, field: str="s_dq_close") -> pd.DataFrame:
+        # 所有结果一次算出，缓存各个面板时不必重复计算
+        if field not in self._analytics:
+            rate = CONFIG.get("RISK_FREE_RATE", 0.03)
+            self._analytics[field] = compute_option_analytics(self.get_prices(field), self.get_contracts(), rate)
+        return self._analytics[field][key]
+
+    def get_implied_volatility(self, field: str="s_dq_close") -> pd.DataFrame:
+        """
+        所有期权合约每天的隐含波动率，标的远期价格由认购-认沽平价得到，无风险利率见配置项risk_free_rate
+
+        Parameters
+        ==========
+        field: str
+            计算所用的价格字段，s_dq_close或s_dq_settle
+
+        Examples
+        ========
+
+        ..  code-block::
+            python
+
+            from quant.data import options
+            iv = options.get_implied_volatility("s_dq_settle")
+        """
+        return self._get_analytics("iv", field)
+
+    def get_greeks(self, greek: str, field: str="s_dq_close") -> pd.DataFrame:
+        """
+        所有期权合约每天的希腊字母
+
+        Parameters
+        ==========
+        greek: {'delta', 'gamma', 'vega', 'theta'}
+            希腊字母，vega为波动率变动1.00时的价格变动，theta为年化值
+        field: str
+            参见 :meth:`get_implied_volatility`
+        """
+        if greek not in GREEKS:
+            raise ValueError("Unknown greek {}, should be one of {}".format(greek, GREEKS))
+        return self._get_analytics(greek, field)
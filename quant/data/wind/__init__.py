@@ -19,19 +19,35 @@ from . import tables
 from ...common import LOCALIZER, single_instance, method_dispatch
 from ...common.rainbow import rainbow
 from ...common.settings import CONFIG, DATA_PATH
+from ...common.localize import CODEC_POLICY
 from ...common.db.sql import SQLClient
 from ...common.logging import Logger
-from ...utils.calendar import TDay
+from ...utils.calendar import trading_calendar
 
 __all__ = ['WindDB', 'tables', 'to_trade_data']
 
+INDUSTRY_TABLES = {
+    "AShareIndustriesClass": "wind_ind_code",
+    "AShareSECNIndustriesClass": "sec_ind_code",
+    "AShareSECIndustriesClass": "sec_ind_code",
+    "AShareIndustriesClassCITICS": "citics_ind_code",
+}
+"""行业分类表及其行业代码字段"""
+
+INDUSTRY_CODE_LENGTHS = {
+    1: 4,
+    2: 6,
+    3: 8
+}
+"""各级行业代码的长度"""
+
 
 def to_trade_data(data):
     """
     把按季度公布的数据转换成交易日数据
     """
     today = date.today().strftime("%Y-%m-%d")
-    target_index = pd.Series(pd.date_range(data.index[0], today, freq=TDay))
+    target_index = pd.Series(trading_calendar.range(data.index[0], today))
     index = sorted(set(target_index) | set(data.index))
     columns = data.columns
     final_data = pd.DataFrame(np.full((len(index), len(columns)), np.nan), index=index, columns=columns)
@@ -134,8 +150,9 @@ class WindDB:
         )
 
         filename = os.path.join(DATA_PATH, "wind.h5")
+        compression = CODEC_POLICY.resolve("wind", table_name)
         for col in df.columns:
-            df[col].to_hdf(filename, key="/".join([table_name, col]), format="table", append=True, complevel=9)
+            df[col].to_hdf(filename, key="/".join([table_name, col]), format="table", append=True, **compression)
 
     def sql_select(self, table, columns):
         sql_statement = (sql
@@ -166,8 +183,9 @@ class WindDB:
         df = pd.read_sql_query(sql_statement, engine, index_col="object_id", parse_dates=parse_dates)
         if len(df) != 0:
             filename = os.path.join(DATA_PATH, "wind.h5")
+            compression = CODEC_POLICY.resolve("wind", table_name)
             for col in df.columns:
-                df[col].to_hdf(filename, key="/".join([table_name, col]), format="table", append=True, complevel=9)
+                df[col].to_hdf(filename, key="/".join([table_name, col]), format="table", append=True, **compression)
         self.records.set_last_update(table_name, df["opdate"].max())
         sys.stdout.write("\rUpdate table [{table}]..........[Done]\n\r{nrows} rows updated.\n".format(table=rainbow.yellow(table_name), nrows=rainbow.yellow(str(len(df)))))
         sys.stdout.flush()
@@ -212,7 +230,7 @@ class WindData:
             data[col] = data[col][~data[col].index.duplicated(keep="last")]
         return pd.DataFrame(data)
 
-    @LOCALIZER.wrap("wind_pivot.h5", keys=["table", "field"], format="fixed")
+    @LOCALIZER.wrap("wind_pivot.h5", keys=["table", "field"], format="mmap")
     def get_data(self, table: str, field: str, index: str=None, columns: str=None) -> pd.DataFrame:
         """
         获取万得交易数据
@@ -356,10 +374,14 @@ class WindData:
             # 最后把剩下的NA用False填充
             wind.arrange_entry_table("AShareST").fillna(False)
         """
+        return self._arrange_entry_table(table, field, columns)
+
+    def _arrange_entry_table(self, table: Union[str, pd.DataFrame], field: str="", columns: str=None):
+        """不带缓存的 :meth:`arrange_entry_table` ，table为DataFrame时只能调用这个版本"""
+        column = columns or "s_info_windcode"
         if isinstance(table, str):
             # 如果table是str，向数据库查询
             column_names = self.db.sql.get_column_names_from_table(table)
-            column = columns or "s_info_windcode"
             if column not in column_names:
                 raise RuntimeError("No field specified for column names")
             if "entry_dt" not in column_names or "remove_dt" not in column_names:
@@ -376,33 +398,33 @@ class WindData:
 
         start_date = min(pd.to_datetime("2006-01-01"), table.entry_dt.min())
         end_date = max(pd.to_datetime(date.today()), table.remove_dt.max())
-        index = pd.date_range(start_date, end_date, freq=TDay)
+        index = trading_calendar.range(start_date, end_date)
         
         basics = self.get_stock_basics().dropna(subset=['s_info_listdate'])
         basics = basics[pd.isnull(basics.s_info_delistdate)]
-        columns = basics.index
+        stocks = basics.index
 
         data = defaultdict(list)
         for _, row in table.iterrows():
             key = row[column]
             start = start_date if pd.isnull(row.entry_dt) else row.entry_dt
             end = end_date if pd.isnull(row.remove_dt) else row.remove_dt
-            idx = pd.date_range(start, end, freq=TDay)
+            idx = trading_calendar.range(start, end)
             value = [True if not field else row[field]] * len(idx)
             series = pd.Series(value, index=idx)
             data[key].append(series)
         data2 = []
         for key, item in data.items():
-            series = pd.concat(item, 0).rename(key)
+            series = pd.concat(item, axis=0).rename(key)
             series = series[~series.index.duplicated(keep='last')]
             data2.append(series)
-        data = pd.concat(data2, 1)
+        data = pd.concat(data2, axis=1)
         
         # 有些股票可能不在表里，要把数据补全
-        rest_columns = set(columns) - set(data.columns)
+        rest_columns = sorted(set(stocks) - set(data.columns))
         if rest_columns:
-            idx = pd.date_range(start_date, end_date, freq=TDay)
-            data = pd.concat([data, pd.DataFrame(np.full((len(idx), len(rest_columns)), None, dtype=dtype), index=idx, columns=rest_columns)], 1) 
+            idx = trading_calendar.range(start_date, end_date)
+            data = pd.concat([data, pd.DataFrame(np.full((len(idx), len(rest_columns)), None, dtype=dtype), index=idx, columns=rest_columns)], axis=1)
         return data
 
     def get_consensus_data(self, field: str, est_years: int=1) -> pd.DataFrame:
@@ -438,11 +460,45 @@ class WindData:
         pivot_table = df.pivot(index='est_dt', columns='s_info_windcode', values=field).ffill()
         return pivot_table
 
-    @LOCALIZER.wrap("wind_pivot.h5", keys=["table", "level"])
+    @LOCALIZER.wrap("wind_industries.h5", keys=["table", "level"], const_key="table")
+    def get_industry_table(self, table: str, level: int=1) -> pd.DataFrame:
+        """
+        行业整数代码与行业名称的对照表，与 :meth:`get_stock_industries` 返回的代码对应
+
+        Parameters
+        ==========
+
+        table: str
+            参见 :meth:`get_stock_industries`
+        level: {1, 2, 3}
+            行业等级
+
+        Returns
+        =======
+        pd.DataFrame
+            以整数代码为索引，industriescode列为万得行业代码，industriesname列为行业名称
+        """
+        length = INDUSTRY_CODE_LENGTHS[level]
+        industry_codes = (self
+            .get_table("AShareIndustriesCode", ["industriesname", "industriescode", "levelnum"])
+            .query("levelnum==@level+1")
+        )
+        industry_codes.industriescode = industry_codes.industriescode.str[:length]
+        industry_codes = (industry_codes
+            .drop_duplicates("industriescode", keep="last")
+            .sort_values("industriescode")
+            [["industriescode", "industriesname"]]
+            .reset_index(drop=True)
+        )
+        return industry_codes
+
+    @LOCALIZER.wrap("wind_industries.h5", keys=["table", "level"], const_key="codes", format="mmap")
     def get_stock_industries(self, table: str, level: int=1) -> pd.DataFrame:
         """
         从指定的表中获取股票行业表
 
+        行业以小整数代码保存，-1表示没有行业分类，代码与行业名称的对照见 :meth:`get_industry_table`
+
         Parameters
         ==========
 
@@ -466,37 +522,37 @@ class WindData:
             python
 
             # 获取中国A股中信行业分类 （一级分类）
-            wind.get_stock_industries("AShareIndustriesClassCITICS", 1)
+            codes = wind.get_stock_industries("AShareIndustriesClassCITICS", 1)
+            names = wind.get_industry_table("AShareIndustriesClassCITICS", 1).industriesname
+            # 需要行业名称时再转换
+            names.reindex(codes.loc["2018-01-02"]).values
         """
-        level = level
-        tables = {
-            "AShareIndustriesClass": "wind_ind_code",
-            "AShareSECNIndustriesClass": "sec_ind_code",
-            "AShareSECIndustriesClass": "sec_ind_code",
-            "AShareIndustriesClassCITICS": "citics_ind_code",
-        }
-        lengths = {
-            1: 4,
-            2: 6,
-            3: 8
-        }
-        industry_codes = (self
-            .get_table("AShareIndustriesCode", ["industriesname", "industriescode", "levelnum"])
-            .query("levelnum==@level+1")
-        )
-        industry_codes.industriescode = industry_codes.industriescode.str[:lengths[level]]
-        industry_codes, industry_names = zip(*industry_codes[["industriescode", "industriesname"]].to_records(index=False))
-        field_name = tables[table]
+        industry_table = self.get_industry_table(table, level)
+        mapping = pd.Series(industry_table.index, index=industry_table.industriescode.values)
+        field_name = INDUSTRY_TABLES[table]
         industry = self.get_table(table, ["s_info_windcode", field_name, "entry_dt", "remove_dt"])
-        industry[field_name] = industry[field_name].str[:lengths[level]]
-        catetory_dtype = pd.api.types.CategoricalDtype(categories=set(industry_names))
-        industry = (self
-            .arrange_entry_table(industry, field_name)
+        # 在原始表上把行业代码转换为整数，而不是在整个面板上替换字符串
+        industry[field_name] = industry[field_name].str[:INDUSTRY_CODE_LENGTHS[level]].map(mapping).astype("float64")
+        # DataFrame无法作为缓存的键，调用未缓存的版本
+        codes = (self._arrange_entry_table(industry, field_name)
+            .astype("float64")
             .bfill()
-            .replace(industry_codes, industry_names)
-            .dropna(1, how='all')
+            .dropna(axis=1, how='all')
         )
-        return industry
+        dtype = "int8" if len(industry_table) < np.iinfo("int8").max else "int16"
+        return codes.fillna(-1).astype(dtype)
+
+    def refresh_stock_industries(self, table: str, level: int=1, until=None) -> pd.DataFrame:
+        """
+        同 :meth:`get_stock_industries` ，缓存的行业面板没有覆盖到until时重新生成，用于增量更新新的交易日
+        """
+        return LOCALIZER.refresh(type(self).get_stock_industries, self, table, level, until=until)
+
+    def refresh_entry_table(self, table: str, field: str="", columns: str=None, until=None) -> pd.DataFrame:
+        """
+        同 :meth:`arrange_entry_table` ，缓存的透视表没有覆盖到until时重新生成，用于增量更新新的交易日
+        """
+        return LOCALIZER.refresh(type(self).arrange_entry_table, self, table, field, columns, until=until)
 
     @LOCALIZER.wrap("wind_basics.h5", const_key="st")
     def get_stock_st(self) -> pd.DataFrame:
@@ -504,7 +560,6 @@ class WindData:
         This method is deprecated in favor of `arrange_entry_table`. 
         Use wind.arrange_entry_table('AShareST').fillna(False)
         """
-        from ...utils.calendar import TDay
         warnings.warn(DeprecationWarning(
             "This method is deprecated in favor of `arrange_entry_table`. "
             "Use wind.arrange_entry_table('AShareST').fillna(False)"))
@@ -518,7 +573,7 @@ class WindData:
 
         start_date = "2006-01-01"
         end_date = max(today, table.remove_dt.max())
-        index = pd.date_range(start_date, end_date, freq=TDay)
+        index = trading_calendar.range(start_date, end_date)
         st_table = pd.DataFrame(np.full((len(index), len(columns)), False), index=index, columns=columns)
         for _, row in table.iterrows():
             key = row.s_info_windcode
@@ -528,7 +583,7 @@ class WindData:
             end = row.remove_dt
             if pd.isnull(end):
                 end = end_date
-            daterange = pd.date_range(start, end, freq=TDay)
+            daterange = trading_calendar.range(start, end)
             st_table.loc[daterange, key] = True
         st_table.index.freq = None      # Can't save to hdf with freq
         return st_table
@@ -1,3 +1,4 @@
 """All things related to data transformation"""
 from .distribution import *
 from .stocks import *
+from .regression import *
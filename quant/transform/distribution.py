@@ -1,6 +1,7 @@
 """
 与数据分布有关的变换
 """
+import warnings
 import numpy as np
 import scipy.stats
 import pandas as pd
@@ -49,10 +50,71 @@ def find_extreme_values(data, distribution="norm", alpha=0.975):
     return extreme
 
 
-def __compute_zscore(data: np.ndarray, axis: int = -1, clip: float = 3.0):
+def __standardize_slice(sliced, extremes, clip):
+    score = (sliced - np.nanmedian(sliced[~extremes])) / np.nanstd(sliced[~extremes])
+    score = np.clip(score, -clip, clip)
+    epsilon = 1e-4
+    total_err = 1.0
+    avg = np.nanmean(score[~extremes])
+    sd = np.nanstd(score[~extremes])
+    z = (score - avg) / sd
+    trial = 0
+    while total_err > epsilon and trial < 3:
+        if (abs(z) >= clip).any():
+            z = np.clip(z, -clip, clip)
+        avg = np.nanmean(z)
+        std = np.nanstd(z)
+        total_err = abs(avg) + abs(std - 1)
+        z = (z - avg) / std
+        trial += 1
+    return z
+
+
+def __batch_zscore(data: np.ndarray, clip: float, alpha: float):
+    """
+    对二维数组的每一行同时计算正态假设下的Z分数，与逐行调用 :func:`__standardize_slice` 结果相同
+    """
+    with warnings.catch_warnings():
+        # 全为NaN的行
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        # 正态分布的MLE参数即均值与总体标准差，区间有解析解
+        mean = np.nanmean(data, axis=1, keepdims=True)
+        width = scipy.stats.norm.ppf((1 + alpha) / 2) * np.nanstd(data, axis=1, keepdims=True)
+        extremes = (data > mean + width) | (data < mean - width)
+        kept = np.where(extremes, np.nan, data)
+        score = (data - np.nanmedian(kept, axis=1, keepdims=True)) / np.nanstd(kept, axis=1, keepdims=True)
+        score = np.clip(score, -clip, clip)
+        kept = np.where(extremes, np.nan, score)
+        z = (score - np.nanmean(kept, axis=1, keepdims=True)) / np.nanstd(kept, axis=1, keepdims=True)
+
+        epsilon = 1e-4
+        active = np.arange(len(z))
+        for _ in range(3):
+            rows = np.clip(z[active], -clip, clip)
+            avg = np.nanmean(rows, axis=1, keepdims=True)
+            std = np.nanstd(rows, axis=1, keepdims=True)
+            z[active] = (rows - avg) / std
+            total_err = (np.abs(avg) + np.abs(std - 1)).ravel()
+            # 和逐行计算一样，NaN的误差视为已收敛
+            active = active[total_err > epsilon]
+            if len(active) == 0:
+                break
+    return z
+
+
+def __compute_zscore(data: np.ndarray, axis: int = -1, clip: float = 3.0, distribution: str = "norm", alpha: float = 0.975):
     dims = data.ndim
     data[data == np.inf] = np.nan
     data[data == -np.inf] = np.nan
+    if distribution == "norm":
+        if axis is None:
+            data[...] = __batch_zscore(data.reshape(1, -1), clip, alpha).reshape(data.shape)
+        else:
+            moved = np.moveaxis(data, axis, 0)
+            moved[...] = __batch_zscore(moved.reshape(moved.shape[0], -1), clip, alpha).reshape(moved.shape)
+        return data
+
+    # 其他分布没有简单的区间公式，逐个切片拟合
     if axis is None:
         length = 1
     else:
@@ -60,33 +122,20 @@ def __compute_zscore(data: np.ndarray, axis: int = -1, clip: float = 3.0):
             axis += dims
         length = data.shape[axis]
     for i in range(length):
-        _slice = [i if j == axis else slice(None) for j in range(dims)]
-        sliced = data.__getitem__(_slice)
-        extremes = find_extreme_values(sliced)
-        score = (sliced - np.nanmedian(sliced[~extremes])) / np.nanstd(sliced[~extremes])
-        score = np.clip(score, -clip, clip)
-        epsilon = 1e-4
-        total_err = 1.0
-        avg = np.nanmean(score[~extremes])
-        sd = np.nanstd(score[~extremes])
-        z = (score - avg) / sd
-        trial = 0
-        while total_err > epsilon and trial < 3:
-            if (abs(z) >= clip).any():
-                z = np.clip(z, -clip, clip)
-            avg = np.nanmean(z)
-            std = np.nanstd(z)
-            total_err = abs(avg) + abs(std - 1)
-            z = (z - avg) / std
-            trial += 1
-        data.__setitem__(_slice, z)
+        _slice = tuple(i if j == axis else slice(None) for j in range(dims))
+        sliced = data[_slice]
+        extremes = find_extreme_values(sliced, distribution, alpha)
+        data[_slice] = __standardize_slice(sliced, extremes, clip)
     return data
 
 
-def compute_zscore(data, axis=-1, clip=3.0, inplace=False):
+def compute_zscore(data, axis=-1, clip=3.0, inplace=False, distribution="norm", alpha=0.975):
     """
     计算Z分数（标准化）
 
+    先按假定的分布找出离群值，用非离群值的中位数和标准差中心化并截断，再反复标准化直到均值为0、标准差为1。
+    正态分布时所有切片一次批量计算，其他分布逐个切片拟合。
+
     Parameters
     ----------
     data
@@ -97,6 +146,10 @@ def compute_zscore(data, axis=-1, clip=3.0, inplace=False):
         clip
     inplace: bool, optional
         在原数据上修改还是返回新的数据
+    distribution: str, optional
+        判断离群值时假定的分布，参见 :func:`find_extreme_values`
+    alpha: float, optional
+        判断离群值的alpha水平
 
     Examples
     --------
@@ -116,20 +169,79 @@ def compute_zscore(data, axis=-1, clip=3.0, inplace=False):
     """
     if not inplace:
         data = data.copy()
-    if isinstance(data, (pd.Series, pd.DataFrame, pd.Panel)):
-        __compute_zscore(data.values, axis=axis, clip=clip)
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        values = __compute_zscore(np.array(data.values, dtype="float64"), axis=axis, clip=clip,
+                                  distribution=distribution, alpha=alpha)
+        data.iloc[:] = values
     else:
-        __compute_zscore(data, axis=axis, clip=clip)
+        __compute_zscore(data, axis=axis, clip=clip, distribution=distribution, alpha=alpha)
     return data
 
 
 ###########
 
 
+def get_residuals(y: pd.DataFrame, x, estimate_start=None, estimate_end=None, remove_alpha=True) -> pd.DataFrame:
+    """
+    把y面板的每一列同时对x做一元回归并求残差
+
+    对每一列，在估计区间内取y与x都有效的日期，用带掩码的求和一次算出所有列的
+    [1, x]的Gram矩阵，再批量求伪逆得到alpha和beta。
+
+    Parameters
+    ----------
+    y: pd.DataFrame
+        因变量，日期 × 股票
+    x: pd.Series or pd.DataFrame
+        自变量。Series表示所有股票对同一个序列回归（如市场收益率），
+        DataFrame则与y按日期和股票对齐，每只股票对各自的序列回归
+    estimate_start: str (YYYY-MM-DD), optional
+        参数估计的起始时间
+    estimate_end: str (YYYY-MM-DD), optional
+        参数估计的结束时间
+    remove_alpha: bool, optinal
+        是否去除常数项，默认为True
+
+    Returns
+    -------
+    pd.DataFrame
+        与y形状相同的残差
+    """
+    if isinstance(x, pd.Series):
+        x_values = x.reindex(y.index).values.astype("float64")[:, None]
+    else:
+        x_values = x.reindex(index=y.index, columns=y.columns).values.astype("float64")
+    y_values = y.values.astype("float64")
+    x_values = np.broadcast_to(x_values, y_values.shape)
+
+    window = np.ones(len(y.index), dtype=bool)
+    if estimate_start is not None:
+        window &= y.index >= pd.Timestamp(estimate_start)
+    if estimate_end is not None:
+        window &= y.index <= pd.Timestamp(estimate_end)
+    mask = np.isfinite(y_values) & np.isfinite(x_values) & window[:, None]
+    xm = np.where(mask, x_values, 0.0)
+    ym = np.where(mask, y_values, 0.0)
+
+    n = mask.sum(axis=0)
+    sx = xm.sum(axis=0)
+    gram = np.empty((y_values.shape[1], 2, 2))
+    gram[:, 0, 0] = n
+    gram[:, 0, 1] = gram[:, 1, 0] = sx
+    gram[:, 1, 1] = (xm * xm).sum(axis=0)
+    rhs = np.stack([ym.sum(axis=0), (xm * ym).sum(axis=0)], axis=1)
+    alpha, beta = (np.linalg.pinv(gram) @ rhs[:, :, None])[:, :, 0].T
+
+    fitted = beta * x_values
+    if remove_alpha:
+        fitted = fitted + alpha
+    return pd.DataFrame(y_values - fitted, index=y.index, columns=y.columns)
+
+
 def get_residual(y: pd.Series, x: pd.Series, 
                  estimate_start=None, estimate_end=None, remove_alpha=True):
     """
-    将y序列对x序列做回归并求残差
+    将y序列对x序列做回归并求残差，参见 :func:`get_residuals`
 
     Parameters
     ----------
@@ -144,19 +256,5 @@ def get_residual(y: pd.Series, x: pd.Series,
     remove_alpha: bool, optinal
         是否去除常数项，默认为True
     """
-    estimate_x = x.truncate(estimate_start, estimate_end).dropna()
-    estimate_y = y.truncate(estimate_start, estimate_end).dropna()
-    common_index = sorted(set(estimate_x.index) & set(estimate_y.index))
-    estimate_x = estimate_x[common_index]
-    estimate_y = estimate_y[common_index]
-    estimate_matrix = np.stack([np.ones(len(estimate_x)), estimate_x.values], axis=1)
-    beta = ((np.linalg.pinv(estimate_matrix.T @ estimate_matrix) @ estimate_matrix.T) @ estimate_y.values).reshape(-1)
-    if remove_alpha:
-        matrix = np.stack([np.ones(len(x)), x.values])
-    else:
-        matrix = np.stack([np.zeros(len(x)), x.values])
-    return y - matrix @ beta
-
-
-
-
+    residuals = get_residuals(y.to_frame(), x, estimate_start, estimate_end, remove_alpha)
+    return residuals.iloc[:, 0]
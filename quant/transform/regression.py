@@ -0,0 +1,175 @@
+"""
+截面回归
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+__all__ = ['RegressionResult', 'cross_sectional_regression']
+
+RegressionResult = namedtuple("RegressionResult", ["fitted", "residuals", "coefficients"])
+"""
+截面回归的结果
+
+fitted: pd.DataFrame
+    拟合值，日期 × 股票，自变量有效的股票都有拟合值（包括y缺失的股票）
+residuals: pd.DataFrame
+    残差，日期 × 股票
+coefficients: pd.DataFrame
+    回归系数，日期 × 因子
+"""
+
+
+def _solve_block(exposures, codes, y, weights, n_industries):
+    """
+    求解一段日期的加权最小二乘
+
+    Parameters
+    ==========
+    exposures: np.ndarray
+        B × N × K的暴露（含常数项）
+    codes: np.ndarray
+        B × N的行业代码，-1表示没有行业
+    y: np.ndarray
+        B × N
+    weights: np.ndarray
+        B × N的权重，不参与回归的位置为0
+
+    Returns
+    =======
+    (beta, fitted)
+        B × (K + G)的系数与B × N的拟合值
+    """
+    n_dates, n_stocks, k = exposures.shape
+    g = n_industries
+    p = k + g
+    ex = np.nan_to_num(exposures)
+    yy = np.nan_to_num(y)
+    wx = ex * weights[:, :, None]
+
+    gram = np.zeros((n_dates, p, p))
+    rhs = np.zeros((n_dates, p))
+    gram[:, :k, :k] = np.einsum("bnk,bnl->bkl", wx, ex)
+    rhs[:, :k] = np.einsum("bnk,bn->bk", wx, yy)
+    if g:
+        # 行业虚拟变量的部分用bincount分组求和，不生成虚拟变量矩阵
+        has_industry = codes >= 0
+        rows = np.nonzero(has_industry)[0]
+        groups = rows * g + codes[has_industry]
+        size = n_dates * g
+        industry_weight = np.bincount(groups, weights=weights[has_industry], minlength=size).reshape(n_dates, g)
+        diagonal = np.arange(g) + k
+        gram[:, diagonal, diagonal] = industry_weight
+        for i in range(k):
+            cross = np.bincount(groups, weights=wx[:, :, i][has_industry], minlength=size).reshape(n_dates, g)
+            gram[:, i, k:] = cross
+            gram[:, k:, i] = cross
+        rhs[:, k:] = np.bincount(groups, weights=(weights * yy)[has_industry], minlength=size).reshape(n_dates, g)
+
+    beta = (np.linalg.pinv(gram) @ rhs[:, :, None])[:, :, 0]
+    fitted = np.einsum("bnk,bk->bn", ex, beta[:, :k])
+    if g:
+        industry_beta = np.concatenate([beta[:, k:], np.zeros((n_dates, 1))], axis=1)
+        fitted += np.take_along_axis(industry_beta, np.where(codes >= 0, codes, g), axis=1)
+    return beta, fitted
+
+
+def _solve_block_star(args):
+    return _solve_block(*args)
+
+
+def cross_sectional_regression(y: pd.DataFrame, exposures: dict=None, industries: pd.DataFrame=None,
+                               weights: pd.DataFrame=None, intercept: bool=False, industry_names=None,
+                               block_size: int=250, n_jobs: int=1) -> RegressionResult:
+    """
+    对每个日期做一次截面加权最小二乘回归，所有日期批量求解
+
+    每个日期的Gram矩阵用einsum（暴露部分）和bincount（行业部分）一次算出，再用批量伪逆求解，
+    所以共线的设计（如常数项加全部行业）也能得到最小范数解。日期按block_size分段，
+    n_jobs大于1时各段在多个进程中并行计算。
+
+    Parameters
+    ==========
+    y: pd.DataFrame
+        因变量，日期 × 股票
+    exposures: dict
+        以因子名为键，日期 × 股票的暴露为值
+    industries: pd.DataFrame
+        日期 × 股票的行业整数代码，-1表示没有行业（虚拟变量全为0），参见
+        :meth:`quant.data.wind.WindData.get_stock_industries`
+    weights: pd.DataFrame
+        回归权重，默认等权
+    intercept: bool
+        是否加入常数项
+    industry_names: List[str]
+        行业代码对应的名称，用作系数的列名，默认为代码本身
+    block_size: int
+        每段的日期数
+    n_jobs: int
+        并行的进程数
+
+    Returns
+    =======
+    RegressionResult
+        拟合值、残差和系数。只有y、暴露、权重都有效（权重为正）的股票参与回归；
+        暴露有效的股票都有拟合值
+
+    Examples
+    ========
+
+    ..  code-block::
+        python
+
+        from quant.transform import cross_sectional_regression
+        result = cross_sectional_regression(
+            values, {"size": size}, industries=codes, weights=cap ** 0.5
+        )
+        values.fillna(result.fitted)
+    """
+    exposures = exposures or {}
+    index, columns = y.index, y.columns
+    names = list(exposures.keys())
+    stacked = [exposures[name].reindex(index=index, columns=columns).values.astype("float64") for name in names]
+    if intercept:
+        names = ["intercept"] + names
+        stacked = [np.ones(y.shape)] + stacked
+    stacked = np.stack(stacked, axis=2) if stacked else np.zeros(y.shape + (0,))
+
+    if industries is not None:
+        codes = industries.reindex(index=index, columns=columns).fillna(-1).values.astype("int64")
+        n_industries = int(codes.max()) + 1 if industry_names is None else len(industry_names)
+        industry_names = list(range(n_industries)) if industry_names is None else list(industry_names)
+    else:
+        codes = np.full(y.shape, -1, dtype="int64")
+        n_industries = 0
+        industry_names = []
+
+    y_values = y.values.astype("float64")
+    w = np.ones(y.shape) if weights is None else weights.reindex(index=index, columns=columns).values.astype("float64")
+    predictable = np.isfinite(stacked).all(axis=2)
+    valid = predictable & np.isfinite(y_values) & np.isfinite(w) & (w > 0)
+    w = np.where(valid, w, 0.0)
+
+    blocks = [slice(i, i + block_size) for i in range(0, len(index), block_size)]
+    tasks = [(stacked[b], codes[b], y_values[b], w[b], n_industries) for b in blocks]
+    if n_jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(n_jobs) as executor:
+            results = list(executor.map(_solve_block_star, tasks))
+    else:
+        results = [_solve_block(*task) for task in tasks]
+    if results:
+        beta = np.concatenate([r[0] for r in results], axis=0)
+        fitted = np.concatenate([r[1] for r in results], axis=0)
+    else:
+        beta = np.zeros((0, len(names) + n_industries))
+        fitted = np.zeros(y.shape)
+
+    beta[~valid.any(axis=1)] = np.nan
+    fitted = np.where(predictable & valid.any(axis=1, keepdims=True), fitted, np.nan)
+    fitted = pd.DataFrame(fitted, index=index, columns=columns)
+    return RegressionResult(
+        fitted=fitted,
+        residuals=y - fitted,
+        coefficients=pd.DataFrame(beta, index=index, columns=names + industry_names)
+    )
@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+import xarray as xr
 from ..data import wind
 from ..common import LOCALIZER
 
@@ -23,3 +24,101 @@ def get_rtn(x: pd.Series, rtn_len: int, shift: bool=False):
     if shift:
         data = data.shift(-rtn_len)
     return data
+
+
+def _cumulative_log_returns(prices: pd.DataFrame):
+    """
+    累计对数收益率及累计有效天数，第k行为第1天到第k天的和（第0行为0），
+    所以第t+1天到第t+h天的和为 ``cumsum[t + h] - cumsum[t]``
+    """
+    log_returns = np.diff(np.log(prices.values.astype("float64")), axis=0)
+    valid = np.isfinite(log_returns)
+    zeros = np.zeros((1, prices.shape[1]))
+    cumsum = np.concatenate([zeros, np.cumsum(np.where(valid, log_returns, 0), axis=0)])
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    return cumsum, counts
+
+
+def compute_forward_returns(prices: pd.DataFrame, horizons, cumulative: bool=True, cumulated=None) -> xr.DataArray:
+    """
+    从一个累计对数收益率数组一次计算多个期限的未来收益率
+
+    Parameters
+    ==========
+    prices: pd.DataFrame
+        复权价格，日期 × 股票
+    horizons: List[int]
+        期限（交易日数）
+    cumulative: bool
+        如果True，结果为未来h天的累计收益率，与 ``get_rtn(x, h, shift=True)`` 相同；
+        如果False，结果为第h天的单日收益率
+    cumulated: tuple
+        已经算好的累计对数收益率，内部使用
+
+    Returns
+    =======
+    xr.DataArray
+        期限 × 日期 × 股票，期末超出数据范围的部分为NaN
+    """
+    horizons = [int(h) for h in np.atleast_1d(horizons)]
+    cumsum, counts = cumulated if cumulated is not None else _cumulative_log_returns(prices)
+    n = len(prices)
+    data = np.full((len(horizons), n, prices.shape[1]), np.nan)
+    for i, h in enumerate(horizons):
+        if h <= 0 or h >= n:
+            continue
+        hi = np.arange(h, n)
+        lo = hi - h if cumulative else hi - 1
+        data[i, :n - h] = np.where(counts[hi] > counts[lo], np.exp(cumsum[hi] - cumsum[lo]) - 1, np.nan)
+    return xr.DataArray(
+        data,
+        coords=[horizons, prices.index, prices.columns],
+        dims=["horizon", "date", "stock"]
+    )
+
+
+_CUMULATED = {}
+
+
+def _get_cumulated_prices(table: str, field: str):
+    """按价格面板的形状和最后一个日期缓存累计对数收益率，面板更新后自动重新累计"""
+    prices = wind.get_wind_data(table, field)
+    version = (prices.shape, prices.index[-1] if len(prices) else None)
+    cached = _CUMULATED.get((table, field))
+    if cached is None or cached[0] != version:
+        cached = _CUMULATED[(table, field)] = (version, prices, _cumulative_log_returns(prices))
+    return cached[1], cached[2]
+
+
+def get_forward_returns(horizons, cumulative: bool=True, table: str="AShareEODPrices",
+                        field: str="s_dq_adjclose") -> xr.DataArray:
+    """
+    全市场股票的多期限未来收益率，累计对数收益率按价格字段缓存，IC衰减、alpha衰减、
+    生成标签等多次调用只读取并累计一次
+
+    Parameters
+    ==========
+    horizons: List[int]
+        期限（交易日数）
+    cumulative: bool
+        参见 :func:`compute_forward_returns`
+    table, field: str
+        价格所在的万得表和字段
+
+    Returns
+    =======
+    xr.DataArray
+        期限 × 日期 × 股票
+
+    Examples
+    ========
+
+    ..  code-block::
+        python
+
+        from quant.transform import get_forward_returns
+        returns = get_forward_returns([1, 5, 20])
+        returns.sel(horizon=5).to_pandas()
+    """
+    prices, cumulated = _get_cumulated_prices(table, field)
+    return compute_forward_returns(prices, horizons, cumulative, cumulated)
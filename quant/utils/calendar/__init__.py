@@ -1,2 +1,10 @@
-from .trading_calendar import TradingCalendar, TDay
+from .trading_calendar import TradingCalendar, trading_calendar
 from .monthly_calendar import MonthlyCalendar
+from .schedule import Schedule, schedule
+
+
+def __getattr__(name):
+    # TDay在第一次使用时才读取交易日数据
+    if name == "TDay":
+        return trading_calendar.TradingDay
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -1,5 +1,4 @@
 import calendar
-from datetime import timedelta
 from dateutil.parser import parse
 from .trading_calendar import trading_calendar
 
@@ -61,10 +60,7 @@ class MonthlyCalendar:
         format_str: bool
             如果为真，把日期转换成字符串，否则返回datetime
         """
-        holidays = trading_calendar.holidays
-        day = parse(self.first_day())
-        while day in holidays or day.weekday() > 4:
-            day += timedelta(days=1)
+        day = trading_calendar.next(self.first_day(), include=True).to_pydatetime()
         if format_str:
             return day.strftime("%Y-%m-%d")
         else:
@@ -79,10 +75,7 @@ class MonthlyCalendar:
         format_str: bool
             如果为真，把日期转换成字符串，否则返回datetime
         """
-        holidays = trading_calendar.holidays
-        day = parse(self.last_day())
-        while day in holidays or day.weekday() > 4:
-            day -= timedelta(days=1)
+        day = trading_calendar.prev(self.last_day(), include=True).to_pydatetime()
         if format_str:
             return day.strftime("%Y-%m-%d")
         else:
@@ -105,7 +98,7 @@ class MonthlyCalendar:
         while month < 1:
             month += 12
             year -= 1
-        return Calendar(year, month)
+        return MonthlyCalendar(year, month)
 
     @staticmethod
     def iterate(start_date: str, end_date: str, months: int=1):
@@ -123,13 +116,13 @@ class MonthlyCalendar:
 
         Yields
         ------
-        Calendar
+        MonthlyCalendar
         """
         start_date = parse(start_date)
         end_date = parse(end_date)
         year, month = start_date.year, start_date.month
         while (year, month) <= (end_date.year, end_date.month):
-            yield Calendar(year, month)
+            yield MonthlyCalendar(year, month)
             month += months
             while month > 12:
                 month -= 12
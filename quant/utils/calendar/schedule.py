@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from .trading_calendar import trading_calendar, _to_days, _to_index
+
+
+__all__ = ["Schedule", "schedule"]
+
+PERIODS = ("W", "M", "Q", "Y")
+"""支持的周期：周、月、季、年"""
+
+INDEX_REBALANCE_MONTHS = (6, 12)
+"""沪深300、中证500等指数定期调整样本的月份"""
+
+
+class Schedule:
+    """
+    调仓日程。所有周期的首末交易日在第一次使用时一次算好，之后的查询都是数组操作。
+
+    日程字符串的格式：
+
+    ========= =====================================================
+    ``5``     每5个交易日
+    ``M``     每月第一个交易日，周期可以是W, M, Q, Y
+    ``M:-1``  每月最后一个交易日
+    ``W:2``   每周第二个交易日，交易日不足的周跳过
+    ``index`` 指数样本调整生效日：6月和12月第二个星期五的下一个交易日
+    ========= =====================================================
+
+    Examples
+    ========
+
+    ..  code-block::
+        python
+
+        from quant.utils.calendar import schedule
+        schedule.get("M:-1", "2018-01-01", "2018-12-31")
+        schedule.last_trading_days("Q")
+    """
+    def __init__(self, calendar=None):
+        """
+        Parameters
+        ==========
+        calendar: TradingCalendar
+            交易日历，默认为全局的交易日历
+        """
+        self.calendar = calendar or trading_calendar
+        self.__boundaries = {}
+
+    @staticmethod
+    def _period_ids(days: np.ndarray, period: str) -> np.ndarray:
+        if period == "W":
+            # 1970-01-01是星期四，加3使每周从星期一开始
+            return (days.astype("int64") + 3) // 7
+        months = days.astype("datetime64[M]").astype("int64")
+        if period == "M":
+            return months
+        if period == "Q":
+            return months // 3
+        if period == "Y":
+            return months // 12
+        raise ValueError("Unknown period {}, should be one of {}".format(period, PERIODS))
+
+    def boundaries(self, period: str):
+        """
+        每个周期第一个和最后一个交易日在交易日数组中的位置
+
+        Returns
+        =======
+        (starts, ends): np.ndarray
+        """
+        if period not in self.__boundaries:
+            ids = self._period_ids(self.calendar.trading_days, period)
+            change = np.flatnonzero(np.diff(ids)) + 1
+            starts = np.r_[0, change]
+            ends = np.r_[change - 1, len(ids) - 1]
+            self.__boundaries[period] = (starts, ends)
+        return self.__boundaries[period]
+
+    def _select(self, positions, start=None, end=None) -> pd.DatetimeIndex:
+        days = self.calendar.trading_days[positions]
+        lo = 0 if start is None else np.searchsorted(days, _to_days(start)[0], side="left")
+        hi = len(days) if end is None else np.searchsorted(days, _to_days(end)[0], side="right")
+        return _to_index(days[lo:hi])
+
+    def nth_trading_days(self, period: str, n: int, start=None, end=None) -> pd.DatetimeIndex:
+        """
+        每个周期的第n个交易日
+
+        Parameters
+        ==========
+        period: {'W', 'M', 'Q', 'Y'}
+            周期
+        n: int
+            1为第一个交易日，-1为最后一个交易日，交易日不足n个的周期跳过
+        start, end: 日期
+            返回的日期范围（包含两端）
+        """
+        if n == 0:
+            raise ValueError("n must not be 0")
+        starts, ends = self.boundaries(period)
+        positions = starts + n - 1 if n > 0 else ends + n + 1
+        positions = positions[(positions >= starts) & (positions <= ends)]
+        return self._select(positions, start, end)
+
+    def first_trading_days(self, period: str, start=None, end=None) -> pd.DatetimeIndex:
+        """每个周期的第一个交易日"""
+        return self.nth_trading_days(period, 1, start, end)
+
+    def last_trading_days(self, period: str, start=None, end=None) -> pd.DatetimeIndex:
+        """每个周期的最后一个交易日"""
+        return self.nth_trading_days(period, -1, start, end)
+
+    def index_rebalance_days(self, start=None, end=None) -> pd.DatetimeIndex:
+        """指数定期调整样本的生效日：6月和12月第二个星期五的下一个交易日"""
+        days = self.calendar.trading_days
+        years = np.arange(days[0].astype("datetime64[Y]").astype(int), days[-1].astype("datetime64[Y]").astype(int) + 1)
+        months = (years[:, None] * 12 + np.array(INDEX_REBALANCE_MONTHS) - 1).ravel().astype("datetime64[M]")
+        first = months.astype("datetime64[D]")
+        # 第一个星期五，1970-01-01是星期四
+        first_friday = first + (1 - first.astype("int64")) % 7
+        second_friday = first_friday + 7
+        second_friday = second_friday[second_friday >= days[0]]
+        positions = np.searchsorted(days, second_friday, side="right")
+        positions = positions[positions < len(days)]
+        return self._select(positions, start, end)
+
+    def get(self, freq, start=None, end=None) -> pd.DatetimeIndex:
+        """
+        按日程字符串生成调仓日，格式见 :class:`Schedule`
+
+        Parameters
+        ==========
+        freq: int or str
+            日程
+        start, end: 日期
+            调仓日的范围（包含两端）
+        """
+        if isinstance(freq, str) and freq.isdigit():
+            freq = int(freq)
+        if isinstance(freq, (int, np.integer)):
+            if freq <= 0:
+                raise ValueError("freq must be positive")
+            return self.calendar.range(start, end)[::freq]
+        if freq == "index":
+            return self.index_rebalance_days(start, end)
+        period, _, n = freq.partition(":")
+        return self.nth_trading_days(period.upper(), int(n) if n else 1, start, end)
+
+    def following(self, freq, date) -> pd.Timestamp:
+        """
+        date之后的下一个调仓日。整数日程为date之后第freq个交易日；
+        没有更多的调仓日时返回下一个交易日
+        """
+        if isinstance(freq, str) and freq.isdigit():
+            freq = int(freq)
+        if isinstance(freq, (int, np.integer)):
+            return self.calendar.shift(date, freq)
+        following = self.get(freq, self.calendar.next(date))
+        if len(following):
+            return following[0]
+        return self.calendar.next(date)
+
+
+schedule = Schedule()
@@ -1,4 +1,4 @@
-import sys
+import numpy as np
 import pandas as pd
 from pandas.tseries.offsets import CustomBusinessDay, BDay
 from ...common import LOCALIZER, Logger
@@ -6,42 +6,184 @@ from ...common import LOCALIZER, Logger
 
 __all__ = ["TradingCalendar"]
 
+FALLBACK_RANGE = ("2000-01-01", "2030-12-31")
+"""无法读取交易日数据时，用该区间内的工作日代替"""
+
+
+def _to_days(dates) -> np.ndarray:
+    """把日期（标量或序列）转换为datetime64[D]数组"""
+    return np.asarray(pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(dates))).values.astype("datetime64[D]"))
+
+
+def _to_index(days: np.ndarray) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex(days.astype("datetime64[ns]"))
+
 
 class TradingCalendar:
-    """中国金融市场交易日历"""
-    def __init__(self):
+    """
+    中国金融市场交易日历
+
+    交易日以排好序的numpy数组保存，偏移、区间、判断等操作都通过二分查找完成，
+    交易日数据在第一次使用时才读取。
+
+    Examples
+    ========
+
+    ..  code-block::
+        python
+
+        from quant.utils.calendar import trading_calendar
+        trading_calendar.shift("2018-02-14", 1)                 # Timestamp('2018-02-22')
+        trading_calendar.range("2018-02-01", "2018-02-28")      # DatetimeIndex
+        trading_calendar.is_trading_day(["2018-02-14", "2018-02-15"])
+    """
+    def __init__(self, trading_days=None):
+        """
+        Parameters
+        ==========
+        trading_days: List, optional
+            交易日列表，默认从万得数据库（本地缓存）读取
+        """
+        self.__trading_days = None if trading_days is None else np.unique(_to_days(trading_days))
         self.__holidays = None
+        self.__offset = None
 
     @staticmethod
-    @LOCALIZER.wrap("holiday.h5", const_key="holiday")
-    def get_holidays():
+    @LOCALIZER.wrap("holiday.h5", const_key="trading_days")
+    def get_trading_days():
         from ...data import wind
-        calendar = wind.get_wind_table("AShareCalendar", ["trade_days"])
-        trading_days = set(pd.to_datetime(calendar.trade_days))
-        all_days = pd.date_range(start=min(trading_days), end=max(trading_days))
-        # 全部日期减去交易日再减双休日即得到节假日
-        holidays = sorted(filter(lambda day: day.weekday() < 5, set(all_days) - trading_days))
-        return pd.Series(holidays)
+        calendar = wind.get_table("AShareCalendar", ["trade_days"])
+        return pd.Series(sorted(set(pd.to_datetime(calendar.trade_days))))
+
+    @property
+    def trading_days(self) -> np.ndarray:
+        """全部交易日，升序的datetime64[D]数组"""
+        if self.__trading_days is None:
+            try:
+                days = _to_days(self.get_trading_days())
+            except Exception as e:
+                Logger.warn("Can't load trading days, use weekdays instead. {}".format(e))
+                days = _to_days(pd.bdate_range(*FALLBACK_RANGE))
+            self.__trading_days = np.unique(days)
+        return self.__trading_days
 
     @property
     def holidays(self):
         """
-        中国A股市场休市日期
+        中国A股市场休市日期（不含双休日）
 
-        type: List[str]
+        type: List[pd.Timestamp]
         """
-        if not self.__holidays:
-            self.__holidays = list(self.get_holidays())
+        if self.__holidays is None:
+            days = self.trading_days
+            weekdays = np.arange(days[0], days[-1] + 1, dtype="datetime64[D]")
+            weekdays = weekdays[np.is_busday(weekdays)]
+            self.__holidays = list(_to_index(np.setdiff1d(weekdays, days)))
         return self.__holidays
 
+    def _wrap(self, dates, days, valid=None):
+        """标量输入返回pd.Timestamp，序列输入返回pd.DatetimeIndex，越界的位置为NaT"""
+        result = _to_index(days)
+        if valid is not None and not valid.all():
+            result = result.where(valid)
+        if np.ndim(dates) == 0 and not isinstance(dates, pd.Index):
+            return result[0]
+        return result
+
+    def _take(self, dates, positions):
+        days = self.trading_days
+        valid = (positions >= 0) & (positions < len(days))
+        return self._wrap(dates, days[np.clip(positions, 0, len(days) - 1)], valid)
+
+    def is_trading_day(self, dates):
+        """
+        判断是否为交易日
+
+        Returns
+        =======
+        bool或np.ndarray
+        """
+        days = self.trading_days
+        target = _to_days(dates)
+        positions = np.searchsorted(days, target)
+        result = (positions < len(days)) & (days[np.minimum(positions, len(days) - 1)] == target)
+        if np.ndim(dates) == 0 and not isinstance(dates, pd.Index):
+            return bool(result[0])
+        return result
+
+    def next(self, dates, include=False):
+        """
+        下一个交易日
+
+        Parameters
+        ==========
+        include: bool
+            如果为真，当天是交易日时返回当天
+        """
+        positions = np.searchsorted(self.trading_days, _to_days(dates), side="left" if include else "right")
+        return self._take(dates, positions)
+
+    def prev(self, dates, include=False):
+        """
+        上一个交易日
+
+        Parameters
+        ==========
+        include: bool
+            如果为真，当天是交易日时返回当天
+        """
+        positions = np.searchsorted(self.trading_days, _to_days(dates), side="right" if include else "left") - 1
+        return self._take(dates, positions)
+
+    def shift(self, dates, n: int=1):
+        """
+        向后（n为负数时向前）移动n个交易日，与 ``dates + n * TDay`` 相同：
+        非交易日先滚动到下一个（n < 0时为上一个）交易日，这一步计为1
+
+        Parameters
+        ==========
+        dates: 日期或日期序列
+        n: int
+            移动的交易日数
+        """
+        days = self.trading_days
+        target = _to_days(dates)
+        if n > 0:
+            positions = np.searchsorted(days, target, side="right") + n - 1
+        elif n < 0:
+            positions = np.searchsorted(days, target, side="left") + n
+        else:
+            positions = np.searchsorted(days, target, side="left")
+        return self._take(dates, positions)
+
+    def range(self, start=None, end=None) -> pd.DatetimeIndex:
+        """
+        start与end之间（包含两端）的所有交易日，与 ``pd.date_range(start, end, freq=TDay)`` 相同
+
+        Parameters
+        ==========
+        start, end: 日期
+            为None时不限制
+        """
+        days = self.trading_days
+        lo = 0 if start is None else np.searchsorted(days, _to_days(start)[0], side="left")
+        hi = len(days) if end is None else np.searchsorted(days, _to_days(end)[0], side="right")
+        return _to_index(days[lo:hi])
+
     @property
     def TradingDay(self):
-        """根据获取的节假日信息生成pd.tseries.offsets.CustomBusinessDay对象"""
-        try:
-            return CustomBusinessDay(holidays=self.holidays)
-        except:
-            return BDay()
+        """根据节假日信息生成的pd.tseries.offsets.CustomBusinessDay对象，用于兼容pandas的日期偏移"""
+        if self.__offset is None:
+            holidays = self.holidays
+            self.__offset = CustomBusinessDay(holidays=holidays) if holidays else BDay()
+        return self.__offset
+
 
 trading_calendar = TradingCalendar()
-TDay = trading_calendar.TradingDay
-"""交易日， pd.tseries.offset.CustomBusinessDay"""
+
+
+def __getattr__(name):
+    # TDay在第一次使用时才读取交易日数据
+    if name == "TDay":
+        return trading_calendar.TradingDay
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -19,6 +19,7 @@ setup_args = dict(
     version=version,
     packages=find_packages(exclude=["*.test", "*.test.*", "test.*", "test", "script", "private", "tests"]),
     install_requires=resolve_requirements(),
+    python_requires='>=3.7',
     include_package_data=True,
     scripts=["scripts/quantlib"],
     url='http://quantlib.readthedocs.io/',
@@ -30,7 +31,7 @@ setup_args = dict(
     classifiers=[
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
+        'Programming Language :: Python :: 3.7',
 
         'Operating System :: OS Independent',
         'Operating System :: POSIX',
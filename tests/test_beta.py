@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+import pandas as pd
+from quant.common.math_helpers import exponential_decay_weight
+from quant.barra.factors.beta import rolling_beta
+
+
+def loop_beta(R, stock_rtns, T, halflife):
+    """The original day-by-day implementation of BetaDescriptor"""
+    weights = exponential_decay_weight(halflife, T, reverse=True)
+    df = pd.concat([R.rename("R"), stock_rtns], axis=1)
+    result = []
+    for i in range(T, len(df)):
+        sub_df = df.iloc[i-T:i].dropna(axis=1, thresh=T//2).dropna(subset=["R"])
+        X, Y = sub_df.iloc[:, 0], sub_df.iloc[:, 1:]
+        X, Y = (X - X.mean()).values, (Y - Y.mean()).values
+        XY = np.nansum(Y.T * X * weights, 1) / (~np.isnan(Y.T) @ weights)
+        XX = (X ** 2 * weights).sum()
+        result.append(pd.Series(XY / XX, index=sub_df.columns[1:], name=df.index[i]))
+    return pd.concat(result, axis=1).T
+
+
+class BetaTestCase(unittest.TestCase):
+    def test_rolling_beta(self):
+        rng = np.random.RandomState(0)
+        index = pd.date_range("2010-01-01", periods=150)
+        R = pd.Series(rng.randn(150) * 0.01, index=index)
+        stock_rtns = pd.DataFrame(R.values[:, None] * rng.rand(6) * 2 + rng.randn(150, 6) * 0.01, index=index)
+        stock_rtns[rng.rand(150, 6) < 0.2] = np.nan
+        stock_rtns.iloc[:80, 5] = np.nan
+        T, halflife = 40, 10
+        expected = loop_beta(R, stock_rtns, T, halflife).reindex(columns=stock_rtns.columns)
+        beta, variance = rolling_beta(stock_rtns, R, T, halflife, residual_variance=True)
+        pd.testing.assert_frame_equal(beta, expected, check_freq=False, check_names=False)
+
+        # residual variance of one window computed directly
+        i, stock = 100, 2
+        weights = exponential_decay_weight(halflife, T, reverse=True)
+        x, y = R.iloc[i-T:i].values, stock_rtns.iloc[i-T:i, stock].values
+        valid = ~np.isnan(y)
+        resid = (y - np.nanmean(y)) - beta.iloc[i - T, stock] * (x - x.mean())
+        expected_variance = (resid[valid] ** 2 * weights[valid]).sum() / weights[valid].sum()
+        self.assertAlmostEqual(variance.iloc[i - T, stock], expected_variance)
+
+    def test_hsigma_residuals(self):
+        from quant.barra.factors.residual_volatility import HSigma
+        rng = np.random.RandomState(1)
+        index = pd.date_range("2010-01-01", periods=20)
+        rtns = pd.DataFrame(rng.randn(20, 3), index=index, columns=list("ABC"))
+        beta = pd.DataFrame(rng.randn(15, 2), index=index[3:18], columns=list("AB"))
+        R = pd.Series(rng.randn(18), index=index[2:])
+        resid = HSigma.residuals(rtns, beta, R)
+        self.assertEqual(list(resid.index), list(index[3:18]))
+        for idx in resid.index:
+            expected = rtns.loc[idx] - beta.loc[idx] * R.loc[idx]
+            pd.testing.assert_series_equal(resid.loc[idx], expected, check_names=False)
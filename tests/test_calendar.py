@@ -1,6 +1,9 @@
 from datetime import datetime
 import unittest
-from quant.utils.calendar import MonthlyCalendar
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import CustomBusinessDay
+from quant.utils.calendar import MonthlyCalendar, TradingCalendar, Schedule
 
 
 class MonthlyCalendarTestCase(unittest.TestCase):
@@ -21,3 +24,75 @@ class MonthlyCalendarTestCase(unittest.TestCase):
         self.assertEqual(MonthlyCalendar(2017, 12).last_trading_day(), "2017-12-29")
         self.assertEqual(MonthlyCalendar(2018, 4).last_trading_day(), "2018-04-27")
 
+
+
+class TradingCalendarTestCase(unittest.TestCase):
+    def setUp(self):
+        self.holidays = pd.to_datetime(["2018-02-15", "2018-02-16", "2018-02-19", "2018-02-20", "2018-02-21", "2018-04-05"])
+        days = pd.bdate_range("2018-01-01", "2018-12-31")
+        self.calendar = TradingCalendar(days[~days.isin(self.holidays)])
+        self.offset = CustomBusinessDay(holidays=self.holidays)
+
+    def test_shift(self):
+        dates = pd.date_range("2018-02-01", "2018-04-30")
+        for n in (-3, -1, 0, 1, 2, 5):
+            expected = pd.DatetimeIndex([date + n * self.offset for date in dates])
+            np.testing.assert_array_equal(self.calendar.shift(dates, n).values, expected.values.astype("datetime64[ns]"))
+        self.assertEqual(self.calendar.shift("2018-02-14", 1), pd.Timestamp("2018-02-22"))
+        self.assertTrue(pd.isnull(self.calendar.shift("2018-12-31", 1)))
+
+    def test_range(self):
+        expected = pd.date_range("2018-02-10", "2018-04-10", freq=self.offset)
+        np.testing.assert_array_equal(
+            self.calendar.range("2018-02-10", "2018-04-10").values, expected.values.astype("datetime64[ns]")
+        )
+        self.assertEqual(len(self.calendar.range("2018-02-15", "2018-02-21")), 0)
+
+    def test_is_trading_day(self):
+        self.assertFalse(self.calendar.is_trading_day("2018-02-15"))
+        self.assertTrue(self.calendar.is_trading_day("2018-02-22"))
+        np.testing.assert_array_equal(
+            self.calendar.is_trading_day(["2018-02-14", "2018-02-17", "2018-02-22"]), [True, False, True]
+        )
+
+    def test_next_prev(self):
+        self.assertEqual(self.calendar.next("2018-02-14"), pd.Timestamp("2018-02-22"))
+        self.assertEqual(self.calendar.next("2018-02-14", include=True), pd.Timestamp("2018-02-14"))
+        self.assertEqual(self.calendar.prev("2018-02-22"), pd.Timestamp("2018-02-14"))
+        self.assertEqual(self.calendar.prev("2018-02-18", include=True), pd.Timestamp("2018-02-14"))
+
+    def test_holidays(self):
+        self.assertEqual(list(self.calendar.holidays), list(self.holidays))
+        self.assertEqual(pd.Timestamp("2018-02-14") + self.calendar.TradingDay, pd.Timestamp("2018-02-22"))
+
+
+class ScheduleTestCase(unittest.TestCase):
+    def setUp(self):
+        holidays = pd.to_datetime(["2018-01-01", "2018-04-30", "2018-06-18", "2018-10-01", "2018-10-02"])
+        days = pd.bdate_range("2017-12-01", "2019-01-31")
+        self.days = days[~days.isin(holidays)]
+        self.schedule = Schedule(TradingCalendar(self.days))
+
+    def test_periods(self):
+        days = pd.Series(self.days, index=self.days)
+        for period, key in (("W", days.dt.to_period("W")), ("M", days.dt.to_period("M")),
+                            ("Q", days.dt.to_period("Q")), ("Y", days.dt.year)):
+            groups = days.groupby(key.values)
+            np.testing.assert_array_equal(self.schedule.first_trading_days(period).values, groups.first().values)
+            np.testing.assert_array_equal(self.schedule.last_trading_days(period).values, groups.last().values)
+            np.testing.assert_array_equal(self.schedule.nth_trading_days(period, 2).values, groups.nth(1).values)
+        self.assertEqual(self.schedule.first_trading_days("M", "2018-01-01", "2018-12-31")[0], pd.Timestamp("2018-01-02"))
+        self.assertEqual(self.schedule.last_trading_days("M", "2018-04-01", "2018-04-30")[0], pd.Timestamp("2018-04-27"))
+
+    def test_get(self):
+        np.testing.assert_array_equal(
+            self.schedule.get("M:-1", "2018-01-01", "2018-12-31").values,
+            self.schedule.last_trading_days("M", "2018-01-01", "2018-12-31").values
+        )
+        self.assertEqual(len(self.schedule.get(5, "2018-01-01", "2018-01-31")), 5)
+        self.assertEqual(
+            list(self.schedule.get("index")),
+            [pd.Timestamp("2017-12-11"), pd.Timestamp("2018-06-11"), pd.Timestamp("2018-12-17")]
+        )
+        self.assertEqual(self.schedule.following("M", "2018-04-15"), pd.Timestamp("2018-05-01"))
+        self.assertEqual(self.schedule.following(3, "2018-04-26"), pd.Timestamp("2018-05-02"))
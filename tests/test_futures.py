@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from quant.data.futures import FuturesData, map_main_contracts, adjust_rolls
+
+
+class FakeWind:
+    def __init__(self, prices, mapping):
+        self.prices = prices
+        self.mapping = mapping
+
+    def get_data(self, table, field):
+        return self.prices
+
+    def get_table(self, table, columns):
+        return self.mapping[columns]
+
+
+class FuturesTestCase(unittest.TestCase):
+    def setUp(self):
+        dates = pd.date_range("2018-01-01", periods=6, freq="B")
+        self.prices = pd.DataFrame({
+            "A1801": [10.0, 11.0, 12.0, np.nan, np.nan, np.nan],
+            "A1802": [20.0, 22.0, 24.0, 25.0, 26.0, 30.0],
+            "B1801": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+        }, index=dates)
+        self.mapping = pd.DataFrame({
+            "s_info_windcode": ["A.X", "A.X", "B.X"],
+            "fs_mapping_windcode": ["A1801", "A1802", "B1801"],
+            "startdate": [dates[0], dates[3], dates[0]],
+            "enddate": [dates[2], pd.NaT, pd.NaT],
+        })
+
+    def test_map_main_contracts(self):
+        main = map_main_contracts(self.prices.index, self.prices.columns, self.mapping)
+        np.testing.assert_array_equal(main["A.X"].values, [0, 0, 0, 1, 1, 1])
+        np.testing.assert_array_equal(main["B.X"].values, [2] * 6)
+
+    def test_adjust_rolls(self):
+        main = map_main_contracts(self.prices.index, self.prices.columns, self.mapping).values
+        adjusted, factor = adjust_rolls(self.prices.values, main, "ratio")
+        np.testing.assert_array_almost_equal(adjusted[:, 0], [10, 11, 12, 12.5, 13, 15])
+        np.testing.assert_array_almost_equal(adjusted[:, 1], self.prices.B1801.values)
+        adjusted, factor = adjust_rolls(self.prices.values, main, "diff")
+        np.testing.assert_array_almost_equal(adjusted[:, 0], [10, 11, 12, 13, 14, 18])
+        adjusted, factor = adjust_rolls(self.prices.values, main, "none")
+        np.testing.assert_array_almost_equal(adjusted[:, 0], [10, 11, 12, 25, 26, 30])
+
+    def test_incremental(self):
+        with tempfile.TemporaryDirectory() as path:
+            futures = FuturesData(FakeWind(self.prices.iloc[:3], self.mapping))
+            futures.path = path
+            futures.get_continuous()
+            self.assertTrue(os.path.exists(os.path.join(path, "commodity", "s_dq_close", "ratio.lock")))
+            futures.wind.prices = self.prices
+            result = futures.get_continuous()
+            futures.path = path + "/full"
+            expected = futures.get_continuous()
+            pd.testing.assert_frame_equal(result, expected, check_freq=False)
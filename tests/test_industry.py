@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from quant.barra.factors import industry
+from quant.barra.factors.industry import IndustryExposures
+
+
+class IndustryExposuresTestCase(unittest.TestCase):
+    def setUp(self):
+        self.codes = pd.DataFrame(
+            [[0, 1, -1, 2], [0, 2, 1, -1], [1, 1, 0, 2]],
+            index=pd.date_range("2010-01-01", periods=3),
+            columns=["A", "B", "C", "D"],
+            dtype="int8"
+        )
+        self.exposures = IndustryExposures(self.codes, ["X", "Y", "Z"])
+        self.dense = {
+            name: (self.codes == i).astype("float64")
+            for i, name in enumerate(self.exposures.names)
+        }
+
+    def test_dummies(self):
+        date = self.codes.index[1]
+        dummies = self.exposures.dummies(date)
+        for name, data in self.dense.items():
+            np.testing.assert_array_equal(dummies[name].values, data.loc[date].values)
+        np.testing.assert_array_equal(
+            self.exposures.sparse(date).toarray(), dummies.values
+        )
+        dummies = self.exposures.dummies(date, ["D", "E"])
+        np.testing.assert_array_equal(dummies.values, np.zeros((2, 3)))
+
+    def test_group_sum(self):
+        values = pd.DataFrame(
+            np.random.rand(4, 4),
+            index=pd.date_range("2010-01-01", periods=4),
+            columns=["A", "B", "C", "D"]
+        )
+        values.iloc[0, 1] = np.nan
+        sums = self.exposures.group_sum(values)
+        for name, data in self.dense.items():
+            expected = (values * data).sum(axis=1)
+            np.testing.assert_array_almost_equal(sums[name].values[:3], expected.values[:3])
+        self.assertTrue(sums.iloc[3].isnull().all())
+
+    def test_shift(self):
+        shifted = self.exposures.shift(1)
+        self.assertTrue((shifted.codes.iloc[0] == -1).all())
+        np.testing.assert_array_equal(shifted.codes.values[1:], self.codes.values[:-1])
+        self.assertEqual(shifted.codes.values.dtype, np.int8)
+
+    def test_exposures_missing_benchmark(self):
+        position = pd.DataFrame(np.random.rand(3, 4), index=self.codes.index, columns=self.codes.columns)
+        # The second date has no index weights
+        weights = pd.DataFrame(np.random.rand(2, 4), index=self.codes.index[[0, 2]], columns=self.codes.columns)
+        with mock.patch.object(industry.wind, "get_index_weight", return_value=weights):
+            relative = self.exposures.get_exposures(position, benchmark="000905.SH")
+        absolute = self.exposures.get_exposures(position)
+        self.assertTrue(relative.iloc[1].isnull().all())
+        self.assertFalse(relative.iloc[[0, 2]].isnull().any().any())
+        bench = self.exposures.group_sum(weights).div(weights.sum(axis=1) + 1e-5, axis=0)
+        np.testing.assert_array_almost_equal(relative.iloc[0].values, (absolute.iloc[0] - bench.iloc[0]).values)
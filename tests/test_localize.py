@@ -0,0 +1,144 @@
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from quant.common.localize import MmapPanel, CodecPolicy, CODECS, benchmark_codecs
+
+
+class MmapPanelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "panel")
+        self.data = pd.DataFrame(
+            np.random.randn(10, 3),
+            index=pd.date_range("2010-01-01", periods=10, name="date"),
+            columns=pd.Index(["A", "B", "C"], name="stock")
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_read(self):
+        panel = MmapPanel(self.path)
+        self.assertFalse(panel.exists)
+        panel.write(self.data)
+        self.assertTrue(panel.exists)
+        pd.testing.assert_frame_equal(panel.read(), self.data, check_freq=False)
+        self.assertIsInstance(panel.values(), np.memmap)
+        # raw files can be read without pandas
+        np.testing.assert_array_equal(np.load(os.path.join(self.path, "values.npy")), self.data.values)
+
+    def test_append(self):
+        panel = MmapPanel(self.path)
+        panel.write(self.data.iloc[:6])
+        panel.append(self.data.iloc[6:])
+        pd.testing.assert_frame_equal(panel.read(), self.data, check_freq=False)
+        with self.assertRaises(ValueError):
+            panel.append(self.data.iloc[-1:])
+
+    def test_append_new_columns(self):
+        panel = MmapPanel(self.path)
+        panel.write(self.data.iloc[:6, :2])
+        panel.append(self.data.iloc[6:])
+        expected = self.data.copy()
+        expected.iloc[:6, 2] = np.nan
+        pd.testing.assert_frame_equal(panel.read(), expected, check_freq=False)
+
+    def test_inplace(self):
+        panel = MmapPanel(self.path)
+        panel.write(self.data)
+        values = panel.values(mode="r+")
+        values[0, 0] = 100.0
+        values.flush()
+        del values
+        self.assertEqual(panel.read().iloc[0, 0], 100.0)
+
+    def test_unsupported(self):
+        self.assertFalse(MmapPanel.supports(pd.DataFrame({"A": ["x", "y"]})))
+        self.assertFalse(MmapPanel.supports(pd.Series([1.0, 2.0])))
+        with self.assertRaises(TypeError):
+            MmapPanel(self.path).write(pd.DataFrame({"A": ["x", "y"]}))
+
+
+class CodecTestCase(unittest.TestCase):
+    def test_policy(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "codecs.json")
+            with open(path, "w") as f:
+                json.dump({"factors": "blosc", "wind/AShareEODPrices": "fast"}, f)
+            policy = CodecPolicy(path)
+            self.assertEqual(policy.get_codec("wind", "AShareEODPrices"), "fast")
+            self.assertEqual(policy.get_codec("wind.h5", "AShareIncome"), "high")
+            self.assertEqual(policy.get_codec("/some/dir/factors.h5"), "blosc")
+            self.assertEqual(policy.resolve("factors"), CODECS["blosc"])
+            policy.set("descriptors", "none")
+            self.assertEqual(policy.get_codec("descriptors"), "none")
+            with self.assertRaises(KeyError):
+                policy.set("descriptors", "unknown")
+
+    def test_benchmark(self):
+        data = pd.DataFrame(np.random.randn(50, 20))
+        result = benchmark_codecs(data, repeat=1)
+        self.assertEqual(set(result.index), set(CODECS) | {"mmap"})
+        self.assertEqual(list(result.columns), ["write(s)", "read(s)", "size(MB)", "ratio"])
+        self.assertAlmostEqual(result.loc["none", "ratio"], 1.0)
+
+
+class LocalizerAppendTestCase(unittest.TestCase):
+    def test_append(self):
+        from quant.common.decorators import Localizer
+        data = pd.DataFrame(
+            np.random.randn(10, 3),
+            index=pd.date_range("2010-01-01", periods=10, name="date"),
+            columns=["A", "B", "C"]
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            localizer = Localizer(tmp)
+            for format in ("fixed", "mmap"):
+                build = localizer.wrap("cache", const_key=format, format=format)(lambda: data.iloc[:6])
+                build()
+                self.assertEqual(build.const_key, format)
+                localizer.append("cache", format, data.iloc[6:])
+                pd.testing.assert_frame_equal(localizer.load("cache", format), data, check_freq=False)
+                self.assertEqual(localizer.last_index("cache", format), data.index[-1])
+                with self.assertRaises(ValueError):
+                    localizer.append("cache", format, data.iloc[-1:])
+            self.assertIsNone(localizer.load("cache", "missing"))
+            self.assertIsNone(localizer.last_index("cache", "missing"))
+            with localizer.lock("cache", "fixed"):
+                self.assertTrue(os.path.exists(os.path.join(tmp, "cache.locks", "fixed.lock")))
+            self.assertEqual(localizer.state_path("cache", "dastd/rolling"),
+                             os.path.join(tmp, "cache.state", "dastd/rolling.npz"))
+
+    def test_refresh(self):
+        from quant.common.decorators import Localizer
+        data = pd.DataFrame(
+            np.random.randn(10, 3),
+            index=pd.date_range("2010-01-01", periods=10, name="date"),
+            columns=["A", "B", "C"]
+        )
+        ends = [6]
+        with tempfile.TemporaryDirectory() as tmp:
+            localizer = Localizer(tmp)
+            for format in ("fixed", "mmap"):
+                ends[0] = 6
+                build = localizer.wrap("cache", keys=["table"], const_key="codes", format=format)(
+                    lambda table: data.iloc[:ends[0]])
+                self.assertEqual(build.cache_path("ST"), "ST/codes")
+                build("ST")
+                ends[0] = 10
+                # 缓存已经覆盖到until，不重新计算
+                self.assertEqual(len(localizer.refresh(build, "ST", until=data.index[5])), 6)
+                self.assertEqual(len(localizer.refresh(build, "ST")), 6)
+                refreshed = localizer.refresh(build, "ST", until=data.index[-1])
+                pd.testing.assert_frame_equal(refreshed, data, check_freq=False)
+                localizer.remove("cache", "ST/codes")
+                self.assertIsNone(localizer.load("cache", "ST/codes"))
+
+    def test_import_path(self):
+        from quant.common.localize import LOCALIZER, Localizer
+        from quant.common import decorators
+        self.assertIs(LOCALIZER, decorators.LOCALIZER)
+        self.assertIs(Localizer, decorators.Localizer)
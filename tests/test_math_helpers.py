@@ -1,7 +1,10 @@
 import unittest
+from unittest import mock
 import numpy as np
 import pandas as pd
-from quant.common.math_helpers import cal_mdd, exponential_decay_weight, Rolling
+from quant.common.math_helpers import (
+    cal_mdd, exponential_decay_weight, get_ic, get_factor_exposure, get_factor_exposures, Rolling
+)
 
 
 class MathTestCase(unittest.TestCase):
@@ -41,3 +44,92 @@ class MathTestCase(unittest.TestCase):
         pd.testing.assert_frame_equal(rolling.max(), data.rolling(10, min_periods=4).max())
         pd.testing.assert_frame_equal(rolling.min(), data.rolling(10, min_periods=4).min())
 
+    def test_get_ic(self):
+        rng = np.random.RandomState(0)
+        index = pd.date_range("2000-01-01", periods=30)
+        factor = pd.DataFrame(rng.randn(30, 20), index=index)
+        factor[factor < -1.5] = np.nan
+        factor.iloc[3] = np.nan
+        returns = {h: pd.DataFrame(rng.randn(30, 20), index=index).round(1) for h in (1, 5)}
+        returns[1][returns[1] > 1.5] = np.nan
+        for method in ("spearman", "pearson"):
+            ic = get_ic(factor, returns, method)
+            self.assertEqual(list(ic.columns), [1, 5])
+            self.assertNotIn(index[3], ic.index)
+            for h, rtn in returns.items():
+                expected = pd.Series({date: factor.loc[date].corr(rtn.loc[date], method=method) for date in index}).dropna()
+                result = get_ic(factor, rtn, method)
+                pd.testing.assert_series_equal(result, expected, check_freq=False)
+            np.testing.assert_array_almost_equal(ic[1].values, get_ic(factor, returns[1], method).values)
+
+    def test_get_factor_exposures(self):
+        rng = np.random.RandomState(0)
+        index = pd.date_range("2000-01-01", periods=10)
+        position = pd.DataFrame(rng.rand(10, 6), index=index, columns=list("ABCDEF"))
+        factors = {
+            "size": pd.DataFrame(rng.randn(8, 7), index=index[2:], columns=list("ABCDEFG")),
+            "beta": pd.DataFrame(rng.randn(10, 5), index=index, columns=list("ABCDE")),
+        }
+        factors["size"].iloc[0, 0] = np.nan
+        exposures = get_factor_exposures(position, factors)
+        for name, value in factors.items():
+            for date in index:
+                if date in value.index:
+                    expected = (position.loc[date] * value.loc[date]).sum() / (position.loc[date].sum() + 1e-5)
+                    self.assertAlmostEqual(exposures.loc[date, name], expected)
+                else:
+                    self.assertTrue(np.isnan(exposures.loc[date, name]))
+        pd.testing.assert_series_equal(get_factor_exposure(position, factors["beta"]), exposures["beta"].rename(None))
+
+    def test_get_factor_exposures_missing_benchmark(self):
+        rng = np.random.RandomState(0)
+        index = pd.date_range("2000-01-01", periods=5)
+        position = pd.DataFrame(rng.rand(5, 3), index=index, columns=list("ABC"))
+        factors = {"size": pd.DataFrame(rng.randn(5, 3), index=index, columns=list("ABC"))}
+        # 第3天没有指数权重
+        weights = pd.DataFrame(rng.rand(4, 3), index=index.delete(2), columns=list("ABC"))
+        from quant.common import math_helpers
+        with mock.patch.object(math_helpers.wind, "get_index_weight", return_value=weights):
+            absolute, bench, relative = get_factor_exposures(position, factors, benchmark="000905.SH", components=True)
+        self.assertTrue(bench.iloc[2].isnull().all())
+        self.assertTrue(relative.iloc[2].isnull().all())
+        self.assertFalse(absolute.iloc[2].isnull().any())
+        date = index[0]
+        expected = (weights.loc[date] * factors["size"].loc[date]).sum() / (weights.loc[date].sum() + 1e-5)
+        self.assertAlmostEqual(bench.loc[date, "size"], expected)
+
+    def test_weighted_rolling(self):
+        rng = np.random.RandomState(0)
+        data = pd.DataFrame(rng.randn(80, 3), index=pd.date_range("2000-01-01", periods=80), columns=["A", "B", "C"])
+        data[data < -1.5] = np.nan
+        x = pd.Series(rng.randn(80), index=data.index)
+        weights = exponential_decay_weight(5, 20, reverse=True)
+        expected_mean = np.full(data.shape, np.nan)
+        expected_std = np.full(data.shape, np.nan)
+        expected_beta = np.full(data.shape, np.nan)
+        values = data.values
+        for i in range(80):
+            for j in range(3):
+                window = values[max(i - 19, 0):i + 1, j]
+                w = weights[-len(window):]
+                valid = ~np.isnan(window)
+                if valid.sum() < 10:
+                    continue
+                mean = (window[valid] * w[valid]).sum() / w[valid].sum()
+                expected_mean[i, j] = mean
+                expected_std[i, j] = np.sqrt(((window[valid] - mean) ** 2 * w[valid]).sum() / w[valid].sum())
+                xs = x.values[max(i - 19, 0):i + 1][valid]
+                expected_beta[i, j] = np.polyfit(xs, window[valid], 1, w=np.sqrt(w[valid]))[0]
+        for rolling in (Rolling(data, 20, min_periods=10, halflife=5), Rolling(data, 20, min_periods=10, weights=weights)):
+            np.testing.assert_array_almost_equal(rolling.mean().values, expected_mean)
+            np.testing.assert_array_almost_equal(rolling.std().values, expected_std)
+            np.testing.assert_array_almost_equal(rolling.regress(x)[1].values, expected_beta)
+        rolling = Rolling(data, 20, min_periods=10)
+        pd.testing.assert_frame_equal(
+            rolling.apply_blocks(lambda y: np.nanmedian(y, axis=-1), block_size=7),
+            data.rolling(20, min_periods=10).median()
+        )
+        # apply的窗口不含当天，从第period天开始
+        applied = rolling.apply(lambda y: y.median())
+        expected = data.rolling(20, min_periods=10).median().shift(1).iloc[20:]
+        pd.testing.assert_frame_equal(applied, expected, check_freq=False)
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from quant.common.math_helpers import Rolling, exponential_decay_weight
+from quant.common.online import EWMAccumulator, RollingAccumulator, RegressionAccumulator, ShiftAccumulator
+from quant.barra.factors.beta import BetaAccumulator
+
+
+class OnlineTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.data = pd.DataFrame(rng.randn(120, 4), index=pd.date_range("2000-01-01", periods=120), columns=list("ABCD"))
+        self.data[self.data < -1.2] = np.nan
+        # D is listed later
+        self.data.iloc[:30, 3] = np.nan
+        self.x = pd.Series(rng.randn(120), index=self.data.index)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_online(self, accumulator, output, restart=60):
+        """逐行更新，中途保存并重新读取状态"""
+        path = os.path.join(self.tmp.name, "state.npz")
+        rows = {}
+        for i, (date, row) in enumerate(self.data.iterrows()):
+            if i == restart:
+                accumulator.save(path)
+                accumulator = type(accumulator).load(path)
+            if i < 30:
+                row = row.iloc[:3]
+            rows[date] = output(accumulator, date, row)
+        return pd.DataFrame(rows).T.reindex(columns=self.data.columns)
+
+    def test_ewm(self):
+        for method in ("mean", "std"):
+            result = self.run_online(EWMAccumulator(10), lambda acc, date, row: getattr(acc.update(row, date), method)())
+            expected = getattr(self.data.ewm(halflife=10), method)()
+            np.testing.assert_array_almost_equal(result.values, expected.values)
+
+    def test_rolling(self):
+        for halflife in (None, 5):
+            batch = Rolling(self.data, 20, min_periods=10, halflife=halflife)
+            for method in ("mean", "std", "sum"):
+                result = self.run_online(
+                    RollingAccumulator(20, min_periods=10, halflife=halflife),
+                    lambda acc, date, row: getattr(acc.update(row, date), method)()
+                )
+                np.testing.assert_array_almost_equal(result.values, getattr(batch, method)().values)
+
+    def test_regression(self):
+        batch = Rolling(self.data, 20, min_periods=10, halflife=5).regress(self.x)[1]
+        result = self.run_online(
+            RegressionAccumulator(20, min_periods=10, halflife=5),
+            lambda acc, date, row: acc.update(self.x[date], row, date).regress()[1]
+        )
+        np.testing.assert_array_almost_equal(result.values, batch.values)
+
+    def test_shift(self):
+        result = self.run_online(ShiftAccumulator(3), lambda acc, date, row: acc.update(row, date))
+        pd.testing.assert_frame_equal(result, self.data.shift(3), check_freq=False)
+
+    def test_beta(self):
+        T = 20
+        weights = exponential_decay_weight(5, T, reverse=True)
+        df = pd.concat([self.x.rename("R"), self.data], axis=1)
+        expected = []
+        for i in range(T, len(df)):
+            sub_df = df.iloc[i-T:i].dropna(axis=1, thresh=T//2).dropna(subset=["R"])
+            X, Y = sub_df.iloc[:, 0], sub_df.iloc[:, 1:]
+            X, Y = (X - X.mean()).values, (Y - Y.mean()).values
+            XY = np.nansum(Y.T * X * weights, 1) / (~np.isnan(Y.T) @ weights)
+            XX = (X ** 2 * weights).sum()
+            expected.append(pd.Series(XY / XX, index=sub_df.columns[1:], name=df.index[i]))
+        expected = pd.concat(expected, axis=1).T.reindex(columns=self.data.columns)
+
+        def output(acc, date, row):
+            beta = acc.beta()
+            acc.update(self.x[date], row, date)
+            return beta
+        result = self.run_online(BetaAccumulator(T, halflife=5), output).iloc[T:]
+        np.testing.assert_array_almost_equal(result.values, expected.values)
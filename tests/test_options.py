@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+import pandas as pd
+from quant.data.options import (
+    CALL, PUT, black_price, black_greeks, implied_volatility, compute_option_analytics
+)
+
+
+class OptionsTestCase(unittest.TestCase):
+    def test_implied_volatility(self):
+        rng = np.random.RandomState(0)
+        n = 1000
+        forward = rng.uniform(2, 4, n)
+        strike = forward * rng.uniform(0.7, 1.3, n)
+        t = rng.uniform(0.01, 1, n)
+        sigma = rng.uniform(0.05, 1.5, n)
+        is_call = rng.rand(n) > 0.5
+        discount = np.exp(-0.03 * t)
+        price = black_price(forward, strike, t, sigma, is_call, discount)
+        iv = implied_volatility(price, forward, strike, t, is_call, discount)
+        valid = ~np.isnan(iv)
+        self.assertGreater(valid.mean(), 0.95)
+        np.testing.assert_allclose(
+            black_price(forward, strike, t, iv, is_call, discount)[valid], price[valid], atol=1e-7
+        )
+        # 低于内在价值的价格无解
+        self.assertTrue(np.isnan(implied_volatility(0.1, 3.0, 2.0, 0.5, True, 1.0)))
+
+    def test_greeks(self):
+        forward, strike, t, sigma, discount, rate = 3.0, 3.1, 0.25, 0.2, np.exp(-0.03 * 0.25), 0.03
+        for is_call in (True, False):
+            greeks = black_greeks(forward, strike, t, sigma, is_call, discount, rate)
+            h = 1e-4
+            up = black_price((forward * discount + h) / discount, strike, t, sigma, is_call, discount)
+            down = black_price((forward * discount - h) / discount, strike, t, sigma, is_call, discount)
+            self.assertAlmostEqual(float(greeks["delta"]), float((up - down) / (2 * h)), places=5)
+            up = black_price(forward, strike, t, sigma + h, is_call, discount)
+            down = black_price(forward, strike, t, sigma - h, is_call, discount)
+            self.assertAlmostEqual(float(greeks["vega"]), float((up - down) / (2 * h)), places=5)
+
+    def test_analytics(self):
+        dates = pd.date_range("2018-01-02", periods=3)
+        strikes = [2.8, 3.0, 3.2]
+        contracts = pd.DataFrame({
+            "s_info_sccode": "510050",
+            "s_info_callput": [CALL] * 3 + [PUT] * 3,
+            "s_info_strikeprice": strikes * 2,
+            "maturity": pd.Timestamp("2018-06-27"),
+        }, index=["C1", "C2", "C3", "P1", "P2", "P3"])
+        t = ((pd.Timestamp("2018-06-27") - dates).days.values / 365)[:, None]
+        discount = np.exp(-0.03 * t)
+        forward = np.array([[3.0], [3.05], [2.95]])
+        is_call = (contracts.s_info_callput.values == CALL)[None, :]
+        sigma = 0.25
+        prices = black_price(forward, contracts.s_info_strikeprice.values[None, :], t, sigma, is_call, discount)
+        prices = pd.DataFrame(prices, index=dates, columns=contracts.index)
+        result = compute_option_analytics(prices, contracts, 0.03)
+        np.testing.assert_allclose(result["forward"].values, np.repeat(forward, 6, axis=1))
+        np.testing.assert_allclose(result["iv"].values, sigma, atol=1e-6)
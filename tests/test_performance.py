@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+import pandas as pd
+from quant.common.math_helpers import cal_mdd
+from quant.common.performance import cal_drawdowns, cal_performance
+
+
+class PerformanceTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        index = pd.bdate_range("2016-06-01", "2018-03-31")
+        self.net_values = pd.DataFrame(
+            np.cumprod(1 + rng.randn(len(index), 3) * 0.01, axis=0), index=index, columns=["a", "b", "c"]
+        )
+        self.net_values.iloc[:50, 2] = np.nan
+        dates = index[::20]
+        self.weights = {name: pd.DataFrame(rng.rand(len(dates), 5), index=dates) for name in self.net_values}
+        self.benchmark = pd.Series(np.cumprod(1 + rng.randn(len(index)) * 0.01), index=index)
+
+    def expected(self, nv, weights):
+        """与回测结果中逐个计算的方法相同"""
+        rtns = nv.pct_change()
+        return {
+            "rtn": rtns.mean() * 252,
+            "volatility": rtns.std() * 252 ** 0.5,
+            "sharpe": rtns.mean() / rtns.std() * 252 ** 0.5,
+            "mdd": (1 - nv / nv.cummax()).max(),
+            "turnover": weights.fillna(0).diff().abs().sum(axis=1).sum() / (weights.index[-1] - weights.index[0]).days * 252,
+        }
+
+    def test_drawdowns(self):
+        result = cal_drawdowns(self.net_values)
+        for name, nv in self.net_values.items():
+            self.assertAlmostEqual(result.loc[name, "mdd"], cal_mdd(nv.dropna()))
+            start, end = result.loc[name, "start"], result.loc[name, "end"]
+            self.assertAlmostEqual(1 - nv[end] / nv[start], result.loc[name, "mdd"])
+            self.assertEqual(nv[:end].max(), nv[start])
+
+    def test_performance(self):
+        result = cal_performance(self.net_values, self.weights, self.benchmark)
+        self.assertEqual(list(result.index.levels[0]), ["2016", "2017", "2018", "Total"])
+        for period in ("2017", "Total"):
+            for name, nv in self.net_values.items():
+                if period == "Total":
+                    nv_, w = nv, self.weights[name]
+                else:
+                    nv_ = nv[nv.index.year == int(period)]
+                    w = self.weights[name][self.weights[name].index.year == int(period)]
+                for key, value in self.expected(nv_, w).items():
+                    self.assertAlmostEqual(result.loc[(period, name), key], value)
+                relative = self.expected(nv_ / self.benchmark.reindex(nv_.index), w)
+                self.assertAlmostEqual(result.loc[(period, name), "relative_sharpe"], relative["sharpe"])
@@ -0,0 +1,23 @@
+import unittest
+import numpy as np
+import pandas as pd
+from quant.barra.entities.portfolio import cap_weights, weighted_returns
+
+
+class EstimationUniverseTestCase(unittest.TestCase):
+    def test_cap_weights(self):
+        rng = np.random.RandomState(0)
+        index = pd.date_range("2010-01-01", periods=20)
+        cap = pd.DataFrame(rng.rand(20, 5) * 100, index=index, columns=list("ABCDE"))
+        cap[cap < 10] = np.nan
+        cap.iloc[3] = np.nan
+        eligible = rng.rand(20, 5) > 0.3
+        weight = cap_weights(cap, eligible)
+        masked = cap.where(eligible)
+        expected = pd.DataFrame({idx: row / row.sum() for idx, row in masked.iterrows()}).T.dropna(how="all")
+        pd.testing.assert_frame_equal(weight, expected, check_freq=False)
+
+        returns = pd.DataFrame(rng.randn(20, 6) * 0.01, index=index, columns=list("ABCDEF"))
+        returns.iloc[5, :] = np.nan
+        expected = (returns * weight).dropna(how="all").sum(axis=1)
+        pd.testing.assert_series_equal(weighted_returns(returns, weight), expected, check_freq=False)
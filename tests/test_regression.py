@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+from quant.transform.regression import cross_sectional_regression
+
+
+class CrossSectionalRegressionTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        index = pd.date_range("2018-01-01", periods=7)
+        columns = ["S%d" % i for i in range(60)]
+        shape = (len(index), len(columns))
+        self.size = pd.DataFrame(rng.randn(*shape), index=index, columns=columns)
+        self.beta = pd.DataFrame(rng.randn(*shape), index=index, columns=columns)
+        self.industries = pd.DataFrame(rng.randint(-1, 4, shape), index=index, columns=columns)
+        self.weights = pd.DataFrame(rng.rand(*shape) + 0.5, index=index, columns=columns)
+        self.y = 0.3 * self.size - 0.2 * self.beta + self.industries * 0.1 + pd.DataFrame(rng.randn(*shape), index=index, columns=columns)
+        self.y.iloc[rng.rand(*shape) < 0.1] = np.nan
+        self.size.iloc[0, 0] = np.nan
+
+    def expected(self, date):
+        codes = self.industries.loc[date]
+        x = pd.concat([
+            self.size.loc[date].rename("size"),
+            self.beta.loc[date].rename("beta"),
+            pd.DataFrame({g: (codes == g).astype(float) for g in range(4)}),
+        ], axis=1)
+        data = pd.concat([x, self.y.loc[date].rename("y"), self.weights.loc[date].rename("w")], axis=1).dropna()
+        model = sm.WLS(data.y, data[x.columns], weights=data.w).fit()
+        return model.params.values, x.dropna() @ model.params.values
+
+    def test_regression(self):
+        for block_size, n_jobs in ((250, 1), (3, 1), (3, 2)):
+            result = cross_sectional_regression(
+                self.y, {"size": self.size, "beta": self.beta}, self.industries, self.weights,
+                block_size=block_size, n_jobs=n_jobs
+            )
+            self.assertEqual(list(result.coefficients.columns), ["size", "beta", 0, 1, 2, 3])
+            for date in self.y.index:
+                params, fitted = self.expected(date)
+                np.testing.assert_array_almost_equal(result.coefficients.loc[date].values, params)
+                np.testing.assert_array_almost_equal(result.fitted.loc[date, fitted.index].values, fitted.values)
+            self.assertTrue(np.isnan(result.fitted.iloc[0, 0]))
+            pd.testing.assert_frame_equal(result.residuals, self.y - result.fitted)
+
+    def test_intercept(self):
+        result = cross_sectional_regression(self.y, {"size": self.size}, intercept=True)
+        date = self.y.index[2]
+        data = pd.concat([self.size.loc[date], self.y.loc[date]], axis=1).dropna()
+        beta, alpha = np.polyfit(data.iloc[:, 0], data.iloc[:, 1], 1)
+        np.testing.assert_array_almost_equal(result.coefficients.loc[date].values, [alpha, beta])
+
+    def test_fill_by_regression(self):
+        from quant.barra.factors.base import fill_by_regression
+        filled = fill_by_regression(self.y, self.size, self.industries, self.weights, n_jobs=2)
+        for date in self.y.index:
+            codes = self.industries.loc[date]
+            # 没有行业（-1）的股票虚拟变量全为0，也参与回归和填充
+            dummies = pd.get_dummies(codes.where(codes >= 0)).astype(float)
+            x = pd.concat([self.size.loc[date].rename("size"), dummies, self.y.loc[date].rename("y")], axis=1)
+            x = x.dropna(subset=["size"])
+            self.assertTrue((dummies.loc[codes < 0] == 0).all().all())
+            data = x.dropna()
+            model = sm.WLS(data.y, data.iloc[:, :-1], weights=self.weights.loc[date, data.index]).fit()
+            expected = self.y.loc[date].fillna(x.iloc[:, :-1] @ model.params)
+            np.testing.assert_array_almost_equal(filled.loc[date].values, expected.values)
+        unclassified = (self.industries < 0) & self.y.isnull() & self.size.notnull()
+        self.assertTrue(unclassified.values.any())
+        self.assertFalse(np.isnan(filled.values[unclassified.values]).any())
+
+    def test_orthogonalize(self):
+        from sklearn.linear_model import LinearRegression
+        from quant.barra.factors.base import orthogonalize
+        residuals = orthogonalize(self.y, {"size": self.size, "beta": self.beta.iloc[:, :50]})
+        for date in self.y.index:
+            df = pd.concat([
+                self.size.loc[date], self.beta.iloc[:, :50].loc[date], self.y.loc[date].rename("target")
+            ], axis=1).dropna(subset=["target"]).fillna(0)
+            x = df.values[:, :-1]
+            expected = df.target - LinearRegression().fit(x, df.target.values).predict(x)
+            np.testing.assert_array_almost_equal(residuals.loc[date, expected.index].values, expected.values)
+
+    def test_factor_yields_block(self):
+        from quant.barra.factors.yields import _block_yields
+        cap = self.weights ** 2
+        exposures = {"size": self.size, "beta": self.beta.copy()}
+        exposures["beta"].iloc[1] = np.nan
+        names = ["Industry%d" % g for g in range(4)]
+        yields = _block_yields(self.y, exposures, self.industries, cap, names)
+        for i, date in enumerate(self.y.index):
+            styles = ["size"] if i == 1 else ["size", "beta"]
+            codes = self.industries.loc[date]
+            x = pd.concat([exposures[name].loc[date].rename(name) for name in styles] + [
+                pd.DataFrame({name: (codes == g).astype(float) for g, name in enumerate(names)})
+            ], axis=1)
+            data = pd.concat([x, self.y.loc[date].rename("y"), cap.loc[date].rename("w")], axis=1).dropna()
+            params = sm.WLS(data.y, data[x.columns], weights=data.w ** 0.5).fit().params
+            industry_cap = np.array([cap.loc[date][codes == g].sum() for g in range(4)])
+            params[names] -= (params[names] * industry_cap / industry_cap.sum()).sum()
+            np.testing.assert_array_almost_equal(yields.loc[date, params.index].values, params.values)
+            self.assertAlmostEqual((yields.loc[date, names] * industry_cap).sum(), 0)
+        self.assertTrue(np.isnan(yields.loc[self.y.index[1], "beta"]))
@@ -0,0 +1,66 @@
+import re
+import inspect
+import unittest
+from collections import OrderedDict
+from quant.barra.factors import Descriptor, Factor
+from quant.barra.scheduler import Node, build_graph, execute, get_descriptors
+
+
+class SchedulerTestCase(unittest.TestCase):
+    def test_build_graph(self):
+        graph = build_graph()
+        self.assertIn("descriptor/Beta", graph["descriptor/HSigma"].requires)
+        self.assertIn("factor/Size", graph["descriptor/NLSize"].requires)
+        requires = graph["factor/ResidualVolatility"].requires
+        for name in ("descriptor/DASTD", "descriptor/CMRA", "descriptor/HSigma", "factor/Size", "factor/Beta"):
+            self.assertIn(name, requires)
+        self.assertIn("factor/Momentum", graph["yields"].requires)
+        self.assertFalse(any(name.startswith("factor/Industry") for name in graph))
+        from quant.barra.entities.portfolio import _estimation_universe_returns, _resolve_filters
+        self.assertEqual(graph["universe"].cache[1], _estimation_universe_returns.cache_path(*_resolve_filters(None, None, None)))
+
+    def test_requires(self):
+        """描述符源码中用到的其它描述符和因子都要写在requires里"""
+        descriptors = get_descriptors()
+        names = {cls.__name__: name for name, cls in descriptors.items()}
+        names.update({name: name for name in descriptors})
+        factors = Factor.get_factors()
+        for name, cls in descriptors.items():
+            source = "".join(
+                inspect.getsource(base) for base in cls.__mro__
+                if base not in (Descriptor, object) and issubclass(base, Descriptor)
+            )
+            used = {
+                "descriptor/" + names[match]
+                for match in re.findall(r"(\w+)\(\)\.(?:get_raw_value|update_raw_value|get_zscore)\(", source)
+            }
+            used |= {"factor/" + match for match in re.findall(r"(\w+)\.get_exposures\(", source) if match in factors}
+            used.discard("descriptor/" + name)
+            self.assertLessEqual(used, set(cls.requires), name)
+        self.assertIn("descriptor/LD", build_graph()["descriptor/MLEV"].requires)
+
+    def test_execute(self):
+        graph = OrderedDict((node.name, node) for node in [
+            Node("c", ("a", "b"), None),
+            Node("a", (), None),
+            Node("b", ("a", ), None),
+            Node("d", ("e", ), None),
+            Node("e", (), None),
+            Node("f", ("d", ), None),
+        ])
+        order = []
+
+        def run(name):
+            order.append(name)
+            if name == "e":
+                raise RuntimeError
+            return 1.0
+
+        report = execute(graph, run=run, up_to_date=lambda node: node.name == "b")
+        self.assertEqual(order, ["a", "e", "c"])
+        self.assertEqual(report.status.to_dict(), {
+            "a": "built", "b": "up-to-date", "c": "built", "d": "blocked", "e": "failed", "f": "blocked"
+        })
+        graph["a"] = Node("a", ("c", ), None)
+        with self.assertRaises(ValueError):
+            execute(graph, run=run)
@@ -0,0 +1,40 @@
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from quant.transform import stocks
+from quant.transform.stocks import get_rtn, compute_forward_returns, get_forward_returns
+
+
+class ForwardReturnsTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        prices = np.exp(np.cumsum(rng.randn(40, 5) * 0.02, axis=0))
+        prices[rng.rand(40, 5) < 0.15] = np.nan
+        self.prices = pd.DataFrame(prices, index=pd.date_range("2018-01-01", periods=40), columns=list("ABCDE"))
+
+    def test_cumulative(self):
+        horizons = [1, 3, 10]
+        result = compute_forward_returns(self.prices, horizons)
+        self.assertEqual(result.dims, ("horizon", "date", "stock"))
+        for h in horizons:
+            expected = self.prices.apply(get_rtn, rtn_len=h, shift=True)
+            pd.testing.assert_frame_equal(result.sel(horizon=h).to_pandas(), expected,
+                                          check_names=False, check_freq=False)
+
+    def test_single_period(self):
+        result = compute_forward_returns(self.prices, [1, 5], cumulative=False)
+        daily = np.exp(np.log(self.prices).diff()) - 1
+        for h in (1, 5):
+            pd.testing.assert_frame_equal(result.sel(horizon=h).to_pandas(), daily.shift(-h),
+                                          check_names=False, check_freq=False)
+
+    def test_cache_follows_updates(self):
+        panels = [self.prices.iloc[:30], self.prices]
+        with mock.patch.object(stocks.wind, "get_wind_data", side_effect=lambda table, field: panels[0]):
+            first = get_forward_returns([1, 3], table="test", field="price")
+            self.assertEqual(first.shape[1], 30)
+            panels.pop(0)
+            second = get_forward_returns([1, 3], table="test", field="price")
+        expected = compute_forward_returns(self.prices, [1, 3])
+        np.testing.assert_array_equal(second.values, expected.values)
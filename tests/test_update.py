@@ -0,0 +1,148 @@
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from quant.common import LOCALIZER
+from quant.data import wind
+from quant.barra.entities import portfolio
+from quant.barra.entities.portfolio import get_estimation_universe, update_estimation_universe
+from quant.barra.factors import Factor, Descriptor, get_factor_yields, update_factor_yields
+from quant.barra.factors import industry, yields
+from quant.barra.factors.industry import IndustryExposures
+from quant.barra.factors.size import Size
+
+
+class IncrementalUpdateTestCase(unittest.TestCase):
+    """先用前面的日期建立缓存，再分两次更新到最后一天，结果应与用全部日期重新生成的缓存相同"""
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.dates = pd.bdate_range("2005-01-03", periods=60)
+        stocks = ["{:06d}.SZ".format(i) for i in range(12)]
+        cap = pd.DataFrame(np.exp(rng.randn(60, 12) + 10), index=self.dates, columns=stocks)
+        # 最后一只股票上市较晚
+        cap.iloc[:15, -1] = np.nan
+        prices = pd.DataFrame(np.exp(np.cumsum(rng.randn(60, 12) * 0.02, axis=0)), index=self.dates, columns=stocks)
+        prices[cap.isnull()] = np.nan
+        self.data = {
+            ("AShareEODDerivativeIndicator", "s_val_mv"): cap,
+            ("AShareEODPrices", "s_dq_adjclose"): prices,
+            ("AShareEODPrices", "s_dq_pctchange"): prices.pct_change(fill_method=None) * 100,
+        }
+        codes = rng.randint(0, 3, size=(60, 12))
+        codes[:, 0] = -1
+        self.codes = pd.DataFrame(codes, index=self.dates, columns=stocks, dtype="int8")
+        self.names = ["X", "Y", "Z"]
+        basics = pd.DataFrame({"s_info_listdate": ["20000101"] * 12}, index=stocks)
+        self.end = self.dates[-1]
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rebuild_tmp = tempfile.TemporaryDirectory()
+        self.exposures = IndustryExposures(self.codes, self.names)
+        self.patches = [
+            mock.patch.object(LOCALIZER, "path", self.tmp.name),
+            mock.patch.object(wind, "get_wind_data", side_effect=self.get_wind_data),
+            mock.patch.object(wind, "get_stock_basics", return_value=basics),
+            mock.patch.object(wind, "refresh_stock_industries",
+                              side_effect=lambda table, level=1, until=None: self.codes.loc[:self.end]),
+            mock.patch.object(industry, "_build_industry_exposures",
+                              side_effect=lambda until=None: IndustryExposures(self.codes.loc[:self.end], self.names)),
+            mock.patch.object(industry, "INDUSTRY_EXPOSURES", self.exposures),
+            mock.patch.object(yields, "INDUSTRY_EXPOSURES", self.exposures),
+            mock.patch.object(Factor, "get_factors", return_value={"Size": Size}),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.reset()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.reset()
+        self.tmp.cleanup()
+        self.rebuild_tmp.cleanup()
+
+    def get_wind_data(self, table, field, **kwargs):
+        return self.data[(table, field)].loc[:self.end].copy()
+
+    def reset(self):
+        portfolio._get_estimation_universe.cache_clear()
+        Size._Factor__data = None
+
+    def run_updates(self, build, update):
+        """在前40天上建立缓存，更新到第50天，再更新到最后一天；返回更新的结果和重新生成的结果"""
+        self.end = self.dates[39]
+        self.exposures.codes = self.codes.loc[:self.end]
+        build()
+        self.reset()
+        for end in (self.dates[49], self.dates[-1]):
+            self.end = end
+            updated = update()
+            self.reset()
+        LOCALIZER.path = self.rebuild_tmp.name
+        self.exposures.codes = self.codes
+        rebuilt = build()
+        self.reset()
+        return updated, rebuilt
+
+    def test_estimation_universe(self):
+        updated, rebuilt = self.run_updates(get_estimation_universe, update_estimation_universe)
+        pd.testing.assert_frame_equal(updated.weight, rebuilt.weight, check_freq=False)
+        pd.testing.assert_series_equal(updated.get_returns(), rebuilt.get_returns(), check_freq=False)
+        self.assertEqual(updated.weight.index[-1], self.dates[-1])
+
+    def test_descriptors(self):
+        def descriptors():
+            dastd = Descriptor.DASTD()
+            dastd.T, dastd.halflife = 20, 5
+            return Descriptor.LnCap(), dastd
+
+        def build():
+            return [d.get_zscore() for d in descriptors()]
+
+        def update():
+            update_estimation_universe()
+            return [d.update_zscore() for d in descriptors()]
+
+        updated, rebuilt = self.run_updates(build, update)
+        for u, r in zip(updated, rebuilt):
+            pd.testing.assert_frame_equal(u, r, check_freq=False)
+            self.assertEqual(u.index[-1], self.dates[-1])
+
+    def test_recompute_raw_value(self):
+        updated, rebuilt = self.run_updates(
+            lambda: Descriptor.LnCap().get_raw_value(),
+            lambda: Descriptor.LnCap()._recompute_raw_value()
+        )
+        pd.testing.assert_frame_equal(updated, rebuilt, check_freq=False)
+        # 缓存已经到最后一天时不再读取市值重新计算
+        wind.get_wind_data.reset_mock()
+        pd.testing.assert_frame_equal(Descriptor.LnCap()._recompute_raw_value(), rebuilt, check_freq=False)
+        tables = [call.args[0] for call in wind.get_wind_data.call_args_list]
+        self.assertNotIn("AShareEODDerivativeIndicator", tables)
+
+    def test_factor_exposures(self):
+        def update():
+            # 与依赖图中的顺序相同：先更新描述符，再更新因子
+            update_estimation_universe()
+            Descriptor.LnCap().update_zscore()
+            return Size.update_exposures(update_descriptors=False)
+
+        updated, rebuilt = self.run_updates(Size.get_exposures, update)
+        pd.testing.assert_frame_equal(updated, rebuilt, check_freq=False)
+        self.assertEqual(updated.index[-1], self.dates[-1])
+        # 没有市值的股票用回归填充
+        self.assertFalse(updated.iloc[-1].isnull().any())
+
+    def test_factor_yields(self):
+        def build():
+            return get_factor_yields(block_size=7)
+
+        def update():
+            update_estimation_universe()
+            Size.update_exposures()
+            return update_factor_yields(block_size=7)
+
+        updated, rebuilt = self.run_updates(build, update)
+        pd.testing.assert_frame_equal(updated, rebuilt, check_freq=False)
+        self.assertEqual(updated.index[-1], self.dates[-1])
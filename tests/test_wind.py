@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import pandas as pd
+from quant.common import LOCALIZER
+from quant.data import wind
+from quant.utils.calendar import trading_calendar
+
+
+class StockIndustriesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.industry_table = pd.DataFrame({
+            "industriescode": ["b101", "b102", "b103"],
+            "industriesname": ["X", "Y", "Z"],
+        })
+        self.table = pd.DataFrame({
+            "s_info_windcode": ["A", "A", "B", "C"],
+            "citics_ind_code": ["b101000000", "b102000000", "b103010000", "b102030000"],
+            "entry_dt": pd.to_datetime(["2010-01-04", "2013-01-04", "2008-01-02", "2015-01-05"]),
+            "remove_dt": pd.to_datetime(["2013-01-03", None, None, None]),
+        })
+        self.basics = pd.DataFrame({
+            "s_info_listdate": ["20000101"] * 4,
+            "s_info_delistdate": [np.nan] * 4,
+        }, index=["A", "B", "C", "D"])
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.object(LOCALIZER, "path", self.tmp.name),
+            mock.patch.object(wind, "get_industry_table", return_value=self.industry_table),
+            mock.patch.object(wind, "get_table", side_effect=lambda table, columns=None: self.table[columns].copy()),
+            mock.patch.object(wind, "get_stock_basics", return_value=self.basics),
+            mock.patch.object(trading_calendar, "range", side_effect=lambda start, end: pd.bdate_range(start, end)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.tmp.cleanup()
+
+    def test_codes(self):
+        codes = wind.get_stock_industries("AShareIndustriesClassCITICS", 1)
+        self.assertEqual(codes.values.dtype, np.int8)
+        # 没有任何行业记录的股票被去掉
+        self.assertEqual(list(codes.columns), ["A", "B", "C"])
+        self.assertEqual(codes.loc["2011-06-01", "A"], 0)
+        self.assertEqual(codes.loc["2014-01-02", "A"], 1)
+        self.assertEqual(codes.loc["2009-01-05", "B"], 2)
+        self.assertEqual(codes.loc["2016-01-04", "C"], 1)
+        # 读取缓存的结果相同
+        pd.testing.assert_frame_equal(wind.get_stock_industries("AShareIndustriesClassCITICS", 1), codes)